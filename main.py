@@ -1,110 +1,209 @@
+import io
+import os
 import sys
-import trader
-import pandas as pd
-from utils_efinance import get_fund_history_ef, get_realtime_rate, get_stock_history_ef
-import efinance as ef
-from openpyxl import load_workbook
-from trader import ceboro_trend, combine_today_info, ceboro_suggestion
-
-def backtest_funds(file_path, sheet_name, cash):
-    # 打开 workbook
-    wb = load_workbook(file_path)
-    ws = wb[sheet_name]
-
-    sheet = pd.read_excel(file_path, sheet_name=sheet_name, engine="openpyxl", header=1, dtype={"基金代码": str})
-    sheet["操作建议"] = sheet["操作建议"].astype(str)
-    sheet["追踪ETF/指数"] = sheet["追踪ETF/指数"].astype(str)
-
-    for index, row in sheet.iterrows():
-        code = str(row["基金代码"]).strip()
-        if not code or code == "nan":
-            continue
-
-        etf_code = row["追踪ETF/指数"] if not pd.isna(row["追踪ETF/指数"]) else ""
-
-        etf_info = ef.stock.get_base_info(etf_code)
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# backtrader / efinance / pandas / openpyxl 导入耗时较长，按功能分支在函数内按需导入，
+# 菜单可立即显示，各分支只加载自己用到的模块
+
+MAX_FUND_WORKERS = 4
+
+def _backtest_one_fund(index, code, etf_code, cash):
+    """
+    回测单个基金（在子进程中执行）
+    返回 (行号, {列号: 值}, 输出日志)，由主进程写回 Excel
+    """
+    from trader import ceboro_trend, NewTrendTaStrategy
+    from utils_efinance import get_fund_history_ef, get_fund_base_info, get_stock_base_info
+
+    updates = {}
+    log = io.StringIO()
+    with redirect_stdout(log):
+        # 未填写追踪代码时不查询；名称缺失（None/NaN）时不使用 ETF 成交量
+        etf_info = get_stock_base_info(etf_code) if etf_code else {}
         etf_name = etf_info.get("股票名称", None)
-        volume_source = etf_code if 'ETF' in etf_name else ""
+        volume_source = etf_code if isinstance(etf_name, str) and 'ETF' in etf_name else ""
 
         try:
-            fund_info = ef.fund.get_base_info(code)
+            fund_info = get_fund_base_info(code)
             fund_name = fund_info.get("基金简称", None)
-            ws.cell(row=index + 3, column=2, value=fund_name)
+            updates[2] = fund_name
             print(f"✅ {code}: {fund_name}")
         except Exception as e:
             print(f"⚠️ 获取 {code} 基金信息失败: {e}")
 
         df = get_fund_history_ef(code, 1000, volume_source)
-        ceboro_trend(df, trader.NewTrendTaStrategy, False, cash)
+        ceboro_trend(df, NewTrendTaStrategy, False, cash)
 
         print('-----------------------------------------')
 
-    # 保存 Excel
-    wb.save(file_path)
-
-def suggest_funds(file_path, sheet_name, indicators):
-    # 打开 workbook
-    wb = load_workbook(file_path)
-    ws = wb[sheet_name]
-
-    sheet = pd.read_excel(file_path, sheet_name=sheet_name, engine="openpyxl", header=1, dtype={"基金代码": str})
-    sheet["操作建议"] = sheet["操作建议"].astype(str)
-    sheet["追踪ETF/指数"] = sheet["追踪ETF/指数"].astype(str)
-
-    for index, row in sheet.iterrows():
-        code = str(row["基金代码"]).strip()
-        if not code or code == "nan":
-            continue
-
-        etf_code = row["追踪ETF/指数"] if not pd.isna(row["追踪ETF/指数"]) else ""
-
-        etf_info = ef.stock.get_base_info(etf_code)
+    return index, updates, log.getvalue()
+
+def _suggest_one_fund(index, code, etf_code, indicators, realtime=None):
+    """
+    获取单个基金操作建议（在子进程中执行）
+    realtime: 主进程批量预取的 (估算涨跌幅, 名称)，为空时逐只获取
+    返回 (行号, {列号: 值}, 输出日志)，由主进程写回 Excel
+    """
+    from trader import combine_today_info, ceboro_suggestion, NewTrendTaStrategy
+    from utils_efinance import get_fund_history_ef, get_realtime_rate, get_fund_base_info, \
+        get_fund_invest_position, get_stock_base_info
+
+    updates = {}
+    log = io.StringIO()
+    with redirect_stdout(log):
+        # 未填写追踪代码时不查询；名称缺失（None/NaN）时不使用 ETF 成交量
+        etf_info = get_stock_base_info(etf_code) if etf_code else {}
         etf_name = etf_info.get("股票名称", None)
-        volume_source = etf_code if 'ETF' in etf_name else ""
+        volume_source = etf_code if isinstance(etf_name, str) and 'ETF' in etf_name else ""
 
         try:
-            fund_info = ef.fund.get_base_info(code)
+            fund_info = get_fund_base_info(code)
             fund_name = fund_info.get("基金简称", None)
-            ws.cell(row=index + 3, column=2, value=fund_name)
+            updates[2] = fund_name
             print(f"✅ {code}: {fund_name}")
         except Exception as e:
             print(f"⚠️ 获取 {code} 基金信息失败: {e}")
 
         if not etf_code:
             try:
-                fund_position = ef.fund.get_invest_position(code)
+                fund_position = get_fund_invest_position(code)
                 etf_code = fund_position.iloc[0].get("股票代码", None)
-                ws.cell(row=index + 3, column=3, value=etf_code)
+                updates[3] = etf_code
             except Exception as e:
                 print(f"⚠️ 获取 {code} 基金持仓信息失败: {e}")
 
-        fund_rate, etf_name = get_realtime_rate(code, etf_code)
-        ws.cell(row=index + 3, column=4, value=f'{etf_name}')
+        fund_rate, etf_name = realtime or get_realtime_rate(code, etf_code)
+        updates[4] = f'{etf_name}'
         estimate = fund_rate or 0.0
-        ws.cell(row=index + 3, column=5, value=f'{estimate/100:.2%}')
+        updates[5] = f'{estimate/100:.2%}'
 
         df = get_fund_history_ef(code, 200, volume_source)
         df, forecast_nav = combine_today_info(df, estimate/100)
-        action = ceboro_suggestion(df, trader.NewTrendTaStrategy, forecast_nav, estimate / 100, indicators)
-        ws.cell(row=index + 3, column=8, value=action)
+        action = ceboro_suggestion(df, NewTrendTaStrategy, forecast_nav, estimate / 100, indicators)
+        updates[8] = action
 
         print('-----------------------------------------')
 
+    return index, updates, log.getvalue()
+
+def _run_funds(worker, tasks):
+    """
+    多进程并行处理各基金，返回 [(行号, {列号: 值})]
+    单只基金出错只打印警告并跳过，日志按行号顺序输出
+    """
+    if not tasks:
+        return []
+
+    outputs = []
+    # 子进程数量不超过 MAX_FUND_WORKERS，避免同时发起过多行情请求被接口限流
+    max_workers = min(os.cpu_count() or 1, MAX_FUND_WORKERS, len(tasks))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(worker, *task): task for task in tasks}
+        for future in as_completed(futures):
+            index, code = futures[future][:2]
+            try:
+                outputs.append(future.result())
+            except Exception as e:
+                outputs.append((index, {}, f"⚠️ 处理 {code} 基金失败: {e}\n"))
+
+    outputs.sort(key=lambda output: output[0])
+    results = []
+    for index, updates, log in outputs:
+        print(log, end='')
+        if updates:
+            results.append((index, updates))
+    return results
+
+def _read_fund_sheet(ws):
+    """
+    读取基金表（第 2 行为表头，第 3 行起为数据）
+    返回的 DataFrame 行号与 Excel 行号对应关系为 index + 3
+    """
+    import pandas as pd
+
+    rows = ws.iter_rows(min_row=2, values_only=True)
+    headers = next(rows)
+    return pd.DataFrame(list(rows), columns=headers, dtype=object)
+
+def _iter_funds(sheet):
+    """
+    遍历填写了基金代码的行，返回 (行号, 基金代码, 追踪ETF/指数代码)
+    直接按列取数组后 zip，避免 iterrows 逐行构造 Series
+    """
+    codes = sheet["基金代码"].to_numpy()
+    etf_codes = sheet["追踪ETF/指数"].to_numpy()
+    for index, (code, etf_code) in enumerate(zip(codes, etf_codes)):
+        code = str(code or "").strip()
+        if code:
+            yield index, code, str(etf_code or "").strip()
+
+def _save_results(wb, ws, file_path, results):
+    """
+    在主进程中一次性写回结果（openpyxl 不支持多进程写入）
+    先保存到临时文件再替换原文件，避免保存中断时损坏原 Excel
+    """
+    for index, updates in results:
+        for column, value in updates.items():
+            ws.cell(row=index + 3, column=column, value=value)
+
+    tmp_path = f'{file_path}.tmp'
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def backtest_funds(file_path, sheet_name, cash):
+    from openpyxl import load_workbook
+
+    # 只解析一次 Excel：同一个 workbook 既用于读取基金列表，也用于写回结果
+    wb = load_workbook(file_path)
+    ws = wb[sheet_name]
+    sheet = _read_fund_sheet(ws)
+
+    tasks = [(index, code, etf_code, cash) for index, code, etf_code in _iter_funds(sheet)]
+
+    results = _run_funds(_backtest_one_fund, tasks)
+
+    # 保存 Excel
+    _save_results(wb, ws, file_path, results)
+
+def suggest_funds(file_path, sheet_name, indicators):
+    from openpyxl import load_workbook
+    from utils_efinance import get_realtime_rates
+
+    # 只解析一次 Excel：同一个 workbook 既用于读取基金列表，也用于写回结果
+    wb = load_workbook(file_path)
+    ws = wb[sheet_name]
+    sheet = _read_fund_sheet(ws)
+
+    funds = list(_iter_funds(sheet))
+
+    # 一次请求批量获取所有基金的实时估值，避免每只基金单独阻塞请求
+    rates = get_realtime_rates([code for _, code, _ in funds])
+    tasks = [(index, code, etf_code, indicators, rates.get(code)) for index, code, etf_code in funds]
+
+    results = _run_funds(_suggest_one_fund, tasks)
+
     # 保存 Excel
-    wb.save(file_path)
+    _save_results(wb, ws, file_path, results)
 
 def backtest_index(index_code, cash):
+    from trader import ceboro_trend, OptimizedTaStrategy
     from utils_yfinance import get_usa_stock_yf
-    df, _, _ = get_usa_stock_yf(index_code, 'current')
 
-    from trader import ceboro_trend
-    ceboro_trend(df, trader.OptimizedTaStrategy, True, cash)
+    df, _, _ = get_usa_stock_yf(index_code, 'current')
+    ceboro_trend(df, OptimizedTaStrategy, True, cash)
 
 def suggest_index(index_code):
+    from trader import ceboro_suggestion, OptimizedTaStrategy
     from utils_yfinance import get_usa_stock_yf
-    from trader import ceboro_suggestion
+
     df, price, estimate = get_usa_stock_yf(index_code, 'current')
-    ceboro_suggestion(df, trader.OptimizedTaStrategy, price, estimate, True)
+    ceboro_suggestion(df, OptimizedTaStrategy, price, estimate, True)
 
 def ask_int(prompt, min_val=None, max_val=None):
     while True:
@@ -154,11 +253,13 @@ if __name__ == "__main__":
             etf_code = input("请输入基金追踪的ETF/指数代码（可留空）：")
             full_log = input("是否输出100条日志并绘图（Y/N）：")
             print(f"开始回测 {fund_code} 基金")
+            from trader import ceboro_trend, NewTrendTaStrategy
+            from utils_efinance import get_fund_history_ef
             df = get_fund_history_ef(fund_code, 1000, etf_code)
             if df is None or not len(df):
                 print(f"⚠️ 获取 {fund_code} 基金历史数据失败")
                 sys.exit()
-            ceboro_trend(df, trader.NewTrendTaStrategy, full_log == 'Y', cash, full_log == 'Y')
+            ceboro_trend(df, NewTrendTaStrategy, full_log == 'Y', cash, full_log == 'Y')
 
         elif use == 'backtest_funds':
             file_path = "FundEstimate.xlsx"
@@ -179,11 +280,13 @@ if __name__ == "__main__":
             stock_code = input("请输入股票代码：")
             full_log = input("是否输出100条日志并绘图（Y/N）：")
             print(f"开始回测 {stock_code} 股票")
+            from trader import ceboro_trend, MA20Strategy
+            from utils_efinance import get_stock_history_ef
             df = get_stock_history_ef(stock_code, '20210101')
             if df is None or not len(df):
                 print(f"⚠️ 获取 {stock_code} 基金历史数据失败")
                 sys.exit()
-            ceboro_trend(df, trader.MA20Strategy, full_log == 'Y', cash, full_log == 'Y')
+            ceboro_trend(df, MA20Strategy, full_log == 'Y', cash, full_log == 'Y')
 
         elif use == 'suggest_fund':
             fund_code = input("请输入基金代码：")
@@ -194,12 +297,14 @@ if __name__ == "__main__":
                 print(f"⚠️ 输入的基金预估净值有误: {e}")
                 sys.exit()
             print(f"开始获取 {fund_code} 基金操作建议")
+            from trader import combine_today_info, ceboro_suggestion, NewTrendTaStrategy
+            from utils_efinance import get_fund_history_ef
             df = get_fund_history_ef(fund_code, 200, etf_code)
             if df is None or not len(df):
                 print(f"⚠️ 获取 {fund_code} 基金历史数据失败")
                 sys.exit()
             df, forecast_nav = combine_today_info(df, estimate/100)
-            ceboro_suggestion(df, trader.NewTrendTaStrategy, forecast_nav, estimate / 100, True)
+            ceboro_suggestion(df, NewTrendTaStrategy, forecast_nav, estimate / 100, True)
 
         elif use == 'suggest_index':
             index_code = input("⌨️ 请输入指数代码：")
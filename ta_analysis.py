@@ -1,80 +1,376 @@
+import numpy as np
 import pandas as pd
-import ta
+from utils_njit import njit, NUMBA_AVAILABLE
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
 from utils_efinance import get_stock_history_ef, get_fund_history_ef
 
+@njit(cache=True)
+def _rolling_mean(values, window):
+    """
+    与 pandas rolling(window).mean() 逐位一致的滑动均值
+    沿用 pandas 的增量算法：先移出再移入，移入/移出各自做 Kahan 补偿，NaN/inf 不计入样本；
+    连续相同值覆盖整个窗口时取该值，全为非负（非正）样本时结果不小于（不大于）0
+    """
+    n = len(values)
+    out = np.full(n, np.nan)
+    total = comp_add = comp_remove = 0.0
+    nobs = neg_ct = same = 0
+    prev = values[0] if n else np.nan
+
+    for i in range(n):
+        if i >= window:
+            x = values[i - window]
+            if np.isfinite(x):
+                nobs -= 1
+                y = -x - comp_remove
+                t = total + y
+                comp_remove = t - total - y
+                total = t
+                if np.signbit(x):
+                    neg_ct -= 1
+
+        x = values[i]
+        if np.isfinite(x):
+            nobs += 1
+            y = x - comp_add
+            t = total + y
+            comp_add = t - total - y
+            total = t
+            if np.signbit(x):
+                neg_ct += 1
+            if x == prev:
+                same += 1
+            else:
+                same = 1
+            prev = x
+
+        if nobs >= window:
+            result = total / nobs
+            if same >= nobs:
+                result = prev
+            elif neg_ct == 0 and result < 0:
+                result = 0.0
+            elif neg_ct == nobs and result > 0:
+                result = 0.0
+            out[i] = result
+    return out
+
+@njit(cache=True)
+def _welford_update(mean, ssq, comp, x, nobs, add):
+    """
+    滑动窗口方差的增量更新（Welford 算法），nobs 为更新后的样本数
+    add=True 移入 x，add=False 移出 x，返回 (均值, 离差平方和, 补偿量)
+    """
+    prev_mean = mean - comp
+    y = x - comp
+    t = y - mean
+    comp = t + mean - y
+    if add:
+        mean += t / nobs
+        ssq += (x - prev_mean) * (x - mean)
+    else:
+        mean -= t / nobs
+        ssq -= (x - prev_mean) * (x - mean)
+    return mean, ssq, comp
+
+@njit(cache=True)
+def _fused_indicators(high, low, close):
+    """
+    单次遍历计算 EMA/MACD/布林带/KDJ/RSI/ATR，MA 与 KDJ 的 %D 由 _rolling_mean 按 pandas 算法求得
+    计算口径与 ta 库一致：EMA 为 adjust=False 的指数平均，RSI 为 Wilder 平滑，
+    ATR 以前 14 日 TR 均值为起点（之前为 0），布林带标准差 ddof=0，KDJ 为 14 日 %K 与 3 日 %D
+    """
+    n = len(close)
+    nan = np.nan
+    # 滑动均值与 pandas rolling().mean() 逐位一致（KDJ 的 %D 同样在 %K 算完后求）
+    ma5 = _rolling_mean(close, 5)
+    ma10 = _rolling_mean(close, 10)
+    ma20 = _rolling_mean(close, 20)
+    ema5 = np.full(n, nan)
+    ema20 = np.full(n, nan)
+    macd = np.full(n, nan)
+    macd_signal = np.full(n, nan)
+    macd_hist = np.full(n, nan)
+    bb_upper = np.full(n, nan)
+    bb_lower = np.full(n, nan)
+    k = np.full(n, nan)
+    rsi = np.full(n, nan)
+    atr = np.zeros(n)
+    if n == 0:
+        return ma5, ma10, ma20, ema5, ema20, macd, macd_signal, macd_hist, ma20, bb_upper, bb_lower, k, np.empty(0), np.empty(0), rsi, atr
+
+    # 指数平均系数（与 pandas ewm 的 span / alpha 换算一致）
+    a5 = 1.0 / (1.0 + (5 - 1) / 2.0)
+    a20 = 1.0 / (1.0 + (20 - 1) / 2.0)
+    a12 = 1.0 / (1.0 + (12 - 1) / 2.0)
+    a26 = 1.0 / (1.0 + (26 - 1) / 2.0)
+    a9 = 1.0 / (1.0 + (9 - 1) / 2.0)
+    a14 = 1.0 / 14
+
+    e5 = e20 = e12 = e26 = close[0]
+    sig = 0.0
+    sig_n = 0
+    up = dn = 0.0
+    tr_sum = 0.0
+    bb_mean = bb_ssq = bb_comp = 0.0
+    same = 0
+    q_high = np.empty(14, dtype=np.int64)
+    q_low = np.empty(14, dtype=np.int64)
+    q_head_h = q_len_h = q_head_l = q_len_l = 0
+
+    for i in range(n):
+        c = close[i]
+
+        # 连续相同值计数（布林带窗口内价格不变时方差直接取 0，避免累计误差）
+        if i > 0 and c == close[i - 1]:
+            same += 1
+        else:
+            same = 1
+
+        # ---------- EMA / MACD ----------
+        if i > 0:
+            if e5 != c:
+                e5 = ((1.0 - a5) * e5 + a5 * c) / ((1.0 - a5) + a5)
+            if e20 != c:
+                e20 = ((1.0 - a20) * e20 + a20 * c) / ((1.0 - a20) + a20)
+            if e12 != c:
+                e12 = ((1.0 - a12) * e12 + a12 * c) / ((1.0 - a12) + a12)
+            if e26 != c:
+                e26 = ((1.0 - a26) * e26 + a26 * c) / ((1.0 - a26) + a26)
+        if i >= 4:
+            ema5[i] = e5
+        if i >= 19:
+            ema20[i] = e20
+        if i >= 25:
+            m = e12 - e26
+            macd[i] = m
+            if sig_n == 0:
+                sig = m
+            elif sig != m:
+                sig = ((1.0 - a9) * sig + a9 * m) / ((1.0 - a9) + a9)
+            sig_n += 1
+            if sig_n >= 9:
+                macd_signal[i] = sig
+                macd_hist[i] = m - sig
+
+        # ---------- 布林带（滑动窗口方差，先移出再移入） ----------
+        if i >= 20:
+            bb_mean, bb_ssq, bb_comp = _welford_update(bb_mean, bb_ssq, bb_comp, close[i - 20], 19, False)
+        bb_mean, bb_ssq, bb_comp = _welford_update(bb_mean, bb_ssq, bb_comp, c, min(i, 19) + 1, True)
+        if i >= 19:
+            var = 0.0 if same >= 20 else bb_ssq / 20
+            std = np.sqrt(var) if var > 0 else 0.0
+            bb_upper[i] = ma20[i] + 2 * std
+            bb_lower[i] = ma20[i] - 2 * std
+
+        # ---------- KDJ ----------
+        # 单调队列维护 14 日最高价/最低价的下标，队首即窗口极值
+        if q_len_h and q_high[q_head_h] <= i - 14:
+            q_head_h = (q_head_h + 1) % 14
+            q_len_h -= 1
+        while q_len_h and high[q_high[(q_head_h + q_len_h - 1) % 14]] <= high[i]:
+            q_len_h -= 1
+        q_high[(q_head_h + q_len_h) % 14] = i
+        q_len_h += 1
+
+        if q_len_l and q_low[q_head_l] <= i - 14:
+            q_head_l = (q_head_l + 1) % 14
+            q_len_l -= 1
+        while q_len_l and low[q_low[(q_head_l + q_len_l - 1) % 14]] >= low[i]:
+            q_len_l -= 1
+        q_low[(q_head_l + q_len_l) % 14] = i
+        q_len_l += 1
+
+        if i >= 13:
+            hh = high[q_high[q_head_h]]
+            ll = low[q_low[q_head_l]]
+            num = 100 * (c - ll)
+            rng = hh - ll
+            if rng != 0:
+                k[i] = num / rng
+            elif num != 0:
+                k[i] = np.inf if num > 0 else -np.inf
+
+        # ---------- RSI（Wilder 平滑） ----------
+        if i > 0:
+            diff = c - close[i - 1]
+            gain = diff if diff > 0 else 0.0
+            loss = -diff if diff < 0 else 0.0
+            if up != gain:
+                up = ((1.0 - a14) * up + a14 * gain) / ((1.0 - a14) + a14)
+            if dn != loss:
+                dn = ((1.0 - a14) * dn + a14 * loss) / ((1.0 - a14) + a14)
+        if i >= 13:
+            rsi[i] = 100.0 if dn == 0 else 100 - 100 / (1 + up / dn)
+
+        # ---------- ATR ----------
+        tr = high[i] - low[i]
+        if i > 0:
+            tr = max(tr, abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        if i < 14:
+            tr_sum += tr
+            if i == 13:
+                atr[i] = tr_sum / 14
+        else:
+            atr[i] = (atr[i - 1] * 13 + tr) / 14.0
+
+    # %D 为 %K 的 3 日滑动均值（%K 为 ±inf 的日子按 pandas 口径不计入样本）
+    d = _rolling_mean(k, 3)
+    j = 3 * k - 2 * d
+
+    return ma5, ma10, ma20, ema5, ema20, macd, macd_signal, macd_hist, ma20, bb_upper, bb_lower, k, d, j, rsi, atr
+
+def _ewm(x, alpha, start=0):
+    """
+    adjust=False 的指数平均 y[i] = α·x[i] + (1-α)·y[i-1]，以 x[start] 为初值，之前为 NaN
+    由 lfilter 一次完成递推
+    """
+    y = np.full(len(x), np.nan)
+    if len(x) > start:
+        y[start] = x[start]
+        y[start + 1:] = lfilter([alpha], [1.0, alpha - 1.0], x[start + 1:], zi=[(1.0 - alpha) * x[start]])[0]
+    return y
+
+def _smoothed_indicators(high, low, close):
+    """
+    numba 不可用时的向量化实现，返回值与 _fused_indicators 相同
+    EMA/MACD/RSI/ATR 的递推交给 lfilter，滑动窗口指标交给 pandas rolling
+    """
+    n = len(close)
+    s = pd.Series(close)
+
+    ma5 = s.rolling(5).mean().to_numpy()
+    ma10 = s.rolling(10).mean().to_numpy()
+    ma20 = s.rolling(20).mean().to_numpy()
+
+    # ---------- EMA / MACD ----------
+    ema5 = _ewm(close, 1.0 / (1.0 + (5 - 1) / 2.0))
+    ema20 = _ewm(close, 1.0 / (1.0 + (20 - 1) / 2.0))
+    macd = _ewm(close, 1.0 / (1.0 + (12 - 1) / 2.0)) - _ewm(close, 1.0 / (1.0 + (26 - 1) / 2.0))
+    ema5[:4] = np.nan
+    ema20[:19] = np.nan
+    macd[:25] = np.nan
+    macd_signal = _ewm(macd, 1.0 / (1.0 + (9 - 1) / 2.0), start=25)
+    macd_signal[:33] = np.nan
+    macd_hist = macd - macd_signal
+
+    # ---------- 布林带 ----------
+    std = s.rolling(20).std(ddof=0).to_numpy()
+    bb_upper = ma20 + 2 * std
+    bb_lower = ma20 - 2 * std
+
+    # ---------- KDJ ----------
+    ll = pd.Series(low).rolling(14).min().to_numpy()
+    hh = pd.Series(high).rolling(14).max().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = 100 * (close - ll) / (hh - ll)
+    d = pd.Series(k).rolling(3).mean().to_numpy()
+    j = 3 * k - 2 * d
+
+    # ---------- RSI（Wilder 平滑） ----------
+    diff = np.diff(close, prepend=close[:1])
+    up = _ewm(np.where(diff > 0, diff, 0.0), 1.0 / 14)
+    dn = _ewm(np.where(diff < 0, -diff, 0.0), 1.0 / 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(dn == 0, 100.0, 100 - 100 / (1 + up / dn))
+    rsi[:13] = np.nan
+
+    # ---------- ATR ----------
+    prev_close = np.concatenate((close[:1], close[:-1]))
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    if n:
+        tr[0] = high[0] - low[0]
+    atr = np.zeros(n)
+    if n >= 14:
+        atr[13] = tr[:14].mean()
+        atr[14:] = lfilter([1.0 / 14], [1.0, -13.0 / 14], tr[14:], zi=[13.0 / 14 * atr[13]])[0]
+
+    return ma5, ma10, ma20, ema5, ema20, macd, macd_signal, macd_hist, ma20, bb_upper, bb_lower, k, d, j, rsi, atr
+
+# calculate_indicators 输出的指标列，与 _fused_indicators 的返回值一一对应
+INDICATOR_COLUMNS = ['ma5', 'ma10', 'ma20', 'ema5', 'ema20', 'macd', 'macd_signal', 'macd_hist',
+                     'bb_middle', 'bb_upper', 'bb_lower', 'k', 'd', 'j', 'rsi', 'atr']
+
 def calculate_indicators(df):
     """
     计算常用量化指标
     """
-    # 移动平均线
-    df['ma5'] = df['close'].rolling(5).mean()
-    df['ma10'] = df['close'].rolling(10).mean()
-    df['ma20'] = df['close'].rolling(20).mean()
-
-    # EMA
-    df['ema5'] = ta.trend.ema_indicator(close=df['close'], window=5)
-    df['ema20'] = ta.trend.ema_indicator(close=df['close'], window=20)
-
-    # MACD
-    macd = ta.trend.MACD(close=df['close'])
-    df['macd'] = macd.macd()
-    df['macd_signal'] = macd.macd_signal()
-    df['macd_hist'] = macd.macd_diff()
-
-    # 布林带
-    from ta.volatility import BollingerBands
-    bb = BollingerBands(close=df['close'], window=20, window_dev=2)
-    df['bb_middle'] = bb.bollinger_mavg()
-    df['bb_upper'] = bb.bollinger_hband()
-    df['bb_lower'] = bb.bollinger_lband()
-
-    # KDJ
-    from ta.momentum import StochasticOscillator
-    stoch = StochasticOscillator(high=df['high'], low=df['low'], close=df['close'], window=14, smooth_window=3)
-    df['k'] = stoch.stoch()
-    df['d'] = stoch.stoch_signal()
-    df['j'] = 3 * df['k'] - 2 * df['d']
-
-    # RSI
-    df['rsi'] = ta.momentum.RSIIndicator(close=df['close'], window=14).rsi()
-
-    # ATR（平均真实波幅，用于风险控制）
-    df['atr'] = ta.volatility.AverageTrueRange(high=df['high'], low=df['low'], close=df['close'],
-                                               window=14).average_true_range()
+    def col(name):
+        return np.ascontiguousarray(df[name].to_numpy(), dtype=np.float64)
+
+    # 未安装 numba 时，逐日循环按纯 Python 执行较慢，改用 lfilter 向量化实现
+    if NUMBA_AVAILABLE or lfilter is None:
+        values = _fused_indicators(col('high'), col('low'), col('close'))
+    else:
+        values = _smoothed_indicators(col('high'), col('low'), col('close'))
+    for name, value in zip(INDICATOR_COLUMNS, values):
+        df[name] = value
 
     return df
 
+def _score_table(weights):
+    """
+    5 个信号全部 32 种组合的加权得分，下标为信号按列顺序拼成的 5 位编码（第一列为最高位）
+    与原先逐行 signals @ weights 用同一矩阵乘法求和，得分及阈值判断结果不变
+    """
+    bits = (np.arange(32)[:, None] >> np.arange(len(weights) - 1, -1, -1)) & 1
+    return bits.astype(np.bool_) @ np.array(weights)
+
+# 买入 / 卖出信号权重，与 generate_trend_scores 中信号矩阵的列顺序一致
+BUY_SCORE_TABLE = _score_table([0.3, 0.25, 0.15, 0.15, 0.15])    # trend_up, momentum, rsi_ok, boll_buy, kdj_buy
+SELL_SCORE_TABLE = _score_table([0.3, 0.25, 0.15, 0.15, 0.15])   # trend_down, momentum_down, rsi_over, boll_sell, kdj_sell
+
 def generate_trend_scores(df):
+    def col(name):
+        return df[name].to_numpy(dtype=np.float64)
+
+    close, rsi = col('close'), col('rsi')
+    ema5, ema20 = col('ema5'), col('ema20')
+    macd, macd_signal, macd_hist = col('macd'), col('macd_signal'), col('macd_hist')
+    bb_upper, bb_middle, bb_lower = col('bb_upper'), col('bb_middle'), col('bb_lower')
+    k, d, j = col('k'), col('d'), col('j')
+
+    # 买入/卖出信号矩阵，每列一个信号（np.bool_ 每格 1 字节），各信号原地写入对应列
+    n = len(df)
+    buy_signals = np.empty((n, 5), dtype=np.bool_)
+    sell_signals = np.empty((n, 5), dtype=np.bool_)
+    trend_up, momentum, rsi_ok, boll_buy, kdj_buy = (buy_signals[:, i] for i in range(5))
+    trend_down, momentum_down, rsi_over, boll_sell, kdj_sell = (sell_signals[:, i] for i in range(5))
+
     # 趋势指标
-    df['trend_up'] = df['ema5'] > df['ema20']
-    df['trend_down'] = df['ema5'] < df['ema20']
-    df['momentum'] = (df['macd'] > df['macd_signal']) & (df['macd_hist'] > 0)
-    df['rsi_ok'] = (df['rsi'] > 40) & (df['rsi'] < 60)
-    df['rsi_over'] = df['rsi'] > 70
-    df['boll_buy'] = (df['close'] < df['bb_middle']) & (df['close'] > df['bb_lower'])
-    df['boll_sell'] = (df['close'] > df['bb_upper']) | (df['close'] < df['bb_middle'])
-    df['kdj_buy'] = (df['k'] > df['d']) & (df['j'] < 20)
-    df['kdj_sell'] = (df['k'] < df['d']) & (df['j'] > 80)
-
-    # 买入
-    weights = {'trend_up': 0.3, 'momentum': 0.25, 'rsi_ok': 0.15, 'boll_buy': 0.15, 'kdj_buy': 0.15}
-    df['buy_score'] = (
-            df['trend_up'] * weights['trend_up'] +
-            df['momentum'] * weights['momentum'] +
-            df['rsi_ok'] * weights['rsi_ok'] +
-            df['boll_buy'] * weights['boll_buy'] +
-            df['kdj_buy'] * weights['kdj_buy']
-    )
-
-    # 卖出
-    weights_sell = {'trend_down': 0.3, 'momentum_down': 0.25, 'rsi_over': 0.15, 'boll_sell': 0.15, 'kdj_sell': 0.15}
-    df['sell_score'] = (
-            df['trend_down'] * weights_sell['trend_down'] +
-            (df['macd'] < df['macd_signal']) * weights_sell['momentum_down'] +
-            df['rsi_over'] * weights_sell['rsi_over'] +
-            df['boll_sell'] * weights_sell['boll_sell'] +
-            df['kdj_sell'] * weights_sell['kdj_sell']
-    )
+    np.greater(ema5, ema20, out=trend_up)
+    np.less(ema5, ema20, out=trend_down)
+    np.greater(macd, macd_signal, out=momentum)
+    momentum &= macd_hist > 0
+    np.less(macd, macd_signal, out=momentum_down)
+    np.greater(rsi, 40, out=rsi_ok)
+    rsi_ok &= rsi < 60
+    np.greater(rsi, 70, out=rsi_over)
+    np.less(close, bb_middle, out=boll_buy)
+    boll_buy &= close > bb_lower
+    np.greater(close, bb_upper, out=boll_sell)
+    boll_sell |= close < bb_middle
+    np.greater(k, d, out=kdj_buy)
+    kdj_buy &= j < 20
+    np.less(k, d, out=kdj_sell)
+    kdj_sell &= j > 80
+
+    df['trend_up'] = trend_up
+    df['trend_down'] = trend_down
+    df['momentum'] = momentum
+    df['rsi_ok'] = rsi_ok
+    df['rsi_over'] = rsi_over
+    df['boll_buy'] = boll_buy
+    df['boll_sell'] = boll_sell
+    df['kdj_buy'] = kdj_buy
+    df['kdj_sell'] = kdj_sell
+
+    # 每行 5 个信号打包成一个 5 位编码（packbits 按高位在前填入字节的高 5 位），查表得到加权得分
+    df['buy_score'] = BUY_SCORE_TABLE[np.packbits(buy_signals, axis=1)[:, 0] >> 3]
+    df['sell_score'] = SELL_SCORE_TABLE[np.packbits(sell_signals, axis=1)[:, 0] >> 3]
 
     df['buy_signal_trend'] = df['buy_score'] >= 0.7
     df['sell_signal_trend'] = df['sell_score'] >= 0.5
@@ -85,46 +381,69 @@ def identify_oscillating(df, atr_threshold=0.02, ma_threshold=0.01):
     """
     判断是否横盘震荡
     """
-    df['atr_ratio'] = df['atr'] / df['close']
-    df['trend_strength'] = abs(df['ma5'] - df['ma20']) / df['close']
-    df['is_oscillating'] = (df['atr_ratio'] < atr_threshold) & (df['trend_strength'] < ma_threshold)
+    close = df['close'].to_numpy(dtype=np.float64)
+    atr_ratio = df['atr'].to_numpy(dtype=np.float64) / close
+
+    # 原地计算，避免中间 Series 的分配
+    trend_strength = np.subtract(df['ma5'].to_numpy(dtype=np.float64), df['ma20'].to_numpy(dtype=np.float64))
+    np.abs(trend_strength, out=trend_strength)
+    np.divide(trend_strength, close, out=trend_strength)
+
+    df['atr_ratio'] = atr_ratio
+    df['trend_strength'] = trend_strength
+    df['is_oscillating'] = (atr_ratio < atr_threshold) & (trend_strength < ma_threshold)
 
     # 横盘区间
-    df['range_top'] = df['bb_upper'] * 0.98
-    df['range_bottom'] = df['bb_middle'] * 0.98
+    df['range_top'] = df['bb_upper'].to_numpy(dtype=np.float64) * 0.98
+    df['range_bottom'] = df['bb_middle'].to_numpy(dtype=np.float64) * 0.98
     return df
 
-def apply_combined_strategy(df):
+# 操作建议编码，与 _combined_loop 返回的 code 一一对应
+OPERATIONS = ['无', '上升趋势，买入 400', '上升趋势，买入 200', '高位震荡，逢低吸纳 200', '高位震荡，获利卖出 10%', '下降趋势，卖出 20%']
+
+@njit(cache=True)
+def _combined_loop(low, high, close, ma20, rsi, range_top, range_bottom, trend_up, buy_score, sell_signal_trend, is_oscillating):
     """
-    综合趋势+震荡策略
+    逐日计算综合策略的操作编码（见 OPERATIONS）
     """
-    df['operation'] = '无'
-
-    for i in range(1, len(df)):
-        prev = df.iloc[i - 1]
-        today = df.iloc[i]
+    n = len(low)
+    codes = np.zeros(n, dtype=np.int8)
 
+    for i in range(1, n):
         # ---------- 冷却期 / 创新低过滤 ----------
-        recent_lows = [df.iloc[j]['low'] for j in range(i - 3, i)]
-        no_new_low = all(today['low'] >= l for l in recent_lows)
+        no_new_low = low[i] >= low[i - 3] and low[i] >= low[i - 2] and low[i] >= low[i - 1]
 
         # 趋势策略买入
-        if prev['trend_up'] and today['buy_score'] >= 0.5:
-            if today['buy_score'] >= 0.7:
-                df.at[i, 'operation'] = '上升趋势，买入 400'
+        if trend_up[i - 1] and buy_score[i] >= 0.5:
+            if buy_score[i] >= 0.7:
+                codes[i] = 1
             else:
-                df.at[i, 'operation'] = '上升趋势，买入 200'
+                codes[i] = 2
 
         # 震荡策略低吸买入
-        elif today['is_oscillating']:
-            if today['low'] <= today['range_bottom'] and today['rsi'] < 50 and today['close'] > today['ma20'] and no_new_low:
-                df.at[i, 'operation'] = '高位震荡，逢低吸纳 200'
-            elif today['high'] >= today['range_top'] and today['rsi'] > 70:
-                df.at[i, 'operation'] = '高位震荡，获利卖出 10%'
+        elif is_oscillating[i]:
+            if low[i] <= range_bottom[i] and rsi[i] < 50 and close[i] > ma20[i] and no_new_low:
+                codes[i] = 3
+            elif high[i] >= range_top[i] and rsi[i] > 70:
+                codes[i] = 4
 
         # 趋势策略卖出
-        elif today['sell_signal_trend']:
-            df.at[i, 'operation'] = '下降趋势，卖出 20%'
+        elif sell_signal_trend[i]:
+            codes[i] = 5
+
+    return codes
+
+def apply_combined_strategy(df):
+    """
+    综合趋势+震荡策略
+    """
+    def col(name, dtype=np.float64):
+        return np.ascontiguousarray(df[name].to_numpy(), dtype=dtype)
+
+    codes = _combined_loop(col('low'), col('high'), col('close'), col('ma20'), col('rsi'),
+                           col('range_top'), col('range_bottom'), col('trend_up', np.bool_),
+                           col('buy_score'), col('sell_signal_trend', np.bool_), col('is_oscillating', np.bool_))
+    df['operation'] = np.array(OPERATIONS, dtype=object)[codes]
 
     return df
 
@@ -145,10 +464,12 @@ def stock_ta_analysis(code, forecast_change=None, beg='20250101'):
         forecast_nav = last_nav * (1 + forecast_change)
         forecast_date = df['date'].iloc[-1] + pd.Timedelta(days=1)
 
-        new_row = pd.DataFrame(
-            {'date': [forecast_date], 'close': [forecast_nav], 'open': [forecast_nav], 'high': [forecast_nav],
-             'low': [forecast_nav]})
-        df = pd.concat([df, new_row], ignore_index=True)
+        # 一次性扩展一行再原地填值，避免构造单行 DataFrame 后 concat
+        df = df.reset_index(drop=True).reindex(pd.RangeIndex(len(df) + 1))
+        new_row = {'date': forecast_date, 'close': forecast_nav, 'open': forecast_nav, 'high': forecast_nav,
+                   'low': forecast_nav}
+        for name, value in new_row.items():
+            df.iat[-1, df.columns.get_loc(name)] = value
 
     df = calculate_indicators(df)
     df = generate_trend_scores(df)
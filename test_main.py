@@ -0,0 +1,81 @@
+import io
+import unittest
+from unittest import mock
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+import main
+
+def _echo_worker(index, code):
+    """子进程任务：代码为 bad 时抛异常，其余按行号返回结果"""
+    if code == 'bad':
+        raise ValueError('boom')
+    return index, {2: code}, f'{code}\n'
+
+class RunFundsTest(unittest.TestCase):
+
+    def test_failed_fund_is_skipped_and_logs_are_ordered(self):
+        tasks = [(2, 'c'), (0, 'a'), (1, 'bad'), (3, 'd')]
+        log = io.StringIO()
+        with redirect_stdout(log):
+            results = main._run_funds(_echo_worker, tasks)
+
+        self.assertEqual(results, [(0, {2: 'a'}), (2, {2: 'c'}), (3, {2: 'd'})])
+        lines = log.getvalue().splitlines()
+        self.assertEqual(lines[0], 'a')
+        self.assertIn('bad', lines[1])
+        self.assertIn('boom', lines[1])
+        self.assertEqual(lines[2:], ['c', 'd'])
+
+    def test_no_tasks(self):
+        self.assertEqual(main._run_funds(_echo_worker, []), [])
+
+class IterFundsTest(unittest.TestCase):
+
+    def test_blank_cells(self):
+        # openpyxl 读取的空单元格为 None，不再经 astype(str) 变成 'nan'
+        sheet = pd.DataFrame({'基金代码': ['005918', None, ' 017437 ', '021000'],
+                              '追踪ETF/指数': ['159915', '510300', None, '  ']}, dtype=object)
+        self.assertEqual(list(main._iter_funds(sheet)),
+                         [(0, '005918', '159915'), (2, '017437', ''), (3, '021000', '')])
+
+class SuggestOneFundTest(unittest.TestCase):
+
+    def _suggest(self, etf_code, etf_name=None):
+        """
+        替换网络请求与回测，返回 (更新列, 各替身)
+        """
+        history = pd.DataFrame({'close': [1.0]})
+        efinance_mocks = {
+            'get_stock_base_info': mock.Mock(return_value=pd.Series({'股票名称': etf_name})),
+            'get_fund_base_info': mock.Mock(return_value=pd.Series({'基金简称': '测试基金'})),
+            'get_fund_invest_position': mock.Mock(return_value=pd.DataFrame({'股票代码': ['600519']})),
+            'get_fund_history_ef': mock.Mock(return_value=history),
+        }
+        trader_mocks = {
+            'combine_today_info': mock.Mock(return_value=(history, 1.01)),
+            'ceboro_suggestion': mock.Mock(return_value='🔒 无操作'),
+        }
+        with mock.patch.multiple('utils_efinance', **efinance_mocks), \
+                mock.patch.multiple('trader', **trader_mocks), redirect_stdout(io.StringIO()):
+            _, updates, _ = main._suggest_one_fund(0, '005918', etf_code, False, (1.0, '估算'))
+        return updates, {**efinance_mocks, **trader_mocks}
+
+    def test_blank_etf_uses_top_position(self):
+        updates, mocks = self._suggest('')
+        mocks['get_stock_base_info'].assert_not_called()
+        mocks['get_fund_invest_position'].assert_called_once_with('005918')
+        mocks['get_fund_history_ef'].assert_called_once_with('005918', 200, '')
+        self.assertEqual(updates[3], '600519')
+        self.assertEqual(updates[8], '🔒 无操作')
+
+    def test_etf_volume_source(self):
+        for name, source in (('创业板ETF', '159915'), ('创业板指', ''), (None, ''), (np.nan, '')):
+            with self.subTest(name=name):
+                updates, mocks = self._suggest('159915', name)
+                mocks['get_fund_invest_position'].assert_not_called()
+                mocks['get_fund_history_ef'].assert_called_once_with('005918', 200, source)
+                self.assertNotIn(3, updates)
+
+if __name__ == "__main__":
+    unittest.main()
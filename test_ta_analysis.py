@@ -0,0 +1,71 @@
+import os
+import unittest
+import numpy as np
+import pandas as pd
+import ta_analysis
+
+try:
+    import ta
+except ImportError:
+    ta = None
+
+HISTORY_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signals', '005918_history.csv')
+
+def _load_history(rows=None):
+    """
+    读取基金净值历史，基金只有单位净值，开高低收都取净值（大段平盘、%K 常在 100 附近）
+    """
+    raw = pd.read_csv(HISTORY_CSV, encoding='utf-8-sig')
+    close = raw['unit_net'].astype(float).to_numpy()
+    if rows:
+        close = close[-rows:]
+    return pd.DataFrame({'close': close, 'open': close, 'high': close, 'low': close})
+
+def _ta_indicators(df):
+    """
+    原先基于 ta 库的指标计算，作为对照
+    """
+    df['ma5'] = df['close'].rolling(5).mean()
+    df['ma10'] = df['close'].rolling(10).mean()
+    df['ma20'] = df['close'].rolling(20).mean()
+    df['ema5'] = ta.trend.ema_indicator(close=df['close'], window=5)
+    df['ema20'] = ta.trend.ema_indicator(close=df['close'], window=20)
+    macd = ta.trend.MACD(close=df['close'])
+    df['macd'] = macd.macd()
+    df['macd_signal'] = macd.macd_signal()
+    df['macd_hist'] = macd.macd_diff()
+    bb = ta.volatility.BollingerBands(close=df['close'], window=20, window_dev=2)
+    df['bb_middle'] = bb.bollinger_mavg()
+    df['bb_upper'] = bb.bollinger_hband()
+    df['bb_lower'] = bb.bollinger_lband()
+    stoch = ta.momentum.StochasticOscillator(high=df['high'], low=df['low'], close=df['close'],
+                                             window=14, smooth_window=3)
+    df['k'] = stoch.stoch()
+    df['d'] = stoch.stoch_signal()
+    df['j'] = 3 * df['k'] - 2 * df['d']
+    df['rsi'] = ta.momentum.RSIIndicator(close=df['close'], window=14).rsi()
+    df['atr'] = ta.volatility.AverageTrueRange(high=df['high'], low=df['low'], close=df['close'],
+                                               window=14).average_true_range()
+    return df
+
+class FusedIndicatorsTest(unittest.TestCase):
+
+    def test_kdj_d_matches_pandas_rolling_mean(self):
+        df = _load_history()
+        *_, k, d, j, _, _ = ta_analysis._fused_indicators(
+            df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())
+        expected = pd.Series(k).rolling(3).mean().to_numpy()
+        np.testing.assert_array_equal(d, expected)
+        np.testing.assert_array_equal(j, 3 * k - 2 * expected)
+
+    @unittest.skipIf(ta is None, 'ta 未安装')
+    def test_scores_match_ta(self):
+        columns = ['kdj_buy', 'kdj_sell', 'buy_score', 'sell_score']
+        for rows in (None, 40):
+            with self.subTest(rows=rows):
+                expected = ta_analysis.generate_trend_scores(_ta_indicators(_load_history(rows)))
+                actual = ta_analysis.generate_trend_scores(ta_analysis.calculate_indicators(_load_history(rows)))
+                pd.testing.assert_frame_equal(actual[columns], expected[columns])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import io
+import os
+import sys
+import json
+import hashlib
+import unittest
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+import backtrader as bt
+import trader
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILES = ['005918_history.csv', '016566_history.csv', '017437_history.csv']
+GOLDEN_JSON = os.path.join(ROOT, 'test_trader_golden.json')
+STRATEGIES = ['DailyTrendSwingStrategy', 'ScoredTaStrategy', 'OptimizedTaStrategy', 'NewTrendTaStrategy', 'MA20Strategy']
+CASH = 5000
+
+def _load_history(file_name):
+    """
+    读取基金净值历史，按净值构造确定的 OHLCV：
+    开盘取前一日净值，最高/最低取开盘与收盘的较大/较小值，成交量按当日涨跌幅放大
+    """
+    raw = pd.read_csv(os.path.join(ROOT, 'signals', file_name), encoding='utf-8-sig')
+    close = raw.iloc[:, 1].astype(float).to_numpy()
+    change = raw.iloc[:, 3].astype(float).fillna(0.0).to_numpy()
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close),
+        'low': np.minimum(open_, close),
+        'close': close,
+        'volume': np.round(100000 * (1 + np.abs(change))),
+    }, index=pd.DatetimeIndex(pd.to_datetime(raw.iloc[:, 0]), name='date'))
+
+def _run(df, strategy, **kwargs):
+    """
+    运行单个策略，返回 {最终资金, 操作建议, 日志摘要}，运行出错时返回 {异常类型}
+    基准版本没有 ArrayPandasData，使用 bt.feeds.PandasData
+    """
+    feed = getattr(trader, 'ArrayPandasData', bt.feeds.PandasData)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(feed(dataname=df))
+    cerebro.addstrategy(strategy, **kwargs)
+    cerebro.broker.setcash(CASH)
+    log = io.StringIO()
+    try:
+        with redirect_stdout(log):
+            strat = cerebro.run()[0]
+    except Exception as e:
+        return {'error': type(e).__name__}
+    return {
+        'value': cerebro.broker.getvalue(),
+        'signal': strat.get_signal() if hasattr(strat, 'get_signal') else None,
+        'log_sha256': hashlib.sha256(log.getvalue().encode('utf-8')).hexdigest(),
+        'log_lines': log.getvalue().count('\n'),
+    }
+
+def _cases():
+    """
+    遍历 (用例名, 数据, 策略类, 参数)：每个策略分别跑回测/建议模式，回测模式再分是否输出完整日志
+    """
+    for file_name in HISTORY_FILES:
+        df = _load_history(file_name)
+        code = file_name.split('_')[0]
+        for name in STRATEGIES:
+            strategy = getattr(trader, name)
+            has_full_log = 'full_log' in strategy.params._getkeys()
+            yield f'{code}|{name}|suggestion', df, strategy, dict(function='suggestion')
+            for full_log in ((False, True) if has_full_log else (None,)):
+                kwargs = dict(function='trend')
+                if full_log is not None:
+                    kwargs['full_log'] = full_log
+                yield f'{code}|{name}|trend|{full_log}', df, strategy, kwargs
+        yield f'{code}|DynamicAddReduceStrategy', df, trader.DynamicAddReduceStrategy, {}
+
+def generate_golden(path=GOLDEN_JSON):
+    """
+    生成基准结果，需在基于 bt 内置指标的原始 trader.py 下运行：
+        git worktree add /tmp/baseline 786fab4
+        cp test_trader.py /tmp/baseline/ && cp signals/*_history.csv /tmp/baseline/signals/
+        cd /tmp/baseline && python test_trader.py --golden <本仓库>/test_trader_golden.json
+    """
+    golden = {case: _run(df, strategy, **kwargs) for case, df, strategy, kwargs in _cases()}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(golden, f, ensure_ascii=False, indent=1, sort_keys=True)
+        f.write('\n')
+
+class GoldenStrategyTest(unittest.TestCase):
+    """
+    各策略在真实净值历史上的最终资金、操作建议与日志须与 bt 内置指标版本逐位一致
+    """
+
+    def test_strategies_match_baseline(self):
+        with open(GOLDEN_JSON, encoding='utf-8') as f:
+            golden = json.load(f)
+
+        seen = set()
+        for case, df, strategy, kwargs in _cases():
+            seen.add(case)
+            with self.subTest(case=case):
+                if 'error' in golden[case]:
+                    self.skipTest(f"基准版本运行出错: {golden[case]['error']}")
+                self.assertEqual(_run(df, strategy, **kwargs), golden[case])
+        self.assertEqual(seen, set(golden))
+
+def _combine_with_concat(df, forecast_change):
+    """原先构造单行 DataFrame 后 concat 的实现（不修改传入的 df），作为对照"""
+    df = df.copy()
+    volume = 0
+    if df["volume"].isnull().all():
+        df["volume"] = 0
+    else:
+        volume = df["volume"].iloc[-1]
+    forecast_nav = df['close'].iloc[-1] * (1 + forecast_change)
+    forecast_date = df.index[-1] + pd.Timedelta(days=1)
+    new_row = pd.DataFrame({'close': [forecast_nav], 'open': [forecast_nav], 'high': [forecast_nav],
+                            'low': [forecast_nav], 'volume': [volume]}, index=[forecast_date])
+    return pd.concat([df, new_row]), forecast_nav
+
+class CombineTodayInfoTest(unittest.TestCase):
+    columns = ['close', 'open', 'high', 'low', 'volume']
+
+    def test_appends_forecast_row(self):
+        df = _load_history('017437_history.csv')
+        original = df.copy()
+        df_today, forecast_nav = trader.combine_today_info(df, 0.005)
+
+        self.assertEqual(forecast_nav, df['close'].iloc[-1] * 1.005)
+        self.assertEqual(len(df_today), len(df) + 1)
+        self.assertEqual(df_today.index[-1], df.index[-1] + pd.Timedelta(days=1))
+        self.assertEqual(df_today[['close', 'open', 'high', 'low']].iloc[-1].tolist(), [forecast_nav] * 4)
+        self.assertEqual(df_today['volume'].iloc[-1], df['volume'].iloc[-1])
+        self.assertTrue((df_today['openinterest'] == 0).all())
+        pd.testing.assert_frame_equal(df, original)
+
+        expected, _ = _combine_with_concat(df, 0.005)
+        pd.testing.assert_frame_equal(df_today[self.columns], expected[self.columns], check_freq=False, check_names=False)
+        self.assertEqual(_run(df_today, trader.NewTrendTaStrategy, function='suggestion'),
+                         _run(expected, trader.NewTrendTaStrategy, function='suggestion'))
+
+    def test_missing_volume(self):
+        df = _load_history('017437_history.csv')
+        df['volume'] = np.nan
+        df_today, _ = trader.combine_today_info(df, -0.01)
+
+        self.assertTrue((df_today['volume'] == 0).all())
+        expected, _ = _combine_with_concat(df, -0.01)
+        pd.testing.assert_frame_equal(df_today[self.columns], expected[self.columns],
+                                      check_dtype=False, check_freq=False, check_names=False)
+
+class _FixedSignalStrategy(bt.Strategy):
+    """直接返回给定操作建议的策略，用于检查建议表情"""
+    params = dict(function='suggestion', full_log=False, signal='')
+
+    def get_signal(self):
+        return self.p.signal
+
+class SignalEmojiTest(unittest.TestCase):
+    signals = ['强势上升趋势，建议积极加仓 400.00', '全仓买入', '低位低吸 200.00', '下跌趋势，但无可减仓位',
+               '高位卖出 10%', 'UT → UT，无操作', '未明确信号，保守处理', '', '加仓后卖出', '卖出\n减仓 20%']
+
+    def _emoji(self, signal):
+        match = trader._SIGNAL_EMOJI_RE.match(signal)
+        return trader._SIGNAL_EMOJIS[match.group(match.lastindex)] if match else '😐'
+
+    def test_matches_keyword_priority(self):
+        for signal in self.signals:
+            with self.subTest(signal=signal):
+                # 原先按字典顺序逐个关键字查找的写法
+                expected = next((e for key, e in trader._SIGNAL_EMOJIS.items() if key in signal), '😐')
+                self.assertEqual(self._emoji(signal), expected)
+
+        self.assertEqual(self._emoji('下跌趋势，但无可减仓位'), '📉')
+        self.assertEqual(self._emoji('卖出\n减仓 20%'), '📉')
+        self.assertEqual(self._emoji('未明确信号，保守处理'), '😐')
+
+    def test_ceboro_suggestion_prints_emoji(self):
+        df = _load_history('017437_history.csv')
+        for signal, emoji in (('全仓买入', '🛒'), ('下跌趋势，但无可减仓位', '📉'), ('', '😐')):
+            with self.subTest(signal=signal):
+                strategy = type('Strategy', (_FixedSignalStrategy,), {'params': dict(signal=signal)})
+                log = io.StringIO()
+                with redirect_stdout(log):
+                    self.assertEqual(trader.ceboro_suggestion(df, strategy, 1.0, 0.0), signal)
+                self.assertIn(f"{emoji} 今日操作建议: {signal or '无'}", log.getvalue())
+
+class RunSweepTest(unittest.TestCase):
+
+    def test_matches_serial_runs(self):
+        frames = {code: _load_history(f'{code}_history.csv') for code in ('016566', '017437')}
+        grid = {'initial_amount': [1000.0, 2000.0], 'daily_amount': [100.0, 200.0]}
+        result = trader.run_sweep(trader.DailyTrendSwingStrategy, grid, frames, CASH)
+
+        self.assertEqual(len(result), 8)
+        self.assertTrue(result['roi'].is_monotonic_decreasing)
+        for row in result.itertuples():
+            params = dict(initial_amount=row.initial_amount, daily_amount=row.daily_amount)
+            expected = _run(frames[row.data], trader.DailyTrendSwingStrategy, function='trend', **params)
+            self.assertEqual(row.final_value, expected['value'])
+            self.assertEqual(row.roi, expected['value'] / CASH - 1)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--golden']:
+        generate_golden(*sys.argv[2:3])
+    else:
+        unittest.main()
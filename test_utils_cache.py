@@ -0,0 +1,101 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+import utils_cache
+
+class FileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(utils_cache, 'CACHE_DIR', tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache_dir = tmp.name
+        self.calls = 0
+
+    def _cached(self, value, ttl_days=1, daily=False):
+        """
+        用 file_cache 包装一个返回固定值的函数，self.calls 记录实际调用次数
+        """
+        @utils_cache.file_cache(ttl_days=ttl_days, namespace='test', daily=daily)
+        def fetch(code, items=10):
+            self.calls += 1
+            return value
+        return fetch
+
+    def _cache_files(self):
+        folder = os.path.join(self.cache_dir, 'test')
+        return [os.path.join(folder, name) for name in os.listdir(folder)] if os.path.isdir(folder) else []
+
+    def test_frame_round_trip(self):
+        df = pd.DataFrame({'股票代码': ['000001', '159915'], '单位净值': [1.2345678901234567, 0.1 + 0.2]})
+        fetch = self._cached(df)
+        fetch('005918')
+        cached = fetch('005918')
+        self.assertEqual(self.calls, 1)
+        # 代码保留前导 0，浮点数逐位还原
+        pd.testing.assert_frame_equal(cached, df)
+
+    def test_series_and_json_round_trip(self):
+        series = pd.Series({'基金简称': '测试基金', '基金代码': '005918'})
+        fetch = self._cached(series)
+        fetch('005918')
+        pd.testing.assert_series_equal(fetch('005918'), series)
+
+        fetch = self._cached({'rate': 0.5})
+        fetch('x')
+        self.assertEqual(fetch('x'), {'rate': 0.5})
+
+    def test_key_includes_arguments(self):
+        fetch = self._cached(pd.Series([1.0]))
+        fetch('005918', items=10)
+        fetch('005918', items=20)
+        fetch('017437', items=10)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(len(self._cache_files()), 3)
+
+    def test_empty_result_not_cached(self):
+        for value in (None, pd.DataFrame(), pd.Series(dtype=float)):
+            self.calls = 0
+            fetch = self._cached(value)
+            fetch('005918')
+            fetch('005918')
+            self.assertEqual(self.calls, 2)
+        self.assertEqual(self._cache_files(), [])
+
+    def test_expired_entry_refetched(self):
+        fetch = self._cached(pd.Series([1.0]), ttl_days=1)
+        fetch('005918')
+        old = time.time() - 2 * 24 * 3600
+        for path in self._cache_files():
+            os.utime(path, (old, old))
+        fetch('005918')
+        self.assertEqual(self.calls, 2)
+
+    def test_corrupt_entry_refetched(self):
+        fetch = self._cached(pd.Series([1.0]))
+        fetch('005918')
+        for path in self._cache_files():
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('{')
+        pd.testing.assert_series_equal(fetch('005918'), pd.Series([1.0]))
+        self.assertEqual(self.calls, 2)
+
+    def test_daily_entry_expires_next_day(self):
+        fetch = self._cached(pd.Series([1.0]), ttl_days=0.25, daily=True)
+        with mock.patch.object(utils_cache, '_today', return_value='2025-01-02'):
+            fetch('005918')
+            fetch('005918')
+            self.assertEqual(self.calls, 1)
+        # 换日后即使仍在 ttl 内也重新请求
+        with mock.patch.object(utils_cache, '_today', return_value='2025-01-03'):
+            fetch('005918')
+            fetch('005918')
+        self.assertEqual(self.calls, 2)
+
+if __name__ == "__main__":
+    unittest.main()
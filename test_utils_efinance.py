@@ -0,0 +1,94 @@
+import io
+import unittest
+from unittest import mock
+from contextlib import redirect_stdout
+import utils_efinance
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+# 历史净值接口（F10DataApi.aspx?type=lsjz）一页响应的结构：表头为 th，数据行为 td，属性引号带反斜杠转义
+HISTORY_PAGE = (
+    'var apidata={ content:"<table class=\\\'w782 comm lsjz\\\'><thead><tr><th class=\\\'first\\\'>净值日期</th>'
+    '<th>单位净值</th><th>累计净值</th><th>日增长率</th><th>申购状态</th><th>赎回状态</th><th class=\\\'tor last\\\'>分红送配</th>'
+    '</tr></thead><tbody>'
+    '<tr><td>2025-01-03</td><td class=\\\'tor bold\\\'>1.2345</td><td class=\\\'tor bold\\\'>1.5345</td>'
+    '<td class=\\\'tor bold red\\\'>1.23%</td><td>开放申购</td><td>开放赎回</td><td class=\\\'red unbold\\\'></td></tr>'
+    '<tr><td>2025-01-02</td><td class=\\\'tor bold\\\'>1.2195</td><td class=\\\'tor bold\\\'>1.5195</td>'
+    '<td class=\\\'tor bold grn\\\'>-0.50%</td><td>开放申购</td><td>开放赎回</td><td class=\\\'red unbold\\\'></td></tr>'
+    '<tr><td>2024-12-31</td><td class=\\\'tor bold\\\'>1.2256</td><td class=\\\'tor bold\\\'>1.5256</td>'
+    '<td class=\\\'tor bold\\\'></td><td>封闭期</td><td>封闭期</td><td class=\\\'red unbold\\\'><span>每份派现金0.0100元</span></td></tr>'
+    '</tbody></table>",records:3,pages:1,curpage:1};'
+)
+
+def _parse_with_soup(text):
+    """原先基于 BeautifulSoup 的解析，作为对照"""
+    html = text.split('content:"')[1].split('",records')[0].replace("\\", "")
+    rows = []
+    for tr in BeautifulSoup(html, "html.parser").find_all("tr")[1:]:
+        tds = tr.find_all("td")
+        if len(tds) < 4:
+            continue
+        rate = tds[3].text.strip().replace("%", "")
+        rows.append([tds[0].text.strip(), float(tds[1].text.strip()), float(tds[2].text.strip()),
+                     float(rate) if rate else None])
+    return rows
+
+class ParseHistoryPageTest(unittest.TestCase):
+
+    def test_rows(self):
+        self.assertEqual(utils_efinance._parse_history_page(HISTORY_PAGE), [
+            ['2025-01-03', 1.2345, 1.5345, 1.23],
+            ['2025-01-02', 1.2195, 1.5195, -0.5],
+            ['2024-12-31', 1.2256, 1.5256, None],
+        ])
+
+    def test_empty_page(self):
+        text = 'var apidata={ content:"<table><thead><tr><th>净值日期</th></tr></thead><tbody>' \
+               '<tr><td colspan=\\\'7\\\'>暂无数据!</td></tr></tbody></table>",records:0,pages:0,curpage:1};'
+        self.assertEqual(utils_efinance._parse_history_page(text), [])
+
+    @unittest.skipIf(BeautifulSoup is None, 'bs4 未安装')
+    def test_matches_beautifulsoup(self):
+        self.assertEqual(utils_efinance._parse_history_page(HISTORY_PAGE), _parse_with_soup(HISTORY_PAGE))
+
+class RealtimeRateTest(unittest.TestCase):
+
+    def _rate(self, fund=None, snapshot=None, history=None):
+        """
+        替换三个涨跌幅来源，返回 (结果, 输出, 各来源替身)；来源参数为返回值或异常
+        """
+        mocks = {}
+        for name, result in (('_fund_realtime_rate', fund), ('_etf_snapshot_rate', snapshot),
+                             ('_etf_history_rate', history)):
+            mocks[name] = mock.Mock(side_effect=result) if isinstance(result, Exception) \
+                else mock.Mock(return_value=result or (None, None))
+        log = io.StringIO()
+        with mock.patch.multiple('utils_efinance', **mocks), redirect_stdout(log):
+            result = utils_efinance.get_realtime_rate('005918', '159915')
+        return result, log.getvalue(), mocks
+
+    def test_fund_estimate_first(self):
+        result, _, mocks = self._rate(fund=(0.8, '基金'), snapshot=(1.0, 'ETF'))
+        self.assertEqual(result, (0.8, '基金'))
+        mocks['_fund_realtime_rate'].assert_called_once_with('005918')
+        mocks['_etf_snapshot_rate'].assert_not_called()
+        mocks['_etf_history_rate'].assert_not_called()
+
+    def test_falls_back_on_missing_rate(self):
+        for fund in ((None, '基金'), (float('nan'), '基金'), (0.0, '基金'), ValueError('timeout')):
+            with self.subTest(fund=fund):
+                result, _, mocks = self._rate(fund=fund, snapshot=(None, 'ETF'), history=(-1.2, 'ETF'))
+                self.assertEqual(result, (-1.2, 'ETF'))
+                mocks['_etf_snapshot_rate'].assert_called_once_with('159915')
+
+    def test_all_sources_fail(self):
+        error = ValueError('timeout')
+        result, log, _ = self._rate(fund=error, snapshot=error, history=error)
+        self.assertEqual(result, (None, None))
+        self.assertIn('005918', log)
+
+if __name__ == "__main__":
+    unittest.main()
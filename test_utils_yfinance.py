@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+import pandas as pd
+import utils_yfinance
+
+def _download_frame(stock_code):
+    """yf.download(group_by='ticker') 返回的结构：两层列（代码, 字段），索引名为 Date"""
+    index = pd.DatetimeIndex(['2025-01-02', '2025-01-03'], name='Date')
+    columns = pd.MultiIndex.from_product([[stock_code], ['Open', 'High', 'Low', 'Close', 'Volume']],
+                                         names=['Ticker', 'Price'])
+    return pd.DataFrame([[1.0, 2.0, 0.5, 1.5, 100], [1.5, 2.5, 1.0, 2.0, 200]], index=index, columns=columns)
+
+class GetUsaStockTest(unittest.TestCase):
+
+    def test_empty_history_matches_normalized_structure(self):
+        with mock.patch.object(utils_yfinance.yf, 'download', return_value=_download_frame('AAPL')):
+            history = utils_yfinance.get_usa_stock_yf('AAPL')
+        with mock.patch.object(utils_yfinance.yf, 'download', return_value=pd.DataFrame()):
+            empty = utils_yfinance.get_usa_stock_yf('AAPL')
+
+        self.assertTrue(empty.empty)
+        self.assertIsInstance(empty.index, pd.DatetimeIndex)
+        self.assertEqual(empty.index.name, history.index.name)
+        self.assertEqual(list(empty.columns), list(history.columns))
+
+    def test_current_without_history(self):
+        info = {'currentPrice': 101.0, 'regularMarketPreviousClose': 100.0, 'dayLow': 99.0, 'dayHigh': 102.0,
+                'volume': 1000, 'regularMarketOpen': 100.5}
+        ticker = mock.Mock()
+        ticker.get_info.return_value = info
+        with mock.patch.object(utils_yfinance.yf, 'download', return_value=pd.DataFrame()), \
+                mock.patch.object(utils_yfinance.yf, 'Ticker', return_value=ticker):
+            df, price, change = utils_yfinance.get_usa_stock_yf('AAPL', 'current')
+
+        self.assertEqual(len(df), 1)
+        self.assertIsInstance(df.index, pd.DatetimeIndex)
+        self.assertEqual(df['close'].iloc[-1], 101.0)
+        self.assertEqual(price, 101.0)
+        self.assertAlmostEqual(change, 0.01)
+
+if __name__ == "__main__":
+    unittest.main()
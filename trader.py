@@ -1,6 +1,348 @@
+import io
+import os
+import math
+import re
+import array
+import itertools
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 import backtrader as bt
 import numpy as np
 import backtrader.analyzers as btanalyzers
+from numpy.lib.stride_tricks import sliding_window_view
+from utils_njit import njit, NUMBA_AVAILABLE
+
+def _rolling_mean(values, period):
+    """
+    与 bt.ind.SMA 口径一致的滑动均值（math.fsum 精确求和后除以周期），前 period-1 个为 NaN
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1:] = [math.fsum(window) for window in sliding_window_view(values, period)]
+        out[period - 1:] /= period
+    return out
+
+def _rolling_max(values, period):
+    """
+    与 bt.ind.Highest 一致的滑动最大值，前 period-1 个为 NaN
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1:] = sliding_window_view(values, period).max(axis=1)
+    return out
+
+def _rolling_min(values, period):
+    """
+    与 bt.ind.Lowest 一致的滑动最小值，前 period-1 个为 NaN
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1:] = sliding_window_view(values, period).min(axis=1)
+    return out
+
+def _pow(values, exponent):
+    """
+    与 bt 指标线 pow() 逐元素一致的乘方（Python 浮点 pow；numpy 会把 **2 / **0.5 换成乘法 / 开方，末位可能不同）
+    """
+    return np.array([value ** exponent for value in values.tolist()], dtype=np.float64)
+
+def _bollinger(values, period, devfactor=2.0):
+    """
+    与 bt.ind.BollingerBands 一致的布林带，返回 (mid, top, bot)
+    """
+    mid = _rolling_mean(values, period)
+    std = _pow(np.abs(_rolling_mean(_pow(values, 2), period) - _pow(mid, 2)), 0.5)
+    return mid, mid + devfactor * std, mid - devfactor * std
+
+def _stddev(values, period):
+    """
+    与 bt.ind.StandardDeviation 一致的滑动标准差，前 period-1 个为 NaN
+    """
+    mean = _rolling_mean(values, period)
+    return _pow(np.abs(_rolling_mean(_pow(values, 2), period) - _pow(mean, 2)), 0.5)
+
+def _lookback(values, agos):
+    """
+    每个 bar 往前 agos 根的取值，返回 (len(values), len(agos)) 矩阵；下标越界时与 LineBuffer 负下标一样回绕
+    """
+    index = np.arange(len(values))[:, None] - np.asarray(agos)
+    return np.take(values, index, mode='wrap')
+
+def _lookback_sum(values, period):
+    """
+    当日及之前 period-1 个 bar 的和，按从近到远的顺序逐列累加（与逐 bar 的 sum(line[-i] ...) 结果一致）
+    """
+    total = np.zeros(len(values))
+    for column in _lookback(values, range(period)).T:
+        total += column
+    return total
+
+def _new_low_high(close, period=5):
+    """
+    收盘价是否低于前 period 日最低价 / 高于前 period 日最高价，返回 (new_low, new_high) 两个 bool 数组
+    """
+    previous = _lookback(close, range(1, period + 1))
+    return close < previous.min(axis=1), close > previous.max(axis=1)
+
+def _volume_ratio(volume, vol_sma):
+    """
+    成交量与其均线之比，均线无效（NaN 或 ≤ 0）时记为 0
+    """
+    ratio = np.zeros(len(volume))
+    np.divide(volume, vol_sma, out=ratio, where=vol_sma > 0)
+    return ratio
+
+def _volume_states(close, vol_ratio, new_low, new_high):
+    """
+    量价状态判断，返回 (放量突破, 缩量, 看涨量价背离, 看跌量价背离) 四个 bool 数组
+    放量突破：成交量是均量 2 倍以上且价格上涨；缩量：成交量低于均量 50%
+    看涨背离：价格创新低但成交量放大（> 1.5 倍）；看跌背离：价格创新高但成交量萎缩（< 0.7 倍）
+    """
+    breakout = (vol_ratio > 2.0) & (close > _shift(close))
+    shrink = (0.0 < vol_ratio) & (vol_ratio < 0.5)
+    bullish = new_low & (vol_ratio > 1.5)
+    bearish = new_high & (0.0 < vol_ratio) & (vol_ratio < 0.7)
+    return breakout, shrink, bullish, bearish
+
+def _long_down_trend(close, ema20, ema60, ema120, period=30):
+    """
+    长下跌趋势判断，返回 bool 数组；以下 5 个条件满足 ≥3 个即成立，前 period 个 bar 历史不足记为不成立
+    下跌天数占比 ≥ 50%、period 日累计跌幅 ≤ -10%、均线空头排列且 EMA120 下行、收盘价低于 EMA120、
+    近 period 日收盘价贴近最低价（≤ 最低价 * 1.01）的天数占比 ≥ 40%
+    """
+    n = len(close)
+    bars = np.arange(period + 1, n)
+    if not len(bars):
+        return np.zeros(n, dtype=bool)
+
+    # 前 period 个交易日中，收盘价低于其前一日的天数
+    down = np.zeros(n, dtype=np.int64)
+    down[1:] = close[1:] < close[:-1]
+    down_count = np.concatenate(([0], np.cumsum(down)))
+    down_days = down_count[bars] - down_count[bars - period]
+
+    base = close[bars - period]
+    cum_return = (close[bars] - base) / base
+
+    recent = sliding_window_view(close, period)[bars - period + 1]
+    lowest = recent.min(axis=1)
+    new_low_count = np.count_nonzero(recent <= lowest[:, None] * 1.01, axis=1)
+
+    score = (
+        (down_days / period >= 0.5).astype(np.int64)
+        + (cum_return <= -0.1)
+        + ((ema20[bars] < ema60[bars]) & (ema60[bars] < ema120[bars]) & (ema120[bars] < ema120[bars - 5]))
+        + (close[bars] < ema120[bars])
+        + (new_low_count / period >= 0.4)
+    )
+
+    out = np.zeros(n, dtype=bool)
+    out[bars] = score >= 3
+    return out
+
+@njit(cache=True)
+def _smoothing_loop(values, out, first, alpha, alpha1):
+    """
+    指数平滑递推：out[i] = out[i-1] * alpha1 + values[i] * alpha
+    """
+    prev = out[first]
+    for i in range(first + 1, len(values)):
+        prev = prev * alpha1 + values[i] * alpha
+        out[i] = prev
+
+def _exp_smoothing(values, period, alpha):
+    """
+    与 bt.ind.ExponentialSmoothing 口径一致：以首个有效窗口的均值为种子，之后逐 bar 指数平滑
+    """
+    out = _rolling_mean(values, period)
+    valid = np.flatnonzero(~np.isnan(out))
+    if len(valid):
+        _smoothing_loop(values, out, valid[0], alpha, 1.0 - alpha)
+    return out
+
+def _ema(values, period):
+    """
+    与 bt.ind.EMA 一致的指数移动平均
+    """
+    return _exp_smoothing(values, period, 2.0 / (1.0 + period))
+
+def _smma(values, period):
+    """
+    与 bt.ind.SMMA 一致的 Wilder 平滑均线（RSI / ATR 使用）
+    """
+    return _exp_smoothing(values, period, 1.0 / period)
+
+def _shift(values):
+    """
+    前一个 bar 的取值，首个为 NaN（对应 bt 指标线的 line(-1)）
+    """
+    out = np.full(len(values), np.nan)
+    out[1:] = values[:-1]
+    return out
+
+def _momentum(values, period):
+    """
+    与 bt.ind.Momentum 一致：当日值减去 period 个 bar 之前的值，前 period 个为 NaN
+    """
+    out = np.full(len(values), np.nan)
+    out[period:] = values[period:] - values[:-period]
+    return out
+
+def _rsi(close, period=14):
+    """
+    与 bt.ind.RSI 一致：涨跌幅分别做 Wilder 平滑后求 RS
+    """
+    prev_close = _shift(close)
+    up_day = np.where(0.0 > close - prev_close, 0.0, close - prev_close)
+    down_day = np.where(0.0 > prev_close - close, 0.0, prev_close - close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = _smma(up_day, period) / _smma(down_day, period)
+        return 100.0 - 100.0 / (1.0 + rs)
+
+def _atr(high, low, close, period=14):
+    """
+    与 bt.ind.ATR 一致：真实波幅的 Wilder 平滑
+    """
+    prev_close = _shift(close)
+    true_high = np.where(prev_close > high, prev_close, high)
+    true_low = np.where(prev_close < low, prev_close, low)
+    true_range = true_high - true_low
+    true_range[0] = np.nan  # 首根 bar 没有前收盘价
+    return _smma(true_range, period)
+
+def _kdj(high, low, close, period=14, period_dfast=3, period_dslow=3):
+    """
+    KDJ 指标，返回 (K, D, J)
+    K / D 与 bt.ind.Stochastic 的 percK / percD 一致，J = 3K - 2D
+    """
+    highest = _rolling_max(high, period)
+    lowest = _rolling_min(low, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k_fast = 100.0 * ((close - lowest) / (highest - lowest))
+    perc_k = _rolling_mean(k_fast, period_dfast)
+    perc_d = _rolling_mean(perc_k, period_dslow)
+    # J 在 3K 的结果上原地相减，少一个中间数组
+    kdj_j = 3 * perc_k
+    kdj_j -= 2 * perc_d
+    return perc_k, perc_d, kdj_j
+
+def _directional(high, low, close, period=14):
+    """
+    与 bt.ind.PlusDI / MinusDI / ADX 一致的趋向指标，返回 (+DI, -DI, ADX)
+    """
+    up_move = high - _shift(high)
+    down_move = _shift(low) - low
+    plus_dm = np.where((up_move > down_move) & (up_move > 0.0), up_move, 0.0)
+    minus_dm = np.where((down_move > up_move) & (down_move > 0.0), down_move, 0.0)
+    plus_dm[0] = minus_dm[0] = np.nan  # 首根 bar 没有前一日高低点
+    atr = _atr(high, low, close, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100.0 * _smma(plus_dm, period) / atr
+        minus_di = 100.0 * _smma(minus_dm, period) / atr
+        dx = np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    return plus_di, minus_di, 100.0 * _smma(dx, period)
+
+def _cross_over(values0, values1):
+    """
+    与 bt.ind.CrossOver 一致：values0 上穿 values1 为 1，下穿为 -1，否则为 0
+    差值为 0 的 bar 沿用之前最近一个非零差值（首个有效差值作为种子），判断上一 bar 的方向
+    """
+    diff = values0 - values1
+    keep = diff != 0
+    valid = np.flatnonzero(~np.isnan(diff))
+    if len(valid):
+        keep[:valid[0] + 1] = True
+    index = np.maximum.accumulate(np.where(keep, np.arange(len(diff)), 0))
+    before = _shift(diff[index])
+    up = (before < 0.0) & (values0 > values1)
+    down = (before > 0.0) & (values0 < values1)
+    return up.astype(np.float64) - down
+
+def _rescaled_range(windows):
+    """
+    沿最后一维计算 R/S 法 Hurst 指数，R 或 S 为 0 时为 NaN
+    """
+    dev = windows - windows.mean(axis=-1, keepdims=True)
+    cum = np.cumsum(dev, axis=-1)
+    r = cum.max(axis=-1) - cum.min(axis=-1)
+    s = np.std(windows, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hurst = np.log(r / s) / np.log(windows.shape[-1])
+    return np.where((s == 0) | (r == 0), np.nan, hurst)
+
+def _hurst(values, period=120, min_periods=60):
+    """
+    与 HurstExponent 指标一致：窗口为最近 min(period, 已有 bar 数) 个值，不足 min_periods 个 bar 时为 NaN
+    """
+    out = np.full(len(values), np.nan)
+    # 窗口尚未达到 period 的前段逐个计算
+    for end in range(min_periods, min(period, len(values) + 1)):
+        out[end - 1] = _rescaled_range(values[:end])
+    if len(values) >= period:
+        out[period - 1:] = _rescaled_range(sliding_window_view(values, period))
+    return out
+
+@njit(cache=True)
+def _replay_fills(sizes, prices):
+    """
+    按成交顺序回放持仓（平均成本法），与逐笔 notify_order 累加的口径一致
+    返回 (持仓份额, 持仓成本, 已实现盈亏, 历史最高持仓, 每笔已实现盈亏, 每笔后持仓份额, 每笔后持仓成本)
+    """
+    n = len(sizes)
+    realized = np.zeros(n)
+    shares = np.empty(n)
+    costs = np.empty(n)
+    hold_shares = 0.0
+    hold_cost = 0.0
+    realized_pnl = 0.0
+    max_hold_shares = 0.0
+    for k in range(n):
+        ex_size = sizes[k]
+        ex_price = prices[k]
+        avg_cost = hold_cost / hold_shares if hold_shares > 0 else 0.0
+
+        hold_shares += ex_size
+        hold_cost += ex_size * ex_price
+
+        if ex_size < 0:
+            realized[k] = -ex_size * (ex_price - avg_cost)
+            realized_pnl += realized[k]
+
+        if hold_shares < 1e-12:
+            hold_shares = 0.0
+            hold_cost = 0.0
+
+        if hold_shares > max_hold_shares:
+            max_hold_shares = hold_shares
+
+        shares[k] = hold_shares
+        costs[k] = hold_cost
+    return hold_shares, hold_cost, realized_pnl, max_hold_shares, realized, shares, costs
+
+def _flush_log(lines):
+    """
+    一次性输出策略缓存的日志并清空，避免逐 bar print
+    """
+    if lines:
+        print('\n'.join(lines))
+        lines.clear()
+
+def _format_signal(signal):
+    """
+    格式化操作建议；next() 中只记录 (模板, 参数...)，取用时再拼接字符串，逐 bar 覆盖时不必每次格式化
+    """
+    if isinstance(signal, tuple):
+        template, *args = signal
+        return template.format(*args)
+    return signal
+
+# 趋势编码：上涨 / 下跌 / 横盘，及日志中对应的名称
+TREND_UP, TREND_DOWN, TREND_SIDEWAYS = 1, -1, 0
+TREND_NAMES = {TREND_UP: 'up', TREND_DOWN: 'down', TREND_SIDEWAYS: 'sideways'}
+
+# 加减仓状态编码，及日志中对应的名称
+STATE_INIT, STATE_HOLD, STATE_ADD, STATE_REDUCE = 0, 1, 2, 3
+STATE_NAMES = {STATE_INIT: 'INIT', STATE_HOLD: 'HOLD', STATE_ADD: 'ADD', STATE_REDUCE: 'REDUCE'}
 
 class DynamicAddReduceStrategy(bt.Strategy):
     """
@@ -20,8 +362,11 @@ class DynamicAddReduceStrategy(bt.Strategy):
     )
 
     def __init__(self):
+        # 日志先缓存在内存中，stop() 时一次性输出
+        self.log_lines = []
+
         self.nav = self.datas[0].close
-        self.state = 'INIT'
+        self.state = STATE_INIT
         self.entry_price = 0
         self.last_nav = 0
         self.start_value = 0
@@ -31,41 +376,38 @@ class DynamicAddReduceStrategy(bt.Strategy):
         self.total_invested = 0.0
         self.hold_shares = 0.0
         self.hold_cost = 0.0
+        # 持仓份额（在 notify_order 中按成交同步，与 broker 持仓一致）
+        self.pos_size = 0.0
+
+        # 趋势只依赖收盘价，数据已预加载（cerebro 默认 preload=True），在此一次性向量化计算，
+        # next() 中按 bar 序号取值，避免逐 bar 访问 backtrader 指标线
+        close = np.asarray(self.nav.array, dtype=np.float64)
         # 均线
-        self.sma_short = bt.ind.SMA(self.datas[0], period=5)
-        self.sma_long = bt.ind.SMA(self.datas[0], period=20)
-        # 高低点
-        self.highest = bt.ind.Highest(self.datas[0].close, period=10)
-        self.lowest = bt.ind.Lowest(self.datas[0].close, period=10)
+        sma_short = _rolling_mean(close, 5)
+        sma_long = _rolling_mean(close, 20)
+        # 前一日的 10 日高低点
+        prev_highest = np.full(len(close), np.nan)
+        prev_lowest = np.full(len(close), np.nan)
+        prev_highest[1:] = _rolling_max(close, 10)[:-1]
+        prev_lowest[1:] = _rolling_min(close, 10)[:-1]
+
+        # 高低点趋势优先，横盘时看均线趋势；用 1 / -1 / 0 编码（NaN 比较为 False，记为横盘）
+        hl_trend = ((close >= prev_highest) & (close > prev_lowest)).astype(np.int8) \
+            - ((close <= prev_lowest) & (close < prev_highest))
+        ma_trend = (sma_short > sma_long).astype(np.int8) - (sma_short < sma_long)
+        self.trends = np.where(hl_trend != TREND_SIDEWAYS, hl_trend, ma_trend).astype(np.int8).tolist()
 
     def next(self):
+        # 与原 SMA20 指标的最小周期一致，第 20 根 bar 起才开始操作
+        if len(self) < 20:
+            return
+
         nav = self.nav[0]
         date = self.datas[0].datetime.date(0)
-
-        # 高低点趋势
-        if nav >= self.highest[-1] and nav > self.lowest[-1]:
-            hl_trend = 'up'
-        elif nav <= self.lowest[-1] and nav < self.highest[-1]:
-            hl_trend = 'down'
-        else:
-            hl_trend = 'sideways'
-
-        # 均线趋势
-        if self.sma_short[0] > self.sma_long[0]:
-            ma_trend = 'up'
-        elif self.sma_short[0] < self.sma_long[0]:
-            ma_trend = 'down'
-        else:
-            ma_trend = 'sideways'
-
-        # 综合判断：高低点优先
-        if hl_trend != 'sideways':
-            trend = hl_trend
-        else:
-            trend = ma_trend
+        trend = self.trends[len(self) - 1]
 
         # 初始建仓
-        if self.state == 'INIT':
+        if self.state == STATE_INIT:
             amount = min(2000.0, self.broker.getcash())
             size = amount / nav
             self.buy(size=size)
@@ -73,56 +415,47 @@ class DynamicAddReduceStrategy(bt.Strategy):
             self.total_invested += amount
             self.last_nav = nav
             self.start_nav = nav
-            self.state = 'HOLD'
+            self.state = STATE_HOLD
             self.recent_high = nav
             self.recent_low = nav
             self.log(f"{date} 初始建仓 {size:.2f} 份 @ {nav:.4f}")
             return
 
-        # 先计算累计涨跌幅（相对于当前极值）
-        acc_rise = nav / self.recent_low - 1.0  if nav > self.recent_low else 0.0 # 相对于低点的涨幅
-        acc_drop = nav / self.recent_high - 1.0 if nav < self.recent_high else 0.0 # 相对于高点的跌幅
+        # 当前持仓份额，加仓 / 减仓分支共用
+        position_size = self.pos_size
 
         # 状态切换
-        if self.state == 'HOLD' or self.state == 'REDUCE':
-            if trend == 'up':  #acc_rise >= self.p.add_threshold
-                self.state = 'ADD'
-            elif trend == 'sideways':
-                self.state = 'HOLD'
-        elif self.state == 'HOLD' or self.state == 'ADD':
-            if trend == 'down':  #acc_drop <= self.p.reduce_threshold or
-                self.state = 'REDUCE'
-            elif trend == 'sideways':
-                self.state = 'HOLD'
-        elif trend == 'sideways':
-            self.state = 'HOLD'
-
-        if self.state == 'ADD':
-            # 加仓阶段每天加仓200元
-            cash_available = self.broker.getcash()
-            add_size = 0.03 * self.getposition().size
-            size_amount = add_size * nav
-            max_amount = max(self.p.daily_min_amount, size_amount)
-            amount = min(max_amount, cash_available, self.p.daily_max_amount)
+        if trend == TREND_SIDEWAYS:
+            self.state = STATE_HOLD
+        elif self.state == STATE_HOLD or self.state == STATE_REDUCE:
+            if trend == TREND_UP:  #acc_rise >= self.p.add_threshold
+                self.state = STATE_ADD
+        elif self.state == STATE_ADD:
+            if trend == TREND_DOWN:  #acc_drop <= self.p.reduce_threshold or
+                self.state = STATE_REDUCE
+
+        if self.state == STATE_ADD:
+            # 加仓阶段每天按持仓市值的 3% 加仓，限制在 [daily_min_amount, daily_max_amount] 且不超过可用现金
+            amount = min(max(self.p.daily_min_amount, 0.03 * position_size * nav),
+                         self.broker.getcash(), self.p.daily_max_amount)
             if amount > 0:
                 size = amount / nav
                 self.buy(size=size)
                 self.total_invested += amount
+                self._log_day(date, nav, trend)
                 self.recent_low = nav
-                self.log(f"{date} 当日：{nav:.4f}，累计涨幅: {acc_rise:.2%}，累计跌幅: {acc_drop:.2%}, 趋势: {trend}，状态: {self.state}")
                 self.log(f"{date} 加仓 {size:.2f} 份 @ {nav:.4f}")
                 self.hold_shares += size
                 self.hold_cost += size * nav
 
-        elif self.state == 'REDUCE':
+        elif self.state == STATE_REDUCE:
             # 减仓阶段，如果基金下跌（今日 NAV < 昨日 NAV）则减仓
             if nav < self.last_nav:
-                position_size = self.getposition().size
                 size_to_sell = position_size * self.p.reduce_fraction
                 if size_to_sell > 0:
                     self.sell(size=size_to_sell)
+                    self._log_day(date, nav, trend)
                     self.recent_high = nav
-                    self.log(f"{date} 当日：{nav:.4f}，累计涨幅: {acc_rise:.2%}，累计跌幅: {acc_drop:.2%}, 趋势: {trend}，状态: {self.state}")
                     self.log(f"{date} 减仓 {size_to_sell:.2f} 份 @ {nav:.4f}")
                     if self.hold_shares > 0:
                         avg_cost = self.hold_cost / self.hold_shares
@@ -133,17 +466,32 @@ class DynamicAddReduceStrategy(bt.Strategy):
                     self.hold_cost -= size_to_sell * avg_cost
 
         # 更新极值
-        self.recent_high = max(self.recent_high, nav)
-        self.recent_low = min(self.recent_low, nav)
+        if nav > self.recent_high:
+            self.recent_high = nav
+        if nav < self.recent_low:
+            self.recent_low = nav
 
         # 更新 last_nav
         self.last_nav = nav
 
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.pos_size += order.executed.size
+
+    def _log_day(self, date, nav, trend):
+        """
+        记录当日净值、相对当前极值的累计涨跌幅及趋势状态；只在有操作的 bar 调用，须在更新极值前调用
+        """
+        acc_rise = nav / self.recent_low - 1.0 if nav > self.recent_low else 0.0  # 相对于低点的涨幅
+        acc_drop = nav / self.recent_high - 1.0 if nav < self.recent_high else 0.0  # 相对于高点的跌幅
+        self.log(f"{date} 当日：{nav:.4f}，累计涨幅: {acc_rise:.2%}，累计跌幅: {acc_drop:.2%}, 趋势: {TREND_NAMES[trend]}，状态: {STATE_NAMES[self.state]}")
+
     def log(self, txt):
-        print(txt)
-        # pass
+        self.log_lines.append(txt)
 
     def stop(self):
+        _flush_log(self.log_lines)
+
         # 最终统计
         pos = self.getposition()
         final_value = pos.size * self.nav[0]
@@ -189,13 +537,62 @@ class DailyTrendSwingStrategy(bt.Strategy):
         function='suggestion', # 'trend' 用于回测，'suggestion' 用于生成建议
     )
 
+    # 预计算的指标不会出现在图中，绘图时由 ceboro_trend 添加对应的 bt 指标用于展示
+    plot_indicators = (
+        (bt.ind.SMA, dict(period=5)),
+        (bt.ind.SMA, dict(period=20)),
+        (bt.ind.SMA, dict(period=60)),
+        (bt.ind.BollingerBands, dict(period=20)),
+    )
+
     def __init__(self):
-        # 指标
+        # 日志先缓存在内存中，stop() 时一次性输出
+        self.log_lines = []
+        # 运行模式在整个回测中不变，预先判断一次，逐 bar 逻辑中直接使用布尔值
+        self._trend_mode = self.p.function == 'trend'
+        self._suggest_mode = self.p.function == 'suggestion'
+        self._log_enabled = self.p.function == 'single_trend'
+        # 逐 bar 读取的参数缓存为普通属性，省去每次经 self.p 的两级属性查找
+        self._initial_amount = self.p.initial_amount
+        self._daily_amount = self.p.daily_amount
+        self._add_on_pullback_ratio = self.p.add_on_pullback_ratio
+        self._reduce_step = self.p.reduce_step
+        self._bottom_ratio = self.p.bottom_ratio
+        self._sell_fraction_on_high = self.p.sell_fraction_on_high
+        self._min_cash_buffer = self.p.min_cash_buffer
+
+        # 指标只依赖预加载的收盘价，在此一次性向量化计算（与对应 bt 指标口径一致），next() 中按 bar 下标取值
         self.close = self.datas[0].close
-        self.ma_short = bt.ind.SMA(self.datas[0], period=self.p.ma_short)
-        self.ma_mid = bt.ind.SMA(self.datas[0], period=self.p.ma_mid)
-        self.ma_long = bt.ind.SMA(self.datas[0], period=self.p.ma_long)
-        self.bbands = bt.ind.BollingerBands(self.datas[0], period=self.p.boll_period)
+        close = np.asarray(self.close.array, dtype=np.float64)
+        ma_short = _rolling_mean(close, self.p.ma_short)
+        ma_mid = _rolling_mean(close, self.p.ma_mid)
+        ma_long = _rolling_mean(close, self.p.ma_long)
+        bb_mid, bb_top, bb_bot = _bollinger(close, self.p.boll_period)
+        self.ma_short, self.ma_mid, self.ma_long = ma_short.tolist(), ma_mid.tolist(), ma_long.tolist()
+        self.bb_mid, self.bb_top, self.bb_bot = bb_mid.tolist(), bb_top.tolist(), bb_bot.tolist()
+        # 与原 bt 指标中最长周期一致的预热长度
+        self.warmup = max(self.p.ma_short, self.p.ma_mid, self.p.ma_long, self.p.boll_period)
+
+        # 市场状态判定只依赖上述指标，预先算成布尔数组
+        # 上升：严格顺序 MA5 > MA20 > MA60 且 价格 > MA5
+        self.up_trend = ((ma_short > ma_mid) & (ma_mid > ma_long) & (close > ma_short)).tolist()
+        # 下跌：严格空头排列 MA5 < MA20 < MA60 且 价格 < MA20
+        self.down_trend = ((ma_short < ma_mid) & (ma_mid < ma_long) & (close < ma_mid)).tolist()
+        # MA5 与 MA20 在相对较小带宽内（纠缠）
+        denom = np.where(ma_mid != 0, ma_mid, 1)
+        entangled = np.abs(ma_short - ma_mid) / denom <= self.p.osc_band_tol
+        # 价格高于 MA60 -> 高位震荡；价格低于 MA60 -> 低位震荡
+        self.high_osc = (~(close <= ma_long) & entangled).tolist()
+        self.low_osc = (~(close >= ma_long) & entangled).tolist()
+
+        # 收盘价及相对前一日的涨幅（首日及前一日为 0 时记为 0）
+        day_pct = np.zeros(len(close))
+        if len(close) > 1:
+            prev_close = close[:-1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                day_pct[1:] = np.where(prev_close != 0, close[1:] / prev_close - 1.0, 0.0)
+        self.closes = close.tolist()
+        self.day_pct = day_pct.tolist()
         self.signal = None
 
         # 持仓成本与份额（用 notify_order 更新）
@@ -205,6 +602,10 @@ class DailyTrendSwingStrategy(bt.Strategy):
 
         # 记录历史最大持仓，用于 bottom_ratio 计算
         self.max_hold_shares = 0.0
+        # 需保留的底仓份额，只在历史最大持仓变化时更新
+        self._min_allowed = 0.0
+        # 持仓份额（在 notify_order 中按成交同步，与 broker 持仓一致）
+        self.pos_size = 0.0
 
         # 用于下单追踪
         self.order = None
@@ -214,34 +615,15 @@ class DailyTrendSwingStrategy(bt.Strategy):
         self.start_value = None
 
     # --------- 帮助函数 ----------
-    def log(self, txt):
-        if self.p.function == 'single_trend':
-            print(txt)
-
-    def _is_up_trend(self):
-        # 严格顺序：MA5 > MA20 > MA60 且 价格 > MA5
-        return (self.ma_short[0] > self.ma_mid[0] > self.ma_long[0]) and (self.close[0] > self.ma_short[0])
-
-    def _is_down_trend(self):
-        # 严格空头排列：MA5 < MA20 < MA60 且 价格 < MA20
-        return (self.ma_short[0] < self.ma_mid[0] < self.ma_long[0]) and (self.close[0] < self.ma_mid[0])
-
-    def _is_high_osc(self):
-        # 价格高于 MA60，且 MA5 与 MA20 在相对较小带宽内（纠缠） -> 高位震荡
-        if self.close[0] <= self.ma_long[0]:
-            return False
-        denom = self.ma_mid[0] if self.ma_mid[0] != 0 else 1
-        return abs(self.ma_short[0] - self.ma_mid[0]) / denom <= self.p.osc_band_tol
-
-    def _is_low_osc(self):
-        # 价格低于 MA60，且均线收敛（低位震荡）
-        if self.close[0] >= self.ma_long[0]:
-            return False
-        denom = self.ma_mid[0] if self.ma_mid[0] != 0 else 1
-        return abs(self.ma_short[0] - self.ma_mid[0]) / denom <= self.p.osc_band_tol
+    def log(self, txt, *args):
+        """
+        记录一行日志；txt 带参数时为 str.format 模板，只有需要输出时才格式化
+        """
+        if self._log_enabled:
+            self.log_lines.append(txt.format(*args) if args else txt)
 
     def _cash_available(self):
-        return self.broker.getcash() - self.p.min_cash_buffer
+        return self.broker.getcash() - self._min_cash_buffer
 
     # --------- 订单回报（使用实际成交价/数量更新成本） ----------
     def notify_order(self, order):
@@ -253,6 +635,7 @@ class DailyTrendSwingStrategy(bt.Strategy):
         if order.status == order.Completed:
             ex_size = order.executed.size
             ex_price = order.executed.price
+            self.pos_size += ex_size
             if order.isbuy():
                 # 成交买入：增加持仓份额和持仓成本
                 self.hold_shares += ex_size
@@ -261,7 +644,9 @@ class DailyTrendSwingStrategy(bt.Strategy):
                 # 更新历史最高持仓
                 if self.hold_shares > self.max_hold_shares:
                     self.max_hold_shares = self.hold_shares
-                self.log(f"{dt} BUY 成交: qty={ex_size:.4f} @ {ex_price:.4f} | hold_shares={self.hold_shares:.4f}, hold_cost={self.hold_cost:.2f}")
+                    self._min_allowed = self.max_hold_shares * self._bottom_ratio
+                self.log("{} BUY 成交: qty={:.4f} @ {:.4f} | hold_shares={:.4f}, hold_cost={:.2f}",
+                         dt, ex_size, ex_price, self.hold_shares, self.hold_cost)
             elif order.issell():
                 # 成交卖出：按平均成本减少持仓成本，记录已实现盈亏
                 avg_cost = (self.hold_cost / self.hold_shares) if self.hold_shares > 0 else 0.0
@@ -275,20 +660,27 @@ class DailyTrendSwingStrategy(bt.Strategy):
                 if self.hold_shares < 1e-12:
                     self.hold_shares = 0.0
                     self.hold_cost = 0.0
-                self.log(f"{dt} SELL 成交: qty={ex_size:.4f} @ {ex_price:.4f} | realized={realized:.2f}, hold_shares={self.hold_shares:.4f}, hold_cost={self.hold_cost:.2f}")
+                self.log("{} SELL 成交: qty={:.4f} @ {:.4f} | realized={:.2f}, hold_shares={:.4f}, hold_cost={:.2f}",
+                         dt, ex_size, ex_price, realized, self.hold_shares, self.hold_cost)
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log(f"Order Canceled/Margin/Rejected status={order.status}")
+            self.log("Order Canceled/Margin/Rejected status={}", order.status)
         self.order = None
 
     # --------- 策略主逻辑 ----------
     def next(self):
-        nav = float(self.close[0])
+        if len(self) < self.warmup:
+            return
+
+        i = len(self) - 1
+        nav = self.closes[i]
         date = self.datas[0].datetime.date(0)
+        # 订单在下一根 bar 才成交，本 bar 内可用现金不变，只查询一次
+        cash_avail = self._cash_available()
 
         # 初始建仓（第一次有机会买时）
-        if self.start_nav is None and self.p.function == 'trend':
+        if self.start_nav is None and self._trend_mode:
             # 采用首日按 daily_amount 建仓（如果有资金）
-            amt = min(self.p.initial_amount, self._cash_available())
+            amt = cash_avail if cash_avail < self._initial_amount else self._initial_amount
             if amt > 0:
                 size = amt / nav
                 self.order = self.buy(size=size)
@@ -296,105 +688,106 @@ class DailyTrendSwingStrategy(bt.Strategy):
             self.start_nav = nav
             self.start_value = self.broker.getvalue()
             # 打印首日信息
-            self.log(f"{date} 开始：NAV={nav:.4f}, 计划初始投 {amt:.2f}")
+            self.log("{} 开始：NAV={:.4f}, 计划初始投 {:.2f}", date, nav, amt)
             return
 
         # 指标值
-        ma5 = float(self.ma_short[0])
-        ma20 = float(self.ma_mid[0])
-        ma60 = float(self.ma_long[0])
-        bb_mid = float(self.bbands.lines.mid[0])
-        bb_top = float(self.bbands.lines.top[0])
-        bb_bot = float(self.bbands.lines.bot[0])
+        ma5 = self.ma_short[i]
+        ma20 = self.ma_mid[i]
+        ma60 = self.ma_long[i]
+        bb_mid = self.bb_mid[i]
+        bb_top = self.bb_top[i]
+        bb_bot = self.bb_bot[i]
 
         # 判定市场状态
-        is_up = self._is_up_trend()
-        is_down = self._is_down_trend()
-        is_high_osc = self._is_high_osc()
-        is_low_osc = self._is_low_osc()
+        is_up = self.up_trend[i]
+        is_down = self.down_trend[i]
+        is_high_osc = self.high_osc[i]
+        is_low_osc = self.low_osc[i]
 
-        # 计算日内涨幅参考（相对于前一日 close）
-        prev_close = float(self.close[-1]) if len(self.data) > 1 else nav
-        day_pct = (nav / prev_close - 1.0) if prev_close != 0 else 0.0
+        # 日内涨幅参考（相对于前一日 close）
+        day_pct = self.day_pct[i]
 
         # 打印关键指标（可注释以减少日志）
-        self.log(f"{date} 净值：{nav:.4f} | 上升：{is_up} 下跌：{is_down} 高位震荡：{is_high_osc} 低位震荡：{is_low_osc}")
+        self.log("{} 净值：{:.4f} | 上升：{} 下跌：{} 高位震荡：{} 低位震荡：{}", date, nav, is_up, is_down, is_high_osc, is_low_osc)
 
-        pos = self.getposition()
-        cash_avail = self._cash_available()
+        pos_size = self.pos_size
 
         # ---------- 上升趋势 ----------
         if is_up:
             # 每日定投基准
-            amt = min(self.p.daily_amount, cash_avail)
-            if amt > 0 and self.p.function == 'trend':
+            amt = cash_avail if cash_avail < self._daily_amount else self._daily_amount
+            if amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
-                self.log(f"{date} 上升趋势 每日定投 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"上升趋势，加仓 {self.p.daily_amount:.2f}"
+                self.log("{} 上升趋势 每日定投 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+            elif self._suggest_mode:
+                self.signal = ("上升趋势，加仓 {:.2f}", self._daily_amount)
 
             # 额外低吸：当回踩 MA20 (或回到布林中轨附近) 且有现金
             if nav <= ma20:
-                extra = min(self.p.daily_amount * self.p.add_on_pullback_ratio, cash_avail)
-                if extra > 0 and cash_avail > 0 and self.p.function == 'trend':
+                want = self._daily_amount * self._add_on_pullback_ratio
+                extra = cash_avail if cash_avail < want else want
+                if extra > 0 and cash_avail > 0 and self._trend_mode:
                     size = extra / nav
                     self.buy(size=size)
-                    self.log(f"{date} 上升趋势 回踩 MA20 低吸 {extra:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"上升趋势回踩MA20，低吸 {extra:.2f}"
+                    self.log("{} 上升趋势 回踩 MA20 低吸 {:.2f} -> {:.4f} 份 @ {:.4f}", date, extra, size, nav)
+                elif self._suggest_mode:
+                    self.signal = ("上升趋势回踩MA20，低吸 {:.2f}", extra)
 
         # ---------- 高位震荡 ----------
         elif is_high_osc:
             # 逢低吸纳：当靠近 MA20 或布林下轨时买入
             if nav <= ma20 or nav <= bb_mid:
-                amt = min(self.p.daily_amount, cash_avail)
-                if amt > 0 and self.p.function == 'trend':
+                amt = cash_avail if cash_avail < self._daily_amount else self._daily_amount
+                if amt > 0 and self._trend_mode:
                     size = amt / nav
                     self.buy(size=size)
-                    self.log(f"{date} 高位震荡 逢低吸纳 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"高位震荡，逢低吸纳 {amt:.2f}"
+                    self.log("{} 高位震荡 逢低吸纳 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+                elif self._suggest_mode:
+                    self.signal = ("高位震荡，逢低吸纳 {:.2f}", amt)
 
             # 逢高卖出：到布林上轨或日内涨幅超过阈值时卖出一部分
             if nav >= bb_top or day_pct >= self.p.sell_on_high_pct:
-                if pos.size > 0 and self.p.function == 'trend':
-                    size_to_sell = pos.size * self.p.sell_fraction_on_high
+                if pos_size > 0 and self._trend_mode:
+                    size_to_sell = pos_size * self._sell_fraction_on_high
                     if size_to_sell > 0:
                         self.sell(size=size_to_sell)
-                        self.log(f"{date} 高位震荡 逢高卖出 {size_to_sell:.4f} 份 @ {nav:.4f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"高位震荡，逢高卖出 {self.p.sell_fraction_on_high:.2%} 仓位"
+                        self.log("{} 高位震荡 逢高卖出 {:.4f} 份 @ {:.4f}", date, size_to_sell, nav)
+                elif self._suggest_mode:
+                    self.signal = ("高位震荡，逢高卖出 {:.2%} 仓位", self._sell_fraction_on_high)
 
         # ---------- 低位震荡 ----------
         elif is_low_osc:
             # 低位震荡不操作
-            self.log(f"{date} 低位震荡，暂不操作")
+            self.log("{} 低位震荡，暂不操作", date)
             self.signal = "低位震荡，暂不操作"
 
         # ---------- 下跌趋势 ----------
         elif is_down:
             # 按 reduce_step 分阶段减仓，但不减到低于历史最大持仓的 bottom_ratio
-            if pos.size > 0 and self.max_hold_shares > 0 and self.p.function == 'trend':
-                min_allowed = self.max_hold_shares * self.p.bottom_ratio
-                can_reduce = max(0.0, pos.size - min_allowed)
+            if pos_size > 0 and self.max_hold_shares > 0 and self._trend_mode:
+                min_allowed = self._min_allowed
+                reducible = pos_size - min_allowed
+                can_reduce = reducible if reducible > 0.0 else 0.0
                 if can_reduce > 0:
-                    size_to_sell = min(pos.size * self.p.reduce_step, can_reduce)
+                    want_sell = pos_size * self._reduce_step
+                    size_to_sell = can_reduce if can_reduce < want_sell else want_sell
                     if size_to_sell > 0:
                         self.sell(size=size_to_sell)
-                        self.log(f"{date} 下跌趋势 分阶段减仓 {size_to_sell:.4f} 份 @ {nav:.4f} (保留底仓 {min_allowed:.4f})")
-            elif self.p.function == 'suggestion':
-                self.signal = f"下跌趋势，分阶段减仓 {self.p.reduce_step:.2%} 仓位"
+                        self.log("{} 下跌趋势 分阶段减仓 {:.4f} 份 @ {:.4f} (保留底仓 {:.4f})", date, size_to_sell, nav, min_allowed)
+            elif self._suggest_mode:
+                self.signal = ("下跌趋势，分阶段减仓 {:.2%} 仓位", self._reduce_step)
             else:
-                self.log(f"{date} 下跌趋势，但无可减仓位或尚无历史持仓")
+                self.log("{} 下跌趋势，但无可减仓位或尚无历史持仓", date)
 
         # ---------- 其他情况（保守） ----------
         else:
             # 未匹配到任何明确状态，保守策略：小额定投或不操作
-            self.log(f"{date} 未明确信号，保守处理：不操作或小额低吸")
+            self.log("{} 未明确信号，保守处理：不操作或小额低吸", date)
             self.signal = "未明确信号，保守处理"
             # 可启用小额定投（注释掉表示不操作）
-            # amt = min(0.2*self.p.daily_amount, cash_avail)
+            # amt = min(0.2*self._daily_amount, cash_avail)
             # if amt > 0:
             #     self.buy(size=amt/nav)
             #     self.log(f"{date} 未明确信号 小额投 {amt:.2f}")
@@ -412,25 +805,27 @@ class DailyTrendSwingStrategy(bt.Strategy):
 
         if self.p.function != 'suggestion':
             self.log("\n=== 回测结果 ===")
-            self.log(f"最终日期: {self.datas[0].datetime.date(0)}")
-            self.log(f"持仓份额: {self.hold_shares:.4f}")
-            self.log(f"持仓成本(total): {self.hold_cost:.2f}")
-            self.log(f"持仓市值: {hold_value:.2f}")
-            self.log(f"未实现 PnL: {unrealized:.2f}")
-            self.log(f"已实现 PnL: {total_realized:.2f}")
+            self.log("最终日期: {}", self.datas[0].datetime.date(0))
+            self.log("持仓份额: {:.4f}", self.hold_shares)
+            self.log("持仓成本(total): {:.2f}", self.hold_cost)
+            self.log("持仓市值: {:.2f}", hold_value)
+            self.log("未实现 PnL: {:.2f}", unrealized)
+            self.log("已实现 PnL: {:.2f}", total_realized)
             if hold_roi is not None:
-                self.log(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
+                self.log("仅仓位收益率 (hold ROI): {:.2%}", hold_roi)
             else:
                 self.log("仅仓位收益率 (hold ROI): N/A (无持仓成本)")
-            self.log(f"总资金 (broker): {self.broker.getvalue():.2f}")
+            self.log("总资金 (broker): {:.2f}", self.broker.getvalue())
             self.log("================\n")
 
+        _flush_log(self.log_lines)
+
         print(f"持仓市值: {hold_value:.2f}")
         print(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
         print(f"总资金 (broker): {self.broker.getvalue():.2f}")
 
     def get_signal(self):
-        return self.signal
+        return _format_signal(self.signal)
 
 class TrendScore(bt.Indicator):
     lines = ('score', 'trend')
@@ -486,70 +881,76 @@ class TrendScore(bt.Indicator):
         self.lower = self.boll.bot
 
     def next(self):
-        score = 0
+        score, trend = _trend_score(
+            self.ema5[0], self.ema20[0], self.ema60[0], self.macd_cross[0], self.kdj_cross[0],
+            self.adx[0], self.diplus[0], self.diminus[0], self.momentum[0], self.rsi[0],
+            self.data.close[0], self.upper[0], self.lower[0])
 
-        # ===== EMA评分 =====
-        if self.ema5[0] > self.ema20[0] > self.ema60[0]:
-            score += 2
-        elif self.ema5[0] > self.ema20[0]:
-            score += 1
-        elif self.ema5[0] < self.ema20[0] < self.ema60[0]:
-            score -= 2
-        elif self.ema5[0] < self.ema20[0]:
-            score -= 1
-
-        # ===== MACD评分 =====
-        if self.macd_cross[0] > 0:
-            score += 2  # 金叉
-        elif self.macd_cross[0] < 0:
-            score -= 2  # 死叉
-
-        # ===== KDJ评分 =====
-        if self.kdj_cross[0] > 0:
-            score += 1
-        elif self.kdj_cross[0] < 0:
-            score -= 1
+        # 输出
+        self.lines.score[0] = score
+        self.lines.trend[0] = trend
 
-        # ===== ADX评分 =====
-        if self.adx[0] > 25:
-            if self.diplus[0] > self.diminus[0]:
-                score += 1
-            else:
-                score -= 1
+    def once(self, start, end):
+        """
+        runonce 模式下整段计算，代替逐 bar 的 Python 索引与比较
+        有 numba 时单次 njit 循环直接写入输出线的缓冲区，否则对整段数组直接调用 _trend_score 向量化计算
+        """
+        inputs = [np.frombuffer(line.array, dtype=np.float64) for line in (
+            self.ema5.lines[0], self.ema20.lines[0], self.ema60.lines[0],
+            self.macd_cross.lines[0], self.kdj_cross.lines[0], self.adx.lines[0],
+            self.diplus.lines[0], self.diminus.lines[0], self.momentum.lines[0], self.rsi.lines[0],
+            self.data.close, self.upper, self.lower)]
 
-        # ===== Momentum =====
-        if self.momentum[0] > 0:
-            score += 1
-        elif self.momentum[0] < 0:
-            score -= 1
+        if NUMBA_AVAILABLE:
+            out_score = np.frombuffer(self.lines.score.array, dtype=np.float64)
+            out_trend = np.frombuffer(self.lines.trend.array, dtype=np.float64)
+            _trend_score_kernel(*inputs, out_score, out_trend, start, end)
+            return
 
-        # ===== RSI =====
-        if self.rsi[0] > 70:
-            score -= 1
-        elif self.rsi[0] < 30:
-            score += 1
+        score, trend = _trend_score(*[values[start:end] for values in inputs])
+        self.lines.score.array[start:end] = array.array('d', score.astype(np.float64))
+        self.lines.trend.array[start:end] = array.array('d', trend.astype(np.float64))
 
-        # ===== Bollinger Bands =====
-        close = self.data.close[0]
-        if close > self.upper[0]:
-            score -= 1
-        elif close < self.lower[0]:
-            score += 1
+@njit(cache=True)
+def _trend_score(ema5, ema20, ema60, macd_cross, kdj_cross, adx, diplus, diminus, momentum, rsi,
+                 close, upper, lower):
+    """
+    TrendScore 的评分与趋势分类，返回 (score, trend)
+    各项评分写成无分支的整数运算（比较结果先乘整数再相加减），同一函数可用于单个 bar 的标量或整段数组
+    NaN 比较为 False，该项记 0 分，与逐项 if/elif 判断一致
+    """
+    score = (
+        # EMA：多头排列 +2，仅 EMA5 > EMA20 +1；空头排列 -2，仅 EMA5 < EMA20 -1
+        (ema5 > ema20) * (1 + 1 * (ema20 > ema60)) - (ema5 < ema20) * (1 + 1 * (ema20 < ema60))
+        # MACD：金叉 +2，死叉 -2
+        + 2 * (macd_cross > 0) - 2 * (macd_cross < 0)
+        # KDJ：金叉 +1，死叉 -1
+        + 1 * (kdj_cross > 0) - 1 * (kdj_cross < 0)
+        # ADX：趋势明显时按 DI 方向 ±1
+        + (adx > 25) * (2 * (diplus > diminus) - 1)
+        # Momentum
+        + 1 * (momentum > 0) - 1 * (momentum < 0)
+        # RSI：超卖 +1，超买 -1
+        + 1 * (rsi < 30) - 1 * (rsi > 70)
+        # Bollinger Bands：跌破下轨 +1，突破上轨 -1
+        + 1 * (close < lower) - 1 * (close > upper)
+    )
 
-        # 输出
-        self.lines.score[0] = score
+    # 分类趋势：strong_up 2 (>=6)，weak_up 1 (>=3)，consolidation 0 (>-2)，weak_down -1 (>-5)，strong_down -2
+    trend = 1 * (score >= 6) + 1 * (score >= 3) + 1 * (score > -2) + 1 * (score > -5) - 2
 
-        # 分类趋势
-        if score >= 6:
-            self.lines.trend[0] = 2     # strong_up
-        elif score >= 3:
-            self.lines.trend[0] = 1     # weak_up
-        elif score > -2:
-            self.lines.trend[0] = 0     # consolidation
-        elif score > -5:
-            self.lines.trend[0] = -1    # weak_down
-        else:
-            self.lines.trend[0] = -2    # strong_down
+    return score, trend
+
+@njit(cache=True)
+def _trend_score_kernel(ema5, ema20, ema60, macd_cross, kdj_cross, adx, diplus, diminus, momentum, rsi,
+                        close, upper, lower, out_score, out_trend, start, end):
+    """
+    对 [start, end) 区间逐 bar 调用 _trend_score，结果写入 out_score / out_trend
+    """
+    for i in range(start, end):
+        out_score[i], out_trend[i] = _trend_score(
+            ema5[i], ema20[i], ema60[i], macd_cross[i], kdj_cross[i], adx[i], diplus[i], diminus[i],
+            momentum[i], rsi[i], close[i], upper[i], lower[i])
 
 class ScoredTaStrategy(bt.Strategy):
     """
@@ -569,9 +970,29 @@ class ScoredTaStrategy(bt.Strategy):
         full_log=False,
     )
 
+    # 预计算的指标不会出现在图中，绘图时由 ceboro_trend 添加对应的 bt 指标用于展示
+    plot_indicators = (
+        (bt.ind.EMA, dict(period=21)),
+        (bt.ind.BollingerBands, dict(period=20)),
+        (bt.ind.Momentum, dict(period=10)),
+        (bt.ind.RSI, dict(period=14)),
+        (TrendScore, dict()),
+    )
+
     def __init__(self):
-        # 趋势评分
-        self.score = TrendScore()
+        # 日志先缓存在内存中，stop() 时一次性输出
+        self.log_lines = []
+        # 运行模式在整个回测中不变，预先判断一次，逐 bar 逻辑中直接使用布尔值
+        self._trend_mode = self.p.function == 'trend'
+        self._suggest_mode = self.p.function == 'suggestion'
+        self._log_enabled = self._trend_mode and self.p.full_log
+        # 逐 bar 读取的参数缓存为普通属性，省去每次经 self.p 的两级属性查找
+        self._initial_amount = self.p.initial_amount
+        self._daily_amount = self.p.daily_amount
+        self._reduce_step = self.p.reduce_step
+        self._bottom_ratio = self.p.bottom_ratio
+        self._sell_fraction_on_high = self.p.sell_fraction_on_high
+        self._min_cash_buffer = self.p.min_cash_buffer
 
         # 基础数据
         self.close = self.datas[0].close
@@ -581,29 +1002,59 @@ class ScoredTaStrategy(bt.Strategy):
         self.volume = self.datas[0].volume
         self.vol_ratio = 0.0
 
-        # EMA系统增强趋势判断
-        self.ema20 = bt.indicators.EMA(self.data.close, period=21)
-
-        # 布林带
-        self.boll = bt.ind.BollingerBands(self.datas[0], period=20)
-
-        # 动量指标
-        self.momentum = bt.indicators.Momentum(self.data.close, period=10)
-
-        # RSI
-        self.rsi = bt.indicators.RSI(self.data.close, period=14)
+        # 预加载的收盘价，按 bar 下标 self._i 取值
+        close = np.asarray(self.close.array, dtype=np.float64)
+        self._close = close
+        self._i = 0
 
         # 成交量相关指标
-        self.vol_sma = bt.indicators.SMA(self.data.volume, period=20)  # 成交量20日均线
+        volume = np.asarray(self.volume.array, dtype=np.float64)
+        vol_sma = _rolling_mean(volume, 20)  # 成交量20日均线
+        vol_ratio = _volume_ratio(volume, vol_sma)
+        self.vol_ratios = vol_ratio.tolist()
+
+        # 趋势评分：与 TrendScore 指标口径一致（默认参数），整段一次性计算，按 bar 下标取值
+        high = np.asarray(self.high.array, dtype=np.float64)
+        low = np.asarray(self.low.array, dtype=np.float64)
+        macd = _ema(close, 12) - _ema(close, 26)
+        kdj_k, kdj_d, _ = _kdj(high, low, close, 9, 3, 3)
+        plus_di, minus_di, adx = _directional(high, low, close, 14)
+        _, self._bb_top, self._bb_bot = _bollinger(close, 20)
+        score, trend = _trend_score(
+            _ema(close, 5), _ema(close, 20), _ema(close, 60),
+            _cross_over(macd, _ema(macd, 9)), _cross_over(kdj_k, kdj_d),
+            adx, plus_di, minus_di, _momentum(close, 10), _rsi(close, 14),
+            close, self._bb_top, self._bb_bot)
+        self._scores = score.astype(np.float64).tolist()
+        self._trends = trend.astype(np.float64).tolist()
+
+        # 收盘价是否创前 5 日新低 / 新高（量价背离判断用）
+        self._new_low, self._new_high = _new_low_high(close)
+
+        # 量价状态只依赖成交量比例与新高 / 新低，整段一次性算成布尔数组，逐 bar 按下标取值
+        (self._volume_breakout, self._volume_shrink,
+         self._bullish_divergence, self._bearish_divergence) = _volume_states(
+            close, vol_ratio, self._new_low, self._new_high)
 
         self.signal = None
         self.indicators = None
 
+        # TrendScore 趋势值 -> 处理方法，next() 中按趋势分派
+        self._trend_handlers = {
+            2: self._handle_strong_up,
+            1: self._handle_weak_up,
+            0: self._handle_consolidation,
+            -1: self._handle_weak_down,
+            -2: self._handle_strong_down,
+        }
+
         # 持仓管理
         self.hold_shares = 0.0
         self.hold_cost = 0.0
         self.realized_pnl = 0.0
         self.max_hold_shares = 0.0
+        # 需保留的底仓份额，只在历史最大持仓变化时更新
+        self._min_allowed = 0.0
 
         # 订单跟踪
         self.order = None
@@ -614,63 +1065,44 @@ class ScoredTaStrategy(bt.Strategy):
         self.consecutive_up_days = 0  # 连续上涨天数
         self.consecutive_down_days = 0  # 连续下跌天数
 
-    def log(self, txt):
-        if self.p.function == 'trend' and self.p.full_log and len(self) > 250:
-            print(txt)
+    def log(self, txt, *args):
+        """
+        记录一行日志；txt 带参数时为 str.format 模板，只有需要输出时才格式化
+        """
+        if self._log_enabled and len(self) > 250:
+            self.log_lines.append(txt.format(*args) if args else txt)
 
     def _is_volume_breakout(self):
         """
-        判断是否有放量突破
+        判断是否有放量突破：成交量是近期平均的2倍以上，同时价格上涨
         """
-        # 成交量是近期平均的2倍以上
-        high_volume = self.vol_ratio > 2.0
-
-        # 同时价格上涨
-        price_increase = self.close[0] > self.close[-1]
-
-        return high_volume and price_increase
+        return self._volume_breakout[self._i]
 
     def _is_volume_shrink(self):
         """
-        判断是否缩量
+        判断是否缩量：成交量低于平均值的50%
         """
-        # 成交量低于平均值的50%
-        low_volume = 0.0 < self.vol_ratio < 0.5
-        return low_volume
+        return self._volume_shrink[self._i]
 
     def _is_bullish_volume_divergence(self):
         """
         判断是否存在看涨的量价背离
         价格创新低但成交量放大
         """
-        # 价格创近期新低
-        recent_low_price = min([self.close[-i] for i in range(1, 6)])
-        price_new_low = self.close[0] < recent_low_price
-
-        # 但成交量放大
-        volume_increase = self.vol_ratio > 1.5
-
-        return price_new_low and volume_increase
+        return self._bullish_divergence[self._i]
 
     def _is_bearish_volume_divergence(self):
         """
         判断是否存在看跌的量价背离
         价格创新高但成交量萎缩
         """
-        # 价格创近期新高
-        recent_high_price = max([self.close[-i] for i in range(1, 6)])
-        price_new_high = self.close[0] > recent_high_price
-
-        # 但成交量萎缩
-        volume_shrink = 0.0 < self.vol_ratio < 0.7
+        return self._bearish_divergence[self._i]
 
-        return price_new_high and volume_shrink
-
-    def _is_good_entry_point(self):
+    def _is_good_entry_point(self, trend_score):
         """
             判断是否为良好的建仓时机
             """
-        up_score = self.score.score[0] > 0
+        up_score = trend_score > 0
 
         # 条件4: 成交量放大（有资金流入迹象）
         volume_support = self.vol_ratio > 1.0
@@ -682,22 +1114,23 @@ class ScoredTaStrategy(bt.Strategy):
         """
         根据账户总价值计算目标仓位大小
         """
+        i = self._i
         total_value = self.broker.getvalue()
         target_value = total_value * target_exposure_ratio
-        current_position_value = self.hold_shares * self.close[0]
+        current_position_value = self.hold_shares * self._close[i]
         value_to_add = target_value - current_position_value
 
         if value_to_add > 0:
             available_cash = self._cash_available()
-            actual_value_to_add = min(value_to_add, available_cash)
-            return actual_value_to_add / self.close[0]
+            actual_value_to_add = available_cash if available_cash < value_to_add else value_to_add
+            return actual_value_to_add / self._close[i]
         else:
             # 需要减仓
-            shares_to_sell = abs(value_to_add) / self.close[0]
+            shares_to_sell = abs(value_to_add) / self._close[i]
             return -shares_to_sell
 
     def _cash_available(self):
-        return self.broker.getcash() - self.p.min_cash_buffer
+        return self.broker.getcash() - self._min_cash_buffer
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -725,164 +1158,189 @@ class ScoredTaStrategy(bt.Strategy):
             # 更新历史最高持仓
             if self.hold_shares > self.max_hold_shares:
                 self.max_hold_shares = self.hold_shares
+                self._min_allowed = self.max_hold_shares * self._bottom_ratio
 
-            self.log(f"{dt} {'BUY' if ex_size > 0 else 'SELL'} 成交: qty={ex_size:.4f} @ {ex_price:.4f} "
-                     f"| realized={realized:.2f}, hold_shares={self.hold_shares:.4f}, hold_cost={self.hold_cost:.2f}")
+            self.log("{} {} 成交: qty={:.4f} @ {:.4f} | realized={:.2f}, hold_shares={:.4f}, hold_cost={:.2f}",
+                     dt, 'BUY' if ex_size > 0 else 'SELL', ex_size, ex_price, realized, self.hold_shares, self.hold_cost)
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log(f"Order {order.Status[order.status]}")
+            self.log("Order {}", order.Status[order.status])
 
         self.order = None
 
     def next(self):
-        nav = float(self.close[0])
+        # 与原 TrendScore 指标的最小周期一致，第 60 根 bar 起才开始操作
+        if len(self) < 60:
+            return
+
+        # 建议模式只输出最后一根 bar 的信号，且不下单、不依赖之前 bar 的状态，之前的 bar 直接跳过
+        if self._suggest_mode and len(self) < self.data.buflen():
+            return
+
+        self._i = i = len(self) - 1
+        nav = float(self._close[i])
         date = self.datas[0].datetime.date(0)
-        vol = self.data.volume[0]
-        sma = self.vol_sma[0]
-        self.vol_ratio = vol / sma if sma > 0 else 0.0
+        # 订单在下一根 bar 才成交，本 bar 内可用现金不变，只查询一次
+        cash_avail = self._cash_available()
+        self.vol_ratio = self.vol_ratios[i]
         self.signal = '无'
-        trend_score = self.score.score[0]
-        trend = self.score.trend[0]
+        trend_score = self._scores[i]
+        trend = self._trends[i]
 
         # 初始建仓
-        if self.start_nav is None and self.p.function == 'trend':
+        if self.start_nav is None and self._trend_mode:
             # 如果满足建仓条件或者策略运行了一段时间仍未能建仓
-            if self._is_good_entry_point() or len(self) > 5:
-                amt = min(self.p.initial_amount, self._cash_available())
+            if self._is_good_entry_point(trend_score) or len(self) > 5:
+                amt = cash_avail if cash_avail < self._initial_amount else self._initial_amount
                 if amt > 0:
                     size = amt / nav
                     self.order = self.buy(size=size)
                 self.start_nav = nav
                 self.start_value = self.broker.getvalue()
-                self.log(f"{date} 开始建仓：NAV={nav:.4f}, 投资 {amt:.2f}")
+                self.log("{} 开始建仓：NAV={:.4f}, 投资 {:.2f}", date, nav, amt)
                 return
             else:
-                self.log(f"{date} 等待合适建仓时机：NAV={nav:.4f}")
+                self.log("{} 等待合适建仓时机：NAV={:.4f}", date, nav)
                 return
 
         # 更新连续涨跌天数
-        if self.close[0] > self.close[-1]:
+        prev_nav = self._close[i - 1]
+        if nav > prev_nav:
             self.consecutive_up_days += 1
             self.consecutive_down_days = 0
-        elif self.close[0] < self.close[-1]:
+        elif nav < prev_nav:
             self.consecutive_down_days += 1
             self.consecutive_up_days = 0
         else:
             self.consecutive_up_days = 0
             self.consecutive_down_days = 0
 
-        # 计算日内涨幅
-        prev_close = float(self.close[-1]) if len(self.data) > 1 else nav
-
-        pos = self.getposition()
-        cash_avail = self._cash_available()
-
-        # 成交量相关判断
-        volume_breakout = self._is_volume_breakout()
-        volume_shrink = self._is_volume_shrink()
-        bullish_divergence = self._is_bullish_volume_divergence()
-        bearish_divergence = self._is_bearish_volume_divergence()
+        # 订单在下一根 bar 才成交，本 bar 内持仓不变，只查询一次
+        pos_size = self.getposition().size
 
         # ========== 策略主逻辑 ==========
+        # 按趋势值分派到对应的处理方法，成交量相关判断只在用到的分支中计算
+        handler = self._trend_handlers.get(trend)
+        if handler is not None:
+            handler(date, nav, cash_avail, pos_size)
 
-        # 1. 强势上升趋势 - 积极加仓
-        if  trend == 2:
-            add_ratio = 2  # 1.0-2.0倍基础金额
+    def _handle_strong_up(self, date, nav, cash_avail, pos_size):
+        """
+        强势上升趋势 - 积极加仓
+        """
+        add_ratio = 2  # 1.0-2.0倍基础金额
 
-            # 如果伴随放量突破，进一步增加仓位
-            if volume_breakout:
-                add_ratio *= 1.2
+        # 如果伴随放量突破，进一步增加仓位
+        if self._is_volume_breakout():
+            add_ratio *= 1.2
 
-            amt = min(self.p.daily_amount * add_ratio, cash_avail)
-            if amt > 0 and self.p.function == 'trend':
-                size = amt / nav
-                self.buy(size=size)
-                self.log(f"{date} 强势上升趋势，积极加仓 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"强势上升趋势，建议积极加仓 {amt:.2f}"
+        want = self._daily_amount * add_ratio
+        amt = cash_avail if cash_avail < want else want
+        if amt > 0 and self._trend_mode:
+            size = amt / nav
+            self.buy(size=size)
+            self.log("{} 强势上升趋势，积极加仓 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+        elif self._suggest_mode:
+            self.signal = ("强势上升趋势，建议积极加仓 {:.2f}", amt)
 
-        # 3. 弱势上升趋势 - 稳健加仓
-        elif trend == 1:
-            # 如果出现看涨背离，增加信心
-            multiplier = 1.5 if bullish_divergence else 1.0
-            amt = min(self.p.daily_amount * multiplier, cash_avail)
-            if amt > 0 and self.p.function == 'trend':
+    def _handle_weak_up(self, date, nav, cash_avail, pos_size):
+        """
+        弱势上升趋势 - 稳健加仓
+        """
+        # 如果出现看涨背离，增加信心
+        multiplier = 1.5 if self._is_bullish_volume_divergence() else 1.0
+        want = self._daily_amount * multiplier
+        amt = cash_avail if cash_avail < want else want
+        if amt > 0 and self._trend_mode:
+            size = amt / nav
+            self.buy(size=size)
+            self.log("{} 弱势上升趋势，稳健加仓 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+        elif self._suggest_mode:
+            self.signal = ("弱势上升趋势，建议稳健加仓 {:.2f}", amt)
+
+    def _handle_consolidation(self, date, nav, cash_avail, pos_size):
+        """
+        盘整市场采用网格交易或区间交易
+        """
+        i = self._i
+        # 布林带直接复用趋势评分中的 BollingerBands(20)
+        bb_top = self._bb_top[i]
+        bb_bot = self._bb_bot[i]
+
+        # 低位买入
+        if nav <= bb_bot * 1.02:
+            # 如果出现看涨背离，增加买入力度
+            amt_multiplier = 1.5 if self._is_bullish_volume_divergence() else 1.0
+            want = self._daily_amount * amt_multiplier
+            amt = cash_avail if cash_avail < want else want  # 减少投入
+            if amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
-                self.log(f"{date} 弱势上升趋势，稳健加仓 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"弱势上升趋势，建议稳健加仓 {amt:.2f}"
-
-        elif trend == 0:
-            # 盘整市场采用网格交易或区间交易
-            bb_top = self.boll.lines.top[0]
-            bb_bot = self.boll.lines.bot[0]
-
-            # 低位买入
-            if nav <= bb_bot * 1.02:
-                # 如果出现看涨背离，增加买入力度
-                amt_multiplier = 1.5 if bullish_divergence else 1.0
-                amt = min(self.p.daily_amount * amt_multiplier, cash_avail)  # 减少投入
-                if amt > 0 and self.p.function == 'trend':
-                    size = amt / nav
-                    self.buy(size=size)
-                    self.log(f"{date} 震荡市低位吸纳 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"震荡市，建议低位吸纳 {amt:.2f}"
-
-            # 高位卖出
-            elif nav >= bb_top * 0.98:
-                # 如果出现看跌背离或放量滞涨，增加卖出力度
-                sell_multiplier = 1.5 if (bearish_divergence or volume_shrink) else 1.0
-                if pos.size > 0 and self.p.function == 'trend':
-                    size_to_sell = pos.size * self.p.sell_fraction_on_high * sell_multiplier
-                    if size_to_sell > 0:
-                        self.sell(size=size_to_sell)
-                        self.log(f"{date} 震荡市高位减持 {size_to_sell:.4f} 份 @ {nav:.4f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"震荡市，建议高位减持 {self.p.sell_fraction_on_high:.2%} 仓位"
+                self.log("{} 震荡市低位吸纳 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+            elif self._suggest_mode:
+                self.signal = ("震荡市，建议低位吸纳 {:.2f}", amt)
+
+        # 高位卖出
+        elif nav >= bb_top * 0.98:
+            # 如果出现看跌背离或放量滞涨，增加卖出力度
+            sell_multiplier = 1.5 if (self._is_bearish_volume_divergence() or self._is_volume_shrink()) else 1.0
+            if pos_size > 0 and self._trend_mode:
+                size_to_sell = pos_size * self._sell_fraction_on_high * sell_multiplier
+                if size_to_sell > 0:
+                    self.sell(size=size_to_sell)
+                    self.log("{} 震荡市高位减持 {:.4f} 份 @ {:.4f}", date, size_to_sell, nav)
+            elif self._suggest_mode:
+                self.signal = ("震荡市，建议高位减持 {:.2%} 仓位", self._sell_fraction_on_high)
 
-        # 6. 强势下降趋势 - 快速减仓
-        elif trend == -2:
-            # 超买时增加减仓
-            min_allowed = self.max_hold_shares * self.p.bottom_ratio
-            can_reduce = max(0.0, pos.size - min_allowed)
-            reduce_step = self.p.reduce_step * 2
-            # 如果出现放量下跌，进一步增加减仓力度
-            if volume_breakout:
-                reduce_step *= 1.5
-            reduce_ratio = min(1.0, reduce_step)
-            size_to_sell = min(pos.size * reduce_ratio, can_reduce)
-            if pos.size > 0 and self.p.function == 'trend' and can_reduce > 0:
+    def _handle_strong_down(self, date, nav, cash_avail, pos_size):
+        """
+        强势下降趋势 - 快速减仓
+        """
+        # 超买时增加减仓
+        min_allowed = self._min_allowed
+        reducible = pos_size - min_allowed
+        can_reduce = reducible if reducible > 0.0 else 0.0
+        reduce_step = self._reduce_step * 2
+        # 如果出现放量下跌，进一步增加减仓力度
+        if self._is_volume_breakout():
+            reduce_step *= 1.5
+        reduce_ratio = reduce_step if reduce_step < 1.0 else 1.0
+        want_sell = pos_size * reduce_ratio
+        size_to_sell = can_reduce if can_reduce < want_sell else want_sell
+        if pos_size > 0 and self._trend_mode and can_reduce > 0:
+            if size_to_sell > 0:
+                self.sell(size=size_to_sell)
+                self.log(
+                    "{} 强势下降趋势，快速减仓 {:.4f} 份 @ {:.4f} (保留底仓 {:.4f})", date, size_to_sell, nav, min_allowed)
+        elif self._suggest_mode:
+            self.signal = ("强势下降趋势，建议快速减仓 {:.2%} 仓位", self._reduce_step * 3)
+
+    def _handle_weak_down(self, date, nav, cash_avail, pos_size):
+        """
+        弱势下降趋势 - 缓慢减仓
+        """
+        # 如果出现看涨背离，减缓减仓速度
+        reduce_multiplier = 0.5 if self._is_bullish_volume_divergence() else 1.0
+        if pos_size > 0 and self._trend_mode:
+            min_allowed = self._min_allowed
+            reducible = pos_size - min_allowed
+            can_reduce = reducible if reducible > 0.0 else 0.0
+            if can_reduce > 0:
+                want_sell = pos_size * self._reduce_step * reduce_multiplier
+                size_to_sell = can_reduce if can_reduce < want_sell else want_sell
                 if size_to_sell > 0:
                     self.sell(size=size_to_sell)
                     self.log(
-                        f"{date} 强势下降趋势，快速减仓 {size_to_sell:.4f} 份 @ {nav:.4f} (保留底仓 {min_allowed:.4f})")
-            elif self.p.function == 'suggestion':
-                self.signal = f"强势下降趋势，建议快速减仓 {self.p.reduce_step * 3:.2%} 仓位"
-
-        # 7. 弱势下降趋势 - 缓慢减仓
-        elif trend == -1:
-            # 如果出现看涨背离，减缓减仓速度
-            reduce_multiplier = 0.5 if bullish_divergence else 1.0
-            if pos.size > 0 and self.p.function == 'trend':
-                min_allowed = self.max_hold_shares * self.p.bottom_ratio
-                can_reduce = max(0.0, pos.size - min_allowed)
-                if can_reduce > 0:
-                    size_to_sell = min(pos.size * self.p.reduce_step * reduce_multiplier, can_reduce)
-                    if size_to_sell > 0:
-                        self.sell(size=size_to_sell)
-                        self.log(
-                            f"{date} 弱势下降趋势，缓慢减仓 {size_to_sell:.4f} 份 @ {nav:.4f} (保留底仓 {min_allowed:.4f})")
-            elif self.p.function == 'suggestion':
-                self.signal = f"弱势下降趋势，建议缓慢减仓 {self.p.reduce_step:.2%} 仓位"
+                        "{} 弱势下降趋势，缓慢减仓 {:.4f} 份 @ {:.4f} (保留底仓 {:.4f})", date, size_to_sell, nav, min_allowed)
+        elif self._suggest_mode:
+            self.signal = ("弱势下降趋势，建议缓慢减仓 {:.2%} 仓位", self._reduce_step)
 
     def stop(self):
-        nav = float(self.close[0])
+        self._i = i = len(self) - 1
+        nav = float(self._close[i])
         hold_value = self.hold_shares * nav
         unrealized = hold_value - self.hold_cost
         total_realized = self.realized_pnl
-        trend = self.score.trend[0]
 
         if self.hold_cost > 0:
             hold_roi = (hold_value - self.hold_cost) / self.hold_cost
@@ -891,51 +1349,88 @@ class ScoredTaStrategy(bt.Strategy):
 
         if self.p.function != 'suggestion':
             self.log("\n=== 回测结果 ===")
-            self.log(f"最终日期: {self.datas[0].datetime.date(0)}")
-            self.log(f"持仓份额: {self.hold_shares:.4f}")
-            self.log(f"持仓成本(total): {self.hold_cost:.2f}")
-            self.log(f"持仓市值: {hold_value:.2f}")
-            self.log(f"未实现 PnL: {unrealized:.2f}")
-            self.log(f"已实现 PnL: {total_realized:.2f}")
+            self.log("最终日期: {}", self.datas[0].datetime.date(0))
+            self.log("持仓份额: {:.4f}", self.hold_shares)
+            self.log("持仓成本(total): {:.2f}", self.hold_cost)
+            self.log("持仓市值: {:.2f}", hold_value)
+            self.log("未实现 PnL: {:.2f}", unrealized)
+            self.log("已实现 PnL: {:.2f}", total_realized)
             if hold_roi is not None:
-                self.log(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
+                self.log("仅仓位收益率 (hold ROI): {:.2%}", hold_roi)
             else:
                 self.log("仅仓位收益率 (hold ROI): N/A (无持仓成本)")
-            self.log(f"总资金 (broker): {self.broker.getvalue():.2f}")
+            self.log("总资金 (broker): {:.2f}", self.broker.getvalue())
             self.log("================\n")
 
+        _flush_log(self.log_lines)
+
         if not self.p.full_log and 'trend' in self.p.function:
             print(f"持仓市值: {hold_value:.2f}")
             if hold_roi is not None:
                 print(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
             print(f"总资金 (broker): {self.broker.getvalue():.2f}")
 
-        if trend == 2:
-            trend_name = '强势上升；'
-        if trend == 1:
-            trend_name = '弱势上升；'
-        if trend == 0:
-            trend_name = '盘整；'
-        if trend == -1:
-            trend_name = '强势下降；'
-        if trend == -2:
-            trend_name = '弱势下降；'
+    def get_signal(self):
+        return _format_signal(self.signal)
 
-        trend = f'无' if trend_name == '' else f'{trend_name[:-1]}'
+    def get_indicators(self):
+        """
+        当前指标汇总；只在调用时才格式化（首次调用后缓存），stop() 中不再拼接字符串
+        """
+        if self.indicators is None:
+            i = self._i
+            trend = self._trends[i]
+            trend_name = ''
+            if trend == 2:
+                trend_name = '强势上升；'
+            if trend == 1:
+                trend_name = '弱势上升；'
+            if trend == 0:
+                trend_name = '盘整；'
+            if trend == -1:
+                trend_name = '强势下降；'
+            if trend == -2:
+                trend_name = '弱势下降；'
+
+            trend = f'无' if trend_name == '' else f'{trend_name[:-1]}'
+
+            if self._is_volume_breakout():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 放量'
+            elif self._is_volume_shrink():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 缩量'
+            elif self._is_bullish_volume_divergence():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看涨量价背离'
+            elif self._is_bearish_volume_divergence():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看跌量价背离'
+            else:
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 正常'
 
-        if self._is_volume_breakout():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 放量'
-        elif self._is_volume_shrink():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 缩量'
-        elif self._is_bullish_volume_divergence():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看涨量价背离'
-        elif self._is_bearish_volume_divergence():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看跌量价背离'
-        else:
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 正常'
+            self.indicators = f'{trend}\n{volume}'
+        return self.indicators
 
-    def get_signal(self):
-        return self.signal
+@njit(cache=True)
+def _regime_flags(close, ma5, ma10, ma20, ema10, ema20, ema60, adx, momentum, low_volatility, osc_band_tol):
+    """
+    OptimizedTaStrategy / NewTrendTaStrategy 共用的趋势状态判断，返回 (强升, 弱升, 震荡, 强降, 弱降)
+    条件用 & / | 组合，同一函数可用于单个 bar 的标量或整段数组；NaN 比较为 False，与逐 bar 判断一致
+    """
+    ma_up = (ma5 > ma10) & (ma10 > ma20)
+    ma_down = (ma5 < ma10) & (ma10 < ma20)
+    ema_up = (ema10 > ema20) & (ema20 > ema60)
+    ema_down = (ema10 < ema20) & (ema20 < ema60)
+
+    # 强升：多均线多头排列、价格在短期均线上方、ADX > 25、正动量
+    strong_up = ma_up & ema_up & (close > ma5) & (adx > 25) & (momentum > 0)
+    # 弱升：短期均线多头排列、价格在中期均线上方、正动量
+    weak_up = ma_up & (close > ma10) & (momentum > 0)
+    # 震荡：ADX < 20、均线纠缠或低波动任一成立
+    consolidation = (adx < 20) | (np.abs(ma5 - ma10) / close < osc_band_tol) | low_volatility
+    # 强降：多均线空头排列、价格在中期均线下方、ADX > 25、负动量
+    strong_down = ma_down & ema_down & (close < ma10) & (adx > 25) & (momentum < 0)
+    # 弱降：短期均线空头排列、价格在短期均线下方、负动量
+    weak_down = ma_down & (close < ma5) & (momentum < 0)
+
+    return strong_up, weak_up, consolidation, strong_down, weak_down
 
 class OptimizedTaStrategy(bt.Strategy):
     """
@@ -955,7 +1450,40 @@ class OptimizedTaStrategy(bt.Strategy):
         full_log=False,
     )
 
+    # 预计算的指标不会出现在图中，绘图时由 ceboro_trend 添加对应的 bt 指标用于展示
+    plot_indicators = (
+        (bt.ind.SMA, dict(period=5)),
+        (bt.ind.SMA, dict(period=10)),
+        (bt.ind.SMA, dict(period=20)),
+        (bt.ind.BollingerBands, dict(period=20)),
+        (bt.ind.EMA, dict(period=9)),
+        (bt.ind.EMA, dict(period=21)),
+        (bt.ind.EMA, dict(period=50)),
+        (bt.ind.MACD, dict(period_me1=12, period_me2=26, period_signal=9)),
+        (bt.ind.RSI, dict(period=14)),
+        (bt.ind.ATR, dict(period=14)),
+        (bt.ind.Stochastic, dict(period=14, period_dfast=3, period_dslow=3)),
+        (bt.ind.ADX, dict(period=14)),
+        (bt.ind.PlusDI, dict(period=14)),
+        (bt.ind.MinusDI, dict(period=14)),
+        (bt.ind.Momentum, dict(period=10)),
+    )
+
     def __init__(self):
+        # 日志先缓存在内存中，stop() 时一次性输出
+        self.log_lines = []
+        # 运行模式在整个回测中不变，预先判断一次，逐 bar 逻辑中直接使用布尔值
+        self._trend_mode = self.p.function == 'trend'
+        self._suggest_mode = self.p.function == 'suggestion'
+        self._log_enabled = self._trend_mode and self.p.full_log
+        # 逐 bar 读取的参数缓存为普通属性，省去每次经 self.p 的两级属性查找
+        self._initial_amount = self.p.initial_amount
+        self._daily_amount = self.p.daily_amount
+        self._add_on_pullback_ratio = self.p.add_on_pullback_ratio
+        self._reduce_step = self.p.reduce_step
+        self._bottom_ratio = self.p.bottom_ratio
+        self._min_cash_buffer = self.p.min_cash_buffer
+
         # 基础数据
         self.close = self.datas[0].close
         self.low = self.datas[0].low
@@ -964,49 +1492,61 @@ class OptimizedTaStrategy(bt.Strategy):
         self.volume = self.datas[0].volume
         self.vol_ratio = 0.0
 
+        # 均线只依赖预加载的收盘价 / 成交量，在此一次性计算（与 bt.ind.SMA 口径一致），按 bar 下标 self._i 取值
+        close = np.asarray(self.close.array, dtype=np.float64)
+        self._close = close
+        self._i = 0
+
         # 多周期均线系统
-        self.ma_short = bt.ind.SMA(self.datas[0], period=5)
-        self.ma_mid = bt.ind.SMA(self.datas[0], period=10)
-        self.ma_long = bt.ind.SMA(self.datas[0], period=20)
+        self._ma5 = _rolling_mean(close, 5)
+        self._ma10 = _rolling_mean(close, 10)
+        self._ma20 = _rolling_mean(close, 20)
+
+        high = np.asarray(self.high.array, dtype=np.float64)
+        low = np.asarray(self.low.array, dtype=np.float64)
 
         # EMA系统增强趋势判断
-        self.ema10 = bt.indicators.EMA(self.data.close, period=9)
-        self.ema20 = bt.indicators.EMA(self.data.close, period=21)
-        self.ema60 = bt.indicators.EMA(self.data.close, period=50)
+        self._ema10 = _ema(close, 9)
+        self._ema20 = _ema(close, 21)
+        self._ema60 = _ema(close, 50)
 
         # 布林带
-        self.bbands = bt.ind.BollingerBands(self.datas[0], period=20)
-
-        # MACD
-        self.macd = bt.indicators.MACD(self.data.close, period_me1=12, period_me2=26, period_signal=9)
-        self.macd_hist = self.macd.macd - self.macd.signal
+        self._bb_mid, self._bb_top, self._bb_bot = _bollinger(close, 20)
 
         # RSI
-        self.rsi = bt.indicators.RSI(self.data.close, period=14)
-
-        # ATR
-        self.atr = bt.indicators.ATR(self.data, period=14)
+        self._rsi = _rsi(close, 14)
 
         # KDJ
-        self.stoch = bt.indicators.Stochastic(self.data, period=14, period_dfast=3, period_dslow=3)
-        self.kdj_k = self.stoch.percK
-        self.kdj_d = self.stoch.percD
-        self.kdj_j = 3 * self.kdj_k - 2 * self.kdj_d
+        self._kdj_k, self._kdj_d, self._kdj_j = _kdj(high, low, close, 14, 3, 3)
 
         # ADX 增强趋势强度判断
-        self.adx = bt.indicators.ADX(self.data, period=14)
-        self.di_plus = bt.ind.PlusDI(period=14)
-        self.di_minus = bt.ind.MinusDI(period=14)
+        self._di_plus, self._di_minus, self._adx = _directional(high, low, close, 14)
 
         # 动量指标
-        self.momentum = bt.indicators.Momentum(self.data.close, period=10)
+        self._momentum = _momentum(close, 10)
 
-        # 价格行为指标
-        self.price_change = self.data.close - self.data.close(-1)  # 日变化
-        self.volatility = bt.indicators.StandardDeviation(self.data.close, period=10)  # 波动率
+        # 波动率低于近 10 日平均的 80%（震荡判断用）；收盘价是否创前 5 日新低 / 新高（量价背离判断用）
+        volatility = _stddev(close, 10)
+        self._low_volatility = volatility < _lookback_sum(volatility, 10) / 10 * 0.8
+        self._new_low, self._new_high = _new_low_high(close)
+
+        # 趋势状态与超买 / 超卖判断只依赖上述指标，整段一次性算成布尔数组，逐 bar 按下标取值
+        (self._strong_up, self._weak_up, self._consolidation,
+         self._strong_down, self._weak_down) = _regime_flags(
+            close, self._ma5, self._ma10, self._ma20, self._ema10, self._ema20, self._ema60,
+            self._adx, self._momentum, self._low_volatility, self.p.osc_band_tol)
+        self._overbought = (self._rsi > 70) | (self._kdj_j > 80) | (close > self._bb_top)
+        self._oversold = (self._rsi < 30) | (self._kdj_j < 20) | (close < self._bb_bot)
 
         # 成交量相关指标
-        self.vol_sma = bt.indicators.SMA(self.data.volume, period=20)  # 成交量20日均线
+        self._volume = np.asarray(self.volume.array, dtype=np.float64)
+        self._vol_sma = _rolling_mean(self._volume, 20)  # 成交量20日均线
+        self._vol_ratio = _volume_ratio(self._volume, self._vol_sma)
+
+        # 量价状态只依赖成交量比例与新高 / 新低，整段一次性算成布尔数组，逐 bar 按下标取值
+        (self._volume_breakout, self._volume_shrink,
+         self._bullish_divergence, self._bearish_divergence) = _volume_states(
+            close, self._vol_ratio, self._new_low, self._new_high)
 
         self.signal = None
         self.indicators = None
@@ -1016,6 +1556,8 @@ class OptimizedTaStrategy(bt.Strategy):
         self.hold_cost = 0.0
         self.realized_pnl = 0.0
         self.max_hold_shares = 0.0
+        # 需保留的底仓份额，只在历史最大持仓变化时更新
+        self._min_allowed = 0.0
 
         # 订单跟踪
         self.order = None
@@ -1026,110 +1568,56 @@ class OptimizedTaStrategy(bt.Strategy):
         self.consecutive_up_days = 0  # 连续上涨天数
         self.consecutive_down_days = 0  # 连续下跌天数
 
-    def log(self, txt):
-        if self.p.function == 'trend' and self.p.full_log and len(self) > 250:
-            print(txt)
+    def log(self, txt, *args):
+        """
+        记录一行日志；txt 带参数时为 str.format 模板，只有需要输出时才格式化
+        """
+        if self._log_enabled and len(self) > 250:
+            self.log_lines.append(txt.format(*args) if args else txt)
 
     def _is_strong_up_trend(self):
         """
-        强势上升趋势判断
+        强势上升趋势判断：多均线多头排列、价格在短期均线上方、ADX > 25 且正动量
         """
-        # 多均线多头排列且价格在均线上方
-        ma_aligned = (self.ma_short[0] > self.ma_mid[0] > self.ma_long[0] and
-                      self.ema10[0] > self.ema20[0] > self.ema60[0])
-
-        # 价格在短期均线上方
-        price_above_ma = self.close[0] > self.ma_short[0]
-
-        # ADX表明趋势强劲 (>25表示趋势强劲)
-        strong_trend = self.adx[0] > 25
-
-        # 正动量
-        positive_momentum = self.momentum[0] > 0
-
-        return ma_aligned and price_above_ma and strong_trend and positive_momentum
+        return self._strong_up[self._i]
 
     def _is_weak_up_trend(self):
         """
-        弱势上升趋势判断
+        弱势上升趋势判断：短期均线多头排列、价格在中期均线上方且正动量
         """
-        # 至少短期均线多头排列
-        ma_weak_aligned = self.ma_short[0] > self.ma_mid[0] > self.ma_long[0]
-
-        # 价格在中期均线上方
-        price_above_mid = self.close[0] > self.ma_mid[0]
-
-        # 动量为正但较弱
-        weak_momentum = self.momentum[0] > 0
-
-        return ma_weak_aligned and price_above_mid and weak_momentum
+        return self._weak_up[self._i]
 
     def _is_strong_down_trend(self):
         """
-        强势下降趋势判断
+        强势下降趋势判断：多均线空头排列、价格在中期均线下方、ADX > 25 且负动量
         """
-        # 多均线空头排列且价格在均线下方
-        ma_aligned = (self.ma_short[0] < self.ma_mid[0] < self.ma_long[0] and
-                      self.ema10[0] < self.ema20[0] < self.ema60[0])
-
-        # 价格在中期均线下方
-        price_below_mid = self.close[0] < self.ma_mid[0]
-
-        # ADX表明趋势强劲
-        strong_trend = self.adx[0] > 25
-
-        # 负动量
-        negative_momentum = self.momentum[0] < 0
-
-        return ma_aligned and price_below_mid and strong_trend and negative_momentum
+        return self._strong_down[self._i]
 
     def _is_weak_down_trend(self):
         """
-        弱势下降趋势判断
+        弱势下降趋势判断：短期均线空头排列、价格在短期均线下方且负动量
         """
-        # 至少短期均线空头排列
-        ma_weak_aligned = self.ma_short[0] < self.ma_mid[0] < self.ma_long[0]
-
-        # 价格在短期均线下方
-        price_below_short = self.close[0] < self.ma_short[0]
-
-        # 动量为负但较弱
-        weak_momentum = self.momentum[0] < 0
-
-        return ma_weak_aligned and price_below_short and weak_momentum
+        return self._weak_down[self._i]
 
     def _is_consolidation(self):
         """
-        判断是否处于震荡整理状态
+        震荡整理判断：ADX < 20、均线纠缠或低波动任一成立
         """
-        # ADX较低表明无明显趋势 (<20表示震荡)
-        low_adx = self.adx[0] < 20
-
-        # 均线纠缠
-        ma_diff = abs(self.ma_short[0] - self.ma_mid[0]) / self.close[0]
-        narrow_bands = ma_diff < self.p.osc_band_tol
-
-        # 波动率较低
-        volatility_sum = 0.0
-        for i in range(10):
-            volatility_sum += self.volatility[-i]
-        avg_volatility = volatility_sum / 10
-        low_volatility = self.volatility[0] < avg_volatility * 0.8
-
-        return low_adx or narrow_bands or low_volatility
+        return self._consolidation[self._i]
 
     def _is_consolidation_new(self):
         """更专业、更稳定的震荡判定"""
+        i = self._i
 
-        close = self.close[0]
+        close = self._close[i]
 
         # --- 1. 趋势强度弱 ---
-        low_adx = self.adx[0] < 22
-        di_diff_small = abs(self.di_plus[0] - self.di_minus[0]) < 5
+        low_adx = self._adx[i] < 22
+        di_diff_small = abs(self._di_plus[i] - self._di_minus[i]) < 5
         weak_trend = low_adx or di_diff_small
 
         # --- 2. 均线纠缠（距离 + 斜率）---
-        ma5, ma10, ma20 = self.ma_short[0], self.ma_mid[0], self.ma_long[0]
+        ma5, ma10, ma20 = self._ma5[i], self._ma10[i], self._ma20[i]
 
         ma_distance_small = (
                 abs(ma5 - ma10) / close < 0.01 and
@@ -1137,91 +1625,57 @@ class OptimizedTaStrategy(bt.Strategy):
         )
 
         # slope = today_ma20 - yesterday_ma20
-        ma20_slope = abs(self.ma_long[0] - self.ma_long[-1]) / close
+        ma20_slope = abs(self._ma20[i] - self._ma20[i - 1]) / close
         slope_flat = ma20_slope < 0.003
 
         ma_converged = ma_distance_small and slope_flat
 
         # --- 3. 价格在区间（布林带）---
-        mid = self.bbands.lines.mid[0]
-        up = self.bbands.lines.top[0]
+        mid = self._bb_mid[i]
+        up = self._bb_top[i]
 
         price_in_middle_band = (close > mid - (up - mid) / 2) and (close < mid + (up - mid) / 2)
 
-        # --- 4. 波动率稳定（可选）---
-        vol_window = [self.volatility[-i] for i in range(10)]
-        vol_stable = np.std(vol_window) < np.mean(vol_window) * 0.8
-
         # --- 最终判断 ---
         return weak_trend and ma_converged and price_in_middle_band
 
     def _is_overbought(self):
         """
-        超买判断
+        超买判断：RSI > 70 或 KDJ J > 80 或价格突破布林上轨
         """
-        rsi_overbought = self.rsi[0] > 70
-        kdj_overbought = self.kdj_j[0] > 80
-        price_at_top_bb = self.close[0] > self.bbands.lines.top[0]
-
-        return rsi_overbought or kdj_overbought or price_at_top_bb
+        return self._overbought[self._i]
 
     def _is_oversold(self):
         """
-        超卖判断
+        超卖判断：RSI < 30 或 KDJ J < 20 或价格跌破布林下轨
         """
-        rsi_oversold = self.rsi[0] < 30
-        kdj_oversold = self.kdj_j[0] < 20
-        price_at_bottom_bb = self.close[0] < self.bbands.lines.bot[0]
-
-        return rsi_oversold or kdj_oversold or price_at_bottom_bb
+        return self._oversold[self._i]
 
     def _is_volume_breakout(self):
         """
-        判断是否有放量突破
+        判断是否有放量突破：成交量是近期平均的2倍以上，同时价格上涨
         """
-        # 成交量是近期平均的2倍以上
-        high_volume = self.vol_ratio > 2.0
-
-        # 同时价格上涨
-        price_increase = self.close[0] > self.close[-1]
-
-        return high_volume and price_increase
+        return self._volume_breakout[self._i]
 
     def _is_volume_shrink(self):
         """
-        判断是否缩量
+        判断是否缩量：成交量低于平均值的50%
         """
-        # 成交量低于平均值的50%
-        low_volume = 0.0 < self.vol_ratio < 0.5
-        return low_volume
+        return self._volume_shrink[self._i]
 
     def _is_bullish_volume_divergence(self):
         """
         判断是否存在看涨的量价背离
         价格创新低但成交量放大
         """
-        # 价格创近期新低
-        recent_low_price = min([self.close[-i] for i in range(1, 6)])
-        price_new_low = self.close[0] < recent_low_price
-
-        # 但成交量放大
-        volume_increase = self.vol_ratio > 1.5
-
-        return price_new_low and volume_increase
+        return self._bullish_divergence[self._i]
 
     def _is_bearish_volume_divergence(self):
         """
         判断是否存在看跌的量价背离
         价格创新高但成交量萎缩
         """
-        # 价格创近期新高
-        recent_high_price = max([self.close[-i] for i in range(1, 6)])
-        price_new_high = self.close[0] > recent_high_price
-
-        # 但成交量萎缩
-        volume_shrink = 0.0 < self.vol_ratio < 0.7
-
-        return price_new_high and volume_shrink
+        return self._bearish_divergence[self._i]
 
     def _is_good_entry_point(self):
         """
@@ -1230,6 +1684,7 @@ class OptimizedTaStrategy(bt.Strategy):
         1: 建仓 x1
         2: 建仓 x2
         """
+        i = self._i
         score = 0
 
         # 条件1: 处于超卖状态 (+1分)
@@ -1237,11 +1692,11 @@ class OptimizedTaStrategy(bt.Strategy):
             score += 1
 
         # 条件2: 动量指标开始转正 (+1分)
-        if self.momentum[0] > self.momentum[-1] and self.momentum[0] > 0:
+        if self._momentum[i] > self._momentum[i - 1] and self._momentum[i] > 0:
             score += 1
 
         # 条件3: 价格在布林下轨附近 (+1分)
-        if self.close[0] <= self.bbands.lines.bot[0] * 1.02:
+        if self._close[i] <= self._bb_bot[i] * 1.02:
             score += 1
 
         # 条件4: 成交量放大（有资金流入迹象）(+1分)
@@ -1263,22 +1718,23 @@ class OptimizedTaStrategy(bt.Strategy):
         """
         根据账户总价值计算目标仓位大小
         """
+        i = self._i
         total_value = self.broker.getvalue()
         target_value = total_value * target_exposure_ratio
-        current_position_value = self.hold_shares * self.close[0]
+        current_position_value = self.hold_shares * self._close[i]
         value_to_add = target_value - current_position_value
 
         if value_to_add > 0:
             available_cash = self._cash_available()
-            actual_value_to_add = min(value_to_add, available_cash)
-            return actual_value_to_add / self.close[0]
+            actual_value_to_add = available_cash if available_cash < value_to_add else value_to_add
+            return actual_value_to_add / self._close[i]
         else:
             # 需要减仓
-            shares_to_sell = abs(value_to_add) / self.close[0]
+            shares_to_sell = abs(value_to_add) / self._close[i]
             return -shares_to_sell
 
     def _cash_available(self):
-        return self.broker.getcash() - self.p.min_cash_buffer
+        return self.broker.getcash() - self._min_cash_buffer
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -1306,63 +1762,71 @@ class OptimizedTaStrategy(bt.Strategy):
             # 更新历史最高持仓
             if self.hold_shares > self.max_hold_shares:
                 self.max_hold_shares = self.hold_shares
+                self._min_allowed = self.max_hold_shares * self._bottom_ratio
 
-            self.log(f"{dt} {'BUY' if ex_size > 0 else 'SELL'} 成交: qty={ex_size:.4f} @ {ex_price:.4f} "
-                     f"| realized={realized:.2f}, hold_shares={self.hold_shares:.4f}, hold_cost={self.hold_cost:.2f}")
+            self.log("{} {} 成交: qty={:.4f} @ {:.4f} | realized={:.2f}, hold_shares={:.4f}, hold_cost={:.2f}",
+                     dt, 'BUY' if ex_size > 0 else 'SELL', ex_size, ex_price, realized, self.hold_shares, self.hold_cost)
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log(f"Order {order.Status[order.status]}")
+            self.log("Order {}", order.Status[order.status])
 
         self.order = None
 
     def next(self):
-        nav = float(self.close[0])
+        # 与原 EMA50 指标的最小周期一致，第 50 根 bar 起才开始操作
+        if len(self) < 50:
+            return
+
+        # 建议模式只输出最后一根 bar 的信号，且不下单、不依赖之前 bar 的状态，之前的 bar 直接跳过
+        if self._suggest_mode and len(self) < self.data.buflen():
+            return
+
+        self._i = i = len(self) - 1
+        nav = float(self._close[i])
         date = self.datas[0].datetime.date(0)
-        vol = self.data.volume[0]
-        sma = self.vol_sma[0]
-        self.vol_ratio = vol / sma if sma > 0 else 0.0
+        # 订单在下一根 bar 才成交，本 bar 内可用现金不变，只查询一次
+        cash_avail = self._cash_available()
+        self.vol_ratio = self._vol_ratio[i]
         self.signal = '无'
         entry_score = self._is_good_entry_point()
 
         # 初始建仓
-        entry_amt = self.p.initial_amount * entry_score
-        if self.start_nav is None and self.p.function == 'trend':
+        entry_amt = self._initial_amount * entry_score
+        if self.start_nav is None and self._trend_mode:
             # 如果满足建仓条件或者策略运行了一段时间仍未能建仓
             if entry_score > 0 or len(self) > 5:
-                amt = min(entry_amt, self._cash_available())
+                amt = cash_avail if cash_avail < entry_amt else entry_amt
                 if amt > 0:
                     size = amt / nav
                     self.order = self.buy(size=size)
                 self.start_nav = nav
                 self.start_value = self.broker.getvalue()
-                self.log(f"{date} 开始建仓：NAV={nav:.4f}, 投资 {amt:.2f}")
+                self.log("{} 开始建仓：NAV={:.4f}, 投资 {:.2f}", date, nav, amt)
                 return
             else:
-                self.log(f"{date} 等待合适建仓时机：NAV={nav:.4f}")
+                self.log("{} 等待合适建仓时机：NAV={:.4f}", date, nav)
                 return
-        elif self.p.function == 'suggestion' and entry_score > 0:
-            self.signal = f'建议建仓：{entry_amt:.2f}'
+        elif self._suggest_mode and entry_score > 0:
+            self.signal = ('建议建仓：{:.2f}', entry_amt)
 
         # 更新连续涨跌天数
-        if self.close[0] > self.close[-1]:
+        prev_nav = self._close[i - 1]
+        if nav > prev_nav:
             self.consecutive_up_days += 1
             self.consecutive_down_days = 0
-        elif self.close[0] < self.close[-1]:
+        elif nav < prev_nav:
             self.consecutive_down_days += 1
             self.consecutive_up_days = 0
         else:
             self.consecutive_up_days = 0
             self.consecutive_down_days = 0
 
-        # 计算日内涨幅
-        prev_close = float(self.close[-1]) if len(self.data) > 1 else nav
-
-        pos = self.getposition()
-        cash_avail = self._cash_available()
+        # 订单在下一根 bar 才成交，本 bar 内持仓不变，只查询一次
+        pos_size = self.getposition().size
 
         # 获取各指标值
-        bb_top = self.bbands.lines.top[0]
-        bb_bot = self.bbands.lines.bot[0]
+        bb_top = self._bb_top[i]
+        bb_bot = self._bb_bot[i]
 
         # 趋势判断
         strong_up_trend = self._is_strong_up_trend()
@@ -1384,21 +1848,22 @@ class OptimizedTaStrategy(bt.Strategy):
         # 1. 强势上升趋势 - 积极加仓
         if strong_up_trend and not overbought:
             # 根据趋势强度调整加仓比例
-            trend_strength = min(1.0, self.adx[0] / 50.0)  # 归一化AD值到0-1
+            strength = self._adx[i] / 50.0
+            trend_strength = strength if strength < 1.0 else 1.0  # 归一化AD值到0-1
             add_ratio = 2 * (1.0 + trend_strength)  # 1.0-2.0倍基础金额
 
             # 如果伴随放量突破，进一步增加仓位
             if volume_breakout:
                 add_ratio *= 1.2
 
-            increase_amt = self.p.daily_amount * add_ratio
-            amt = min(increase_amt, cash_avail)
-            if amt > 0 and self.p.function == 'trend':
+            increase_amt = self._daily_amount * add_ratio
+            amt = cash_avail if cash_avail < increase_amt else increase_amt
+            if amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
-                self.log(f"{date} 强势上升趋势，积极加仓 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"强势上升趋势，建议积极加仓 {increase_amt:.2f}"
+                self.log("{} 强势上升趋势，积极加仓 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+            elif self._suggest_mode:
+                self.signal = ("强势上升趋势，建议积极加仓 {:.2f}", increase_amt)
 
         # 2. 强势上升但超买的情况 - 适度加仓
         elif strong_up_trend and overbought:
@@ -1406,40 +1871,41 @@ class OptimizedTaStrategy(bt.Strategy):
 
             # 但如果出现看跌背离，则减少加仓
             multiplier = 0.5 if bearish_divergence else 1.0
-            increase_amt = self.p.daily_amount * multiplier
-            amt = min(increase_amt, cash_avail)  # 减少加仓比例
-            if amt > 0 and self.p.function == 'trend':
+            increase_amt = self._daily_amount * multiplier
+            amt = cash_avail if cash_avail < increase_amt else increase_amt  # 减少加仓比例
+            if amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
-                self.log(f"{date} 强势上升趋势(超买)，适度加仓 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"强势上升趋势(超买)，建议适度加仓 {increase_amt:.2f}"
+                self.log("{} 强势上升趋势(超买)，适度加仓 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+            elif self._suggest_mode:
+                self.signal = ("强势上升趋势(超买)，建议适度加仓 {:.2f}", increase_amt)
 
         # 3. 弱势上升趋势 - 稳健加仓
         elif weak_up_trend and not overbought:
             # 如果出现看涨背离，增加信心
             multiplier = 1.5 if bullish_divergence else 1.0
-            increase_amt = self.p.daily_amount * multiplier
-            amt = min(increase_amt, cash_avail)
-            if amt > 0 and self.p.function == 'trend':
+            increase_amt = self._daily_amount * multiplier
+            amt = cash_avail if cash_avail < increase_amt else increase_amt
+            if amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
-                self.log(f"{date} 弱势上升趋势，稳健加仓 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"弱势上升趋势，建议稳健加仓 {increase_amt:.2f}"
+                self.log("{} 弱势上升趋势，稳健加仓 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+            elif self._suggest_mode:
+                self.signal = ("弱势上升趋势，建议稳健加仓 {:.2f}", increase_amt)
 
         # 4. 回调买入机会 - 在上升趋势中的超卖位置
         elif (strong_up_trend or weak_up_trend) and oversold:
             # 如果缩量回调，更加确认回调性质
             extra_multiplier = 1.2 if volume_shrink else 1.0
-            increase_amt = self.p.daily_amount * self.p.add_on_pullback_ratio * extra_multiplier
-            extra = min(self.p.daily_amount * self.p.add_on_pullback_ratio * extra_multiplier, cash_avail)
-            if extra > 0 and cash_avail > 0 and self.p.function == 'trend':
+            increase_amt = self._daily_amount * self._add_on_pullback_ratio * extra_multiplier
+            want = self._daily_amount * self._add_on_pullback_ratio * extra_multiplier
+            extra = cash_avail if cash_avail < want else want
+            if extra > 0 and cash_avail > 0 and self._trend_mode:
                 size = extra / nav
                 self.buy(size=size)
-                self.log(f"{date} 上升趋势回调，低吸 {extra:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"上升趋势回调，建议低吸 {increase_amt:.2f}"
+                self.log("{} 上升趋势回调，低吸 {:.2f} -> {:.4f} 份 @ {:.4f}", date, extra, size, nav)
+            elif self._suggest_mode:
+                self.signal = ("上升趋势回调，建议低吸 {:.2f}", increase_amt)
 
         # 5. 震荡市 - 高抛低吸
         elif consolidation:
@@ -1447,78 +1913,83 @@ class OptimizedTaStrategy(bt.Strategy):
             if (nav <= bb_bot or oversold) and not (strong_down_trend or weak_down_trend):
                 # 如果出现看涨背离，增加买入力度
                 amt_multiplier = 1.5 if bullish_divergence else 1.0
-                increase_amt = self.p.daily_amount * amt_multiplier
-                amt = min(increase_amt, cash_avail)  # 减少投入
-                if amt > 0 and self.p.function == 'trend':
+                increase_amt = self._daily_amount * amt_multiplier
+                amt = cash_avail if cash_avail < increase_amt else increase_amt  # 减少投入
+                if amt > 0 and self._trend_mode:
                     size = amt / nav
                     self.buy(size=size)
-                    self.log(f"{date} 震荡市低位吸纳 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"震荡市，建议低位吸纳 {increase_amt:.2f}"
+                    self.log("{} 震荡市低位吸纳 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+                elif self._suggest_mode:
+                    self.signal = ("震荡市，建议低位吸纳 {:.2f}", increase_amt)
 
             # 高位卖出
             elif (nav >= bb_top or overbought) and not (strong_up_trend or weak_up_trend):
                 # 如果出现看跌背离或放量滞涨，增加卖出力度
                 sell_multiplier = 1.5 if (bearish_divergence or volume_shrink) else 1.0
-                reduce_step = self.p.reduce_step * sell_multiplier
-                if pos.size > 0 and self.p.function == 'trend':
-                    size_to_sell = pos.size * reduce_step
+                reduce_step = self._reduce_step * sell_multiplier
+                if pos_size > 0 and self._trend_mode:
+                    size_to_sell = pos_size * reduce_step
                     if size_to_sell > 0:
                         self.sell(size=size_to_sell)
-                        self.log(f"{date} 震荡市高位减持 {size_to_sell:.4f} 份 @ {nav:.4f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"震荡市，建议高位减持 {reduce_step:.2%} 仓位"
+                        self.log("{} 震荡市高位减持 {:.4f} 份 @ {:.4f}", date, size_to_sell, nav)
+                elif self._suggest_mode:
+                    self.signal = ("震荡市，建议高位减持 {:.2%} 仓位", reduce_step)
 
             # 建仓条件：在震荡市中出现好的买入点
             elif entry_score > 0:
-                amt = min(entry_amt, self._cash_available())
-                if self.start_nav is None and amt > 0 and self.p.function == 'trend':
+                amt = cash_avail if cash_avail < entry_amt else entry_amt
+                if self.start_nav is None and amt > 0 and self._trend_mode:
                     size = amt / nav
                     self.buy(size=size)
                     self.start_nav = nav
                     self.start_value = self.broker.getvalue()
-                    self.log(f"{date} 震荡市中发现建仓机会，投资 {amt:.2f}")
-                elif self.p.function == 'suggestion':
-                    self.signal = f"震荡市，发现建仓机会，建议投资 {entry_amt:.2f}"
+                    self.log("{} 震荡市中发现建仓机会，投资 {:.2f}", date, amt)
+                elif self._suggest_mode:
+                    self.signal = ("震荡市，发现建仓机会，建议投资 {:.2f}", entry_amt)
 
         # 6. 强势下降趋势 - 快速减仓
         elif strong_down_trend:
             # 超买时增加减仓
-            min_allowed = self.max_hold_shares * self.p.bottom_ratio
-            can_reduce = max(0.0, pos.size - min_allowed)
-            reduce_step = self.p.reduce_step * 3 if overbought else self.p.reduce_step * 2
+            min_allowed = self._min_allowed
+            reducible = pos_size - min_allowed
+            can_reduce = reducible if reducible > 0.0 else 0.0
+            reduce_step = self._reduce_step * 3 if overbought else self._reduce_step * 2
             # 如果出现放量下跌，进一步增加减仓力度
             if volume_breakout:
                 reduce_step *= 1.5
-            reduce_ratio = min(1.0, reduce_step)
-            size_to_sell = min(pos.size * reduce_ratio, can_reduce)
-            if pos.size > 0 and self.p.function == 'trend' and can_reduce > 0:
+            reduce_ratio = reduce_step if reduce_step < 1.0 else 1.0
+            want_sell = pos_size * reduce_ratio
+            size_to_sell = can_reduce if can_reduce < want_sell else want_sell
+            if pos_size > 0 and self._trend_mode and can_reduce > 0:
                 if size_to_sell > 0:
                     self.sell(size=size_to_sell)
                     self.log(
-                        f"{date} 强势下降趋势，快速减仓 {size_to_sell:.4f} 份 @ {nav:.4f} (保留底仓 {min_allowed:.4f})")
-            elif self.p.function == 'suggestion':
-                self.signal = f"强势下降趋势，建议快速减仓 {reduce_step:.2%} 仓位"
+                        "{} 强势下降趋势，快速减仓 {:.4f} 份 @ {:.4f} (保留底仓 {:.4f})", date, size_to_sell, nav, min_allowed)
+            elif self._suggest_mode:
+                self.signal = ("强势下降趋势，建议快速减仓 {:.2%} 仓位", reduce_step)
 
         # 7. 弱势下降趋势 - 缓慢减仓
         elif weak_down_trend:
             # 如果出现看涨背离，减缓减仓速度
             reduce_multiplier = 0.5 if bullish_divergence else 1.0
-            reduce_step = self.p.reduce_step * reduce_multiplier
-            if pos.size > 0 and self.p.function == 'trend':
-                min_allowed = self.max_hold_shares * self.p.bottom_ratio
-                can_reduce = max(0.0, pos.size - min_allowed)
+            reduce_step = self._reduce_step * reduce_multiplier
+            if pos_size > 0 and self._trend_mode:
+                min_allowed = self._min_allowed
+                reducible = pos_size - min_allowed
+                can_reduce = reducible if reducible > 0.0 else 0.0
                 if can_reduce > 0:
-                    size_to_sell = min(pos.size * reduce_step, can_reduce)
+                    want_sell = pos_size * reduce_step
+                    size_to_sell = can_reduce if can_reduce < want_sell else want_sell
                     if size_to_sell > 0:
                         self.sell(size=size_to_sell)
                         self.log(
-                            f"{date} 弱势下降趋势，缓慢减仓 {size_to_sell:.4f} 份 @ {nav:.4f} (保留底仓 {min_allowed:.4f})")
-            elif self.p.function == 'suggestion':
-                self.signal = f"弱势下降趋势，建议缓慢减仓 {reduce_step:.2%} 仓位"
+                            "{} 弱势下降趋势，缓慢减仓 {:.4f} 份 @ {:.4f} (保留底仓 {:.4f})", date, size_to_sell, nav, min_allowed)
+            elif self._suggest_mode:
+                self.signal = ("弱势下降趋势，建议缓慢减仓 {:.2%} 仓位", reduce_step)
 
     def stop(self):
-        nav = float(self.close[0])
+        self._i = i = len(self) - 1
+        nav = float(self._close[i])
         hold_value = self.hold_shares * nav
         unrealized = hold_value - self.hold_cost
         total_realized = self.realized_pnl
@@ -1530,73 +2001,78 @@ class OptimizedTaStrategy(bt.Strategy):
 
         if self.p.function != 'suggestion':
             self.log("\n=== 回测结果 ===")
-            self.log(f"最终日期: {self.datas[0].datetime.date(0)}")
-            self.log(f"持仓份额: {self.hold_shares:.4f}")
-            self.log(f"持仓成本(total): {self.hold_cost:.2f}")
-            self.log(f"持仓市值: {hold_value:.2f}")
-            self.log(f"未实现 PnL: {unrealized:.2f}")
-            self.log(f"已实现 PnL: {total_realized:.2f}")
+            self.log("最终日期: {}", self.datas[0].datetime.date(0))
+            self.log("持仓份额: {:.4f}", self.hold_shares)
+            self.log("持仓成本(total): {:.2f}", self.hold_cost)
+            self.log("持仓市值: {:.2f}", hold_value)
+            self.log("未实现 PnL: {:.2f}", unrealized)
+            self.log("已实现 PnL: {:.2f}", total_realized)
             if hold_roi is not None:
-                self.log(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
+                self.log("仅仓位收益率 (hold ROI): {:.2%}", hold_roi)
             else:
                 self.log("仅仓位收益率 (hold ROI): N/A (无持仓成本)")
-            self.log(f"总资金 (broker): {self.broker.getvalue():.2f}")
+            self.log("总资金 (broker): {:.2f}", self.broker.getvalue())
             self.log("================\n")
 
+        _flush_log(self.log_lines)
+
         if not self.p.full_log and 'trend' in self.p.function:
             print(f"持仓市值: {hold_value:.2f}")
             if hold_roi is not None:
                 print(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
             print(f"总资金 (broker): {self.broker.getvalue():.2f}")
 
-        ma = f'MA5={self.ma_short[0]:.4f}, MA10={self.ma_mid[0]:.4f}, MA20={self.ma_long[0]:.4f}'
-        price = f'CLOSE={self.close[0]:.4f}'
-        adx = f'ADX={self.adx[0]:.4f}'
-        momentum = f'MOM={self.momentum[0]:.4f}'
-        rsi = f'RSI={self.rsi[0]:.4f}'
-        kdj = f'KDJ={self.kdj_j[0]:.4f}'
-        bb = f'BOLL: {self.bbands.lines.mid[0]:.4f}/{self.bbands.lines.top[0]:.4f}/{self.bbands.lines.bot[0]:.4f}'
-        trend_indicators = f'{ma}，{price}，{adx}，{momentum}\n趋势：'
-        trend = ''
-
-        if self._is_strong_up_trend():
-            trend += '强势上升；'
-        if self._is_weak_up_trend():
-            trend += '弱势上升；'
-        if self._is_consolidation():
-            trend += '盘整；'
-        if self._is_strong_down_trend():
-            trend += '强势下降；'
-        if self._is_weak_down_trend():
-            trend += '弱势下降；'
-
-        trend = f'{trend_indicators}无' if trend == '' else f'{trend_indicators}{trend[:-1]}'
-
-        if self._is_oversold():
-            over = f'{rsi}，{kdj}，{bb}，状态: 超卖'
-        elif self._is_overbought():
-            over = f'{rsi}，{kdj}，{bb}，状态: 超买'
-        else:
-            over = f'{rsi}，{kdj}，{bb}，状态: 正常'
-
-        if self._is_volume_breakout():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 放量'
-        elif self._is_volume_shrink():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 缩量'
-        elif self._is_bullish_volume_divergence():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看涨量价背离'
-        elif self._is_bearish_volume_divergence():
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看跌量价背离'
-        else:
-            volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 正常'
-
-        self.indicators = f'{trend}\n{over}\n{volume}'
-
-
     def get_signal(self):
-        return self.signal
+        return _format_signal(self.signal)
 
     def get_indicators(self):
+        """
+        当前指标汇总；只在调用时才格式化（首次调用后缓存），stop() 中不再拼接字符串
+        """
+        if self.indicators is None:
+            i = self._i
+            ma = f'MA5={self._ma5[i]:.4f}, MA10={self._ma10[i]:.4f}, MA20={self._ma20[i]:.4f}'
+            price = f'CLOSE={self._close[i]:.4f}'
+            adx = f'ADX={self._adx[i]:.4f}'
+            momentum = f'MOM={self._momentum[i]:.4f}'
+            rsi = f'RSI={self._rsi[i]:.4f}'
+            kdj = f'KDJ={self._kdj_j[i]:.4f}'
+            bb = f'BOLL: {self._bb_mid[i]:.4f}/{self._bb_top[i]:.4f}/{self._bb_bot[i]:.4f}'
+            trend_indicators = f'{ma}，{price}，{adx}，{momentum}\n趋势：'
+            trend = ''
+
+            if self._is_strong_up_trend():
+                trend += '强势上升；'
+            if self._is_weak_up_trend():
+                trend += '弱势上升；'
+            if self._is_consolidation():
+                trend += '盘整；'
+            if self._is_strong_down_trend():
+                trend += '强势下降；'
+            if self._is_weak_down_trend():
+                trend += '弱势下降；'
+
+            trend = f'{trend_indicators}无' if trend == '' else f'{trend_indicators}{trend[:-1]}'
+
+            if self._is_oversold():
+                over = f'{rsi}，{kdj}，{bb}，状态: 超卖'
+            elif self._is_overbought():
+                over = f'{rsi}，{kdj}，{bb}，状态: 超买'
+            else:
+                over = f'{rsi}，{kdj}，{bb}，状态: 正常'
+
+            if self._is_volume_breakout():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 放量'
+            elif self._is_volume_shrink():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 缩量'
+            elif self._is_bullish_volume_divergence():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看涨量价背离'
+            elif self._is_bearish_volume_divergence():
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 看跌量价背离'
+            else:
+                volume = f'成交量比例：{self.vol_ratio:.2%}，状态: 正常'
+
+            self.indicators = f'{trend}\n{over}\n{volume}'
         return self.indicators
 
 class HurstExponent(bt.Indicator):
@@ -1637,6 +2113,46 @@ class HurstExponent(bt.Indicator):
 
         self.lines.hurst[0] = np.log(R / S) / np.log(len(X))
 
+# NewTrendTaStrategy 趋势状态编码：SU 强升 / WU 弱升 / CO 震荡 / SD 强降 / WD 弱降 / UT 不明，
+# NONE 表示尚无上期趋势；TREND_LABELS 为日志中对应的名称
+TREND_SU, TREND_WU, TREND_CO, TREND_SD, TREND_WD, TREND_UT, TREND_NONE = range(7)
+TREND_LABELS = ('SU', 'WU', 'CO', 'SD', 'WD', 'UT', '')
+
+# 趋势状态变化 (前一日, 当日) -> (操作倍数, 信号说明)，未列出的组合不操作
+_TREND_TABLE = {
+    # 趋势无变化（常态保持）
+    ("WU", "WU"): (0.5, "趋势保持弱升，小加仓"),  # 弱升维持 → 小加仓
+    ("WD", "WD"): (-1, "趋势保持弱跌，小减仓"),  # 弱跌维持 → 小减仓
+    ("SU", "SU"): (0.5, "趋势保持强升，轻加仓"),  # 强升维持 → 轻加仓
+    ("SD", "SD"): (-2, "趋势保持强跌，大幅减仓"),  # 强跌维持 → 大幅减仓
+
+    # ===== 上升方向 =====
+    ("CO", "WU"): (1, "震荡→弱升，试探性建仓"),
+    ("WU", "SU"): (2, "弱升→强升，加速加仓"),
+    ("CO", "SU"): (3, "震荡→强升，强力建仓（有效突破）"),
+    ("SU", "WU"): (-1, "弱升→震荡，减仓"),
+    ("WU", "CO"): (-1, "弱升→震荡，减仓"),
+    ("SU", "CO"): (-1, "强升结束（可能见顶），减仓"),  # 强升结束（可能见顶）
+
+    # ===== 下降方向 =====
+    ("CO", "WD"): (-2, "震荡转弱跌，减仓"),
+    ("WD", "SD"): (-2, "弱跌转强跌，减仓"),
+    ("CO", "SD"): (-3, "震荡转强跌，减仓"),
+    ("SD", "WD"): (0, "强跌转弱跌，不加仓（避免抄底）"),
+    ("WD", "CO"): (0, "弱跌企稳，不加仓（横盘可能继续跌）"),
+    ("SD", "CO"): (0, "强跌企稳，不加仓（等待趋势反转确认）"),
+
+    # ===== 特殊：上下反复的震荡系反转 =====
+    ("WU", "WD"): (0, "上下反复，继续观望"),
+    ("WD", "WU"): (0, "上下反复，继续观望"),
+}
+
+# 按 前一日编码 * 状态数 + 当日编码 展开成定长元组，逐 bar 只需一次下标访问
+_TREND_TRANSITIONS = tuple(
+    _TREND_TABLE.get((prev, curr), (0, f"{prev}→{curr}，无操作"))
+    for prev in TREND_LABELS for curr in TREND_LABELS
+)
+
 class NewTrendTaStrategy(bt.Strategy):
     """
     优化后的 TaStrategy 策略，改进了趋势判断算法、增强了指标可靠性并优化了加减仓逻辑
@@ -1655,7 +2171,41 @@ class NewTrendTaStrategy(bt.Strategy):
         full_log=False,
     )
 
+    # 预计算的指标不会出现在图中，绘图时由 ceboro_trend 添加对应的 bt 指标用于展示
+    plot_indicators = (
+        (bt.ind.SMA, dict(period=5)),
+        (bt.ind.SMA, dict(period=10)),
+        (bt.ind.SMA, dict(period=20)),
+        (bt.ind.EMA, dict(period=10)),
+        (bt.ind.EMA, dict(period=20)),
+        (bt.ind.EMA, dict(period=60)),
+        (bt.ind.EMA, dict(period=120)),
+        (bt.ind.BollingerBands, dict(period=20)),
+        (bt.ind.MACD, dict(period_me1=12, period_me2=26, period_signal=9)),
+        (bt.ind.RSI, dict(period=14)),
+        (bt.ind.ATR, dict(period=14)),
+        (bt.ind.Stochastic, dict(period=14, period_dfast=3, period_dslow=3)),
+        (bt.ind.ADX, dict(period=14)),
+        (bt.ind.PlusDI, dict(period=14)),
+        (bt.ind.MinusDI, dict(period=14)),
+        (bt.ind.Momentum, dict(period=10)),
+        (HurstExponent, dict()),
+    )
+
     def __init__(self):
+        # 日志先缓存在内存中，stop() 时一次性输出
+        self.log_lines = []
+        # 运行模式在整个回测中不变，预先判断一次，逐 bar 逻辑中直接使用布尔值
+        self._trend_mode = self.p.function == 'trend'
+        self._suggest_mode = self.p.function == 'suggestion'
+        self._log_enabled = self._trend_mode and self.p.full_log
+        # 逐 bar 读取的参数缓存为普通属性，省去每次经 self.p 的两级属性查找
+        self._initial_amount = self.p.initial_amount
+        self._daily_amount = self.p.daily_amount
+        self._reduce_step = self.p.reduce_step
+        self._bottom_ratio = self.p.bottom_ratio
+        self._min_cash_buffer = self.p.min_cash_buffer
+
         # 基础数据
         self.close = self.datas[0].close
         self.low = self.datas[0].low
@@ -1663,59 +2213,86 @@ class NewTrendTaStrategy(bt.Strategy):
         self.open = self.datas[0].open
         self.volume = self.datas[0].volume
         self.vol_ratio = 0.0
-        self.trend_now = ''
-        self.trend_prev = ''
-        self.trend_old = ''
+        self.trend_now = TREND_NONE
+        self.trend_prev = TREND_NONE
+        self.trend_old = TREND_NONE
         self.last_action = 0
         self.max_cash = self.broker.getcash()
 
+        # 均线 / 布林带 / MACD / RSI / ATR / KDJ 只依赖预加载的 OHLC（cerebro 默认 preload=True），
+        # 在此一次性向量化计算（与对应 bt 指标口径一致），next() 中按 bar 下标 self._i 取值
+        close = np.asarray(self.close.array, dtype=np.float64)
+        high = np.asarray(self.high.array, dtype=np.float64)
+        low = np.asarray(self.low.array, dtype=np.float64)
+        self._close = close
+        self._i = 0
+
         # 多周期均线系统
-        self.ma_short = bt.ind.SMA(self.datas[0], period=5)
-        self.ma_mid = bt.ind.SMA(self.datas[0], period=10)
-        self.ma_long = bt.ind.SMA(self.datas[0], period=20)
+        self._ma5 = _rolling_mean(close, 5)
+        self._ma10 = _rolling_mean(close, 10)
+        self._ma20 = _rolling_mean(close, 20)
 
         # EMA系统增强趋势判断
-        self.ema10 = bt.indicators.EMA(self.data.close, period=10)
-        self.ema20 = bt.indicators.EMA(self.data.close, period=20)
-        self.ema60 = bt.indicators.EMA(self.data.close, period=60)
-        self.ema120 = bt.indicators.EMA(self.data.close, period=120)
+        self._ema10 = _ema(close, 10)
+        self._ema20 = _ema(close, 20)
+        self._ema60 = _ema(close, 60)
+        self._ema120 = _ema(close, 120)
+        self._long_down = _long_down_trend(close, self._ema20, self._ema60, self._ema120, 30)
 
         # 布林带
-        self.bbands = bt.ind.BollingerBands(self.datas[0], period=20)
-        self.bb_top = self.bbands.lines.top
-        self.bb_bot = self.bbands.lines.bot
+        self._bb_mid, self._bb_top, self._bb_bot = _bollinger(close, 20)
 
         # MACD
-        self.macd = bt.indicators.MACD(self.data.close, period_me1=12, period_me2=26, period_signal=9)
-        self.macd_hist = self.macd.macd - self.macd.signal
+        self._macd = _ema(close, 12) - _ema(close, 26)
+        self._macd_signal = _ema(self._macd, 9)
+        self._macd_hist = self._macd - self._macd_signal
 
         # RSI
-        self.rsi = bt.indicators.RSI(self.data.close, period=14)
+        self._rsi = _rsi(close, 14)
 
         # ATR
-        self.atr = bt.indicators.ATR(self.data, period=14)
+        self._atr = _atr(high, low, close, 14)
 
         # KDJ
-        self.stoch = bt.indicators.Stochastic(self.data, period=14, period_dfast=3, period_dslow=3)
-        self.kdj_k = self.stoch.percK
-        self.kdj_d = self.stoch.percD
-        self.kdj_j = 3 * self.kdj_k - 2 * self.kdj_d
+        self._kdj_k, self._kdj_d, self._kdj_j = _kdj(high, low, close, 14, 3, 3)
+
+        # 超买 / 超卖判定只依赖上述指标，预先算成布尔数组
+        self._overbought = (self._rsi > 70) | (self._kdj_j > 80) | (close > self._bb_top)
+        self._oversold = (self._rsi < 30) | (self._kdj_j < 20) | (close < self._bb_bot)
 
         # ADX 增强趋势强度判断
-        self.adx = bt.indicators.ADX(self.data, period=14)
-        self.di_plus = bt.ind.PlusDI(period=14)
-        self.di_minus = bt.ind.MinusDI(period=14)
+        self._di_plus, self._di_minus, self._adx = _directional(high, low, close, 14)
 
         # 动量指标
-        self.momentum = bt.indicators.Momentum(self.data.close, period=10)
-        self.hurst = HurstExponent(self.data)
-
-        # 价格行为指标
-        self.price_change = self.data.close - self.data.close(-1)  # 日变化
-        self.volatility = bt.indicators.StandardDeviation(self.data.close, period=10)  # 波动率
+        self._momentum = _momentum(close, 10)
+        self._hurst = _hurst(close)
+
+        # 波动率低于近 10 日平均的 80%（震荡判断用）；收盘价是否创前 5 日新低 / 新高（量价背离判断用）
+        volatility = _stddev(close, 10)
+        self._low_volatility = volatility < _lookback_sum(volatility, 10) / 10 * 0.8
+        self._new_low, self._new_high = _new_low_high(close)
+
+        # 趋势状态判断只依赖上述指标，整段一次性算成布尔数组，逐 bar 按下标取值
+        (self._strong_up, self._weak_up, consolidation,
+         self._strong_down, self._weak_down) = _regime_flags(
+            close, self._ma5, self._ma10, self._ma20, self._ema10, self._ema20, self._ema60,
+            self._adx, self._momentum, self._low_volatility, self.p.osc_band_tol)
+        # 震荡判断再加入 Hurst < 0.45（强均值回归）
+        self._consolidation = consolidation | (self._hurst < 0.45)
+        # 每个 bar 的趋势状态，按 _get_trend 的判断优先级取第一个成立的状态
+        self._trends = np.select(
+            [self._strong_up, self._weak_up, self._consolidation, self._strong_down, self._weak_down],
+            [TREND_SU, TREND_WU, TREND_CO, TREND_SD, TREND_WD], TREND_UT).tolist()
 
         # 成交量相关指标
-        self.vol_sma = bt.indicators.SMA(self.data.volume, period=20)  # 成交量20日均线
+        self._volume = np.asarray(self.volume.array, dtype=np.float64)
+        self._vol_sma = _rolling_mean(self._volume, 20)  # 成交量20日均线
+        self._vol_ratio = _volume_ratio(self._volume, self._vol_sma)
+
+        # 量价状态只依赖成交量比例与新高 / 新低，整段一次性算成布尔数组，逐 bar 按下标取值
+        (self._volume_breakout, self._volume_shrink,
+         self._bullish_divergence, self._bearish_divergence) = _volume_states(
+            close, self._vol_ratio, self._new_low, self._new_high)
 
         self.signal = None
         self.indicators = None
@@ -1724,6 +2301,7 @@ class NewTrendTaStrategy(bt.Strategy):
         self.hold_shares = 0.0
         self.hold_cost = 0.0
         self.realized_pnl = 0.0
+        self.fills = []  # 成交记录 (份额, 价格, 成交日志行号)
         self.max_hold_shares = 0.0
 
         # 订单跟踪
@@ -1735,213 +2313,70 @@ class NewTrendTaStrategy(bt.Strategy):
         self.consecutive_up_days = 0  # 连续上涨天数
         self.consecutive_down_days = 0  # 连续下跌天数
 
-    def log(self, txt):
-        if self.p.function == 'trend' and self.p.full_log and len(self) > 100:
-            print(txt)
+    def log(self, txt, *args):
+        """
+        记录一行日志；txt 带参数时为 str.format 模板，只有需要输出时才格式化
+        """
+        if self._log_enabled and len(self) > 100:
+            self.log_lines.append(txt.format(*args) if args else txt)
 
     def is_long_down_trend(self, prev, curr):
         """
         判断是否处于【长下跌趋势】
-        满足 3 个条件中的 ≥2 个 即认为成立
+        5 个条件中满足 ≥3 个即认为成立
         """
 
-        N = 30
-        if len(self.data) < N + 1:
-            return False
-
-        score = 0
-
-        # ========== 1️⃣ 下跌天数占比 ==========
-        down_days = sum(self.data.close[-i] < self.data.close[-i - 1] for i in range(1, N + 1))
-
-        if down_days / N >= 0.5:
-            score += 1
-
-        # ========== 2️⃣ 累计跌幅 ==========
-        cum_return = (self.data.close[0] - self.data.close[-N]) / self.data.close[-N]
-        if cum_return <= -0.1:
-            score += 1
-
-        # ========== 3️⃣ 均线空头排列 ==========
-        if self.ema20[0] < self.ema60[0] < self.ema120[0] < self.ema120[-5]:
-            score += 1
-
-        if self.close[0] < self.ema120[0]:
-            score += 1
-
-        # ========== 4️⃣ 新低结构（防反弹） ==========
-        lowest = min(self.data.close.get(size=N))
-        new_low_count = sum(self.data.close[-i] <= lowest * 1.01 for i in range(N))
-
-        if new_low_count / N >= 0.4:
-            score += 1
-
-        # 至少满足 2 个条件
-        if score >= 3:
+        # 评分在 __init__ 中整段算出（_long_down_trend），逐 bar 只需按下标取值
+        if self._long_down[self._i]:
             # 禁止反弹加仓
-            if prev in ('SD', 'WD') and curr in ('WU', 'CO'):
+            if prev in (TREND_SD, TREND_WD) and curr in (TREND_WU, TREND_CO):
                 return 0, "长期下跌，禁止反弹加仓"
 
             # 只有真正结构反转才允许试探
-            if curr == 'SU':
+            if curr == TREND_SU:
                 return 1, "长期下跌，强力反弹，尝试小加仓"
 
             return -1, "长期下跌，减仓"
 
         return 0, None
 
-    def _is_strong_up_trend(self):
-        """
-        强势上升趋势判断
-        """
-        # 多均线多头排列且价格在均线上方
-        ma_aligned = (self.ma_short[0] > self.ma_mid[0] > self.ma_long[0] and
-                      self.ema10[0] > self.ema20[0] > self.ema60[0])
-
-        # 价格在短期均线上方
-        price_above_ma = self.close[0] > self.ma_short[0]
-
-        # ADX表明趋势强劲 (>25表示趋势强劲)
-        strong_trend = self.adx[0] > 25
-
-        # 正动量
-        positive_momentum = self.momentum[0] > 0
-
-        return ma_aligned and price_above_ma and strong_trend and positive_momentum
-
-    def _is_weak_up_trend(self):
-        """
-        弱势上升趋势判断
-        """
-        # 至少短期均线多头排列
-        ma_weak_aligned = self.ma_short[0] > self.ma_mid[0] > self.ma_long[0]
-
-        # 价格在中期均线上方
-        price_above_mid = self.close[0] > self.ma_mid[0]
-
-        # 动量为正但较弱
-        weak_momentum = self.momentum[0] > 0
-
-        return ma_weak_aligned and price_above_mid and weak_momentum
-
-    def _is_strong_down_trend(self):
-        """
-        强势下降趋势判断
-        """
-        # 多均线空头排列且价格在均线下方
-        ma_aligned = (self.ma_short[0] < self.ma_mid[0] < self.ma_long[0] and
-                      self.ema10[0] < self.ema20[0] < self.ema60[0])
-
-        # 价格在中期均线下方
-        price_below_mid = self.close[0] < self.ma_mid[0]
-
-        # ADX表明趋势强劲
-        strong_trend = self.adx[0] > 25
-
-        # 负动量
-        negative_momentum = self.momentum[0] < 0
-
-        return ma_aligned and price_below_mid and strong_trend and negative_momentum
-
-    def _is_weak_down_trend(self):
-        """
-        弱势下降趋势判断
-        """
-        # 至少短期均线空头排列
-        ma_weak_aligned = self.ma_short[0] < self.ma_mid[0] < self.ma_long[0]
-
-        # 价格在短期均线下方
-        price_below_short = self.close[0] < self.ma_short[0]
-
-        # 动量为负但较弱
-        weak_momentum = self.momentum[0] < 0
-
-        return ma_weak_aligned and price_below_short and weak_momentum
-
-    def _is_consolidation(self):
-        """更专业、更稳定的震荡判定"""
-
-        """加入 Hurst 后的震荡判断"""
-        low_adx = self.adx[0] < 20
-
-        ma_diff = abs(self.ma_short[0] - self.ma_mid[0]) / self.close[0]
-        narrow_ma = ma_diff < self.p.osc_band_tol
-
-        vol10 = sum(self.volatility[-i] for i in range(10)) / 10
-        low_vol = self.volatility[0] < vol10 * 0.8
-
-        hurst = self.hurst[0]
-        mean_reverting = (hurst < 0.45)  # <0.45 强均值回归
-
-        return low_adx or narrow_ma or low_vol or mean_reverting
-
     def _is_overbought(self):
         """
-        超买判断
+        超买判断：RSI > 70 或 KDJ J > 80 或价格突破布林上轨
         """
-        rsi_overbought = self.rsi[0] > 70
-        kdj_overbought = self.kdj_j[0] > 80
-        price_at_top_bb = self.close[0] > self.bbands.lines.top[0]
-
-        return rsi_overbought or kdj_overbought or price_at_top_bb
+        return self._overbought[self._i]
 
     def _is_oversold(self):
         """
-        超卖判断
+        超卖判断：RSI < 30 或 KDJ J < 20 或价格跌破布林下轨
         """
-        rsi_oversold = self.rsi[0] < 30
-        kdj_oversold = self.kdj_j[0] < 20
-        price_at_bottom_bb = self.close[0] < self.bbands.lines.bot[0]
-
-        return rsi_oversold or kdj_oversold or price_at_bottom_bb
+        return self._oversold[self._i]
 
     def _is_volume_breakout(self):
         """
-        判断是否有放量突破
+        判断是否有放量突破：成交量是近期平均的2倍以上，同时价格上涨
         """
-        # 成交量是近期平均的2倍以上
-        high_volume = self.vol_ratio > 2.0
-
-        # 同时价格上涨
-        price_increase = self.close[0] > self.close[-1]
-
-        return high_volume and price_increase
+        return self._volume_breakout[self._i]
 
     def _is_volume_shrink(self):
         """
-        判断是否缩量
+        判断是否缩量：成交量低于平均值的50%
         """
-        # 成交量低于平均值的50%
-        low_volume = 0.0 < self.vol_ratio < 0.5
-        return low_volume
+        return self._volume_shrink[self._i]
 
     def _is_bullish_volume_divergence(self):
         """
         判断是否存在看涨的量价背离
         价格创新低但成交量放大
         """
-        # 价格创近期新低
-        recent_low_price = min([self.close[-i] for i in range(1, 6)])
-        price_new_low = self.close[0] < recent_low_price
-
-        # 但成交量放大
-        volume_increase = self.vol_ratio > 1.5
-
-        return price_new_low and volume_increase
+        return self._bullish_divergence[self._i]
 
     def _is_bearish_volume_divergence(self):
         """
         判断是否存在看跌的量价背离
         价格创新高但成交量萎缩
         """
-        # 价格创近期新高
-        recent_high_price = max([self.close[-i] for i in range(1, 6)])
-        price_new_high = self.close[0] > recent_high_price
-
-        # 但成交量萎缩
-        volume_shrink = 0.0 < self.vol_ratio < 0.7
-
-        return price_new_high and volume_shrink
+        return self._bearish_divergence[self._i]
 
     def _is_good_entry_point(self):
         """
@@ -1950,6 +2385,7 @@ class NewTrendTaStrategy(bt.Strategy):
         1: 建仓 x1
         2: 建仓 x2
         """
+        i = self._i
         score = 0
 
         # 条件1: 处于超卖状态 (+1分)
@@ -1957,11 +2393,11 @@ class NewTrendTaStrategy(bt.Strategy):
             score += 1
 
         # 条件2: 动量指标开始转正 (+1分)
-        if self.momentum[0] > self.momentum[-1] and self.momentum[0] > 0:
+        if self._momentum[i] > self._momentum[i - 1] and self._momentum[i] > 0:
             score += 1
 
         # 条件3: 价格在布林下轨附近 (+1分)
-        if self.close[0] <= self.bbands.lines.bot[0] * 1.02:
+        if self._close[i] <= self._bb_bot[i] * 1.02:
             score += 1
 
         # 条件4: 成交量放大（有资金流入迹象）(+1分)
@@ -1983,60 +2419,54 @@ class NewTrendTaStrategy(bt.Strategy):
         """
         根据账户总价值计算目标仓位大小
         """
+        i = self._i
         total_value = self.broker.getvalue()
         target_value = total_value * target_exposure_ratio
-        current_position_value = self.hold_shares * self.close[0]
+        current_position_value = self.hold_shares * self._close[i]
         value_to_add = target_value - current_position_value
 
         if value_to_add > 0:
             available_cash = self._cash_available()
-            actual_value_to_add = min(value_to_add, available_cash)
-            return actual_value_to_add / self.close[0]
+            actual_value_to_add = available_cash if available_cash < value_to_add else value_to_add
+            return actual_value_to_add / self._close[i]
         else:
             # 需要减仓
-            shares_to_sell = abs(value_to_add) / self.close[0]
+            shares_to_sell = abs(value_to_add) / self._close[i]
             return -shares_to_sell
 
     def _cash_available(self):
-        return self.broker.getcash() - self.p.min_cash_buffer
+        return self.broker.getcash() - self._min_cash_buffer
 
     def _get_trend(self):
-        if self._is_strong_up_trend():
-            return 'SU'
-        elif self._is_weak_up_trend():
-            return 'WU'
-        elif self._is_consolidation():
-            return 'CO'
-        elif self._is_strong_down_trend():
-            return 'SD'
-        elif self._is_weak_down_trend():
-            return 'WD'
-
-        return 'UT'
+        """
+        当前 bar 的趋势状态编码（TREND_SU / TREND_WU / TREND_CO / TREND_SD / TREND_WD / TREND_UT）
+        """
+        return self._trends[self._i]
 
     def _breakout_coming(self):
+        i = self._i
 
         # 1. 布林带张口
-        bb_width_now = self.bb_top[0] - self.bb_bot[0]
-        bb_width_prev = self.bb_top[-5] - self.bb_bot[-5] if len(self) > 5 else 0
+        bb_width_now = self._bb_top[i] - self._bb_bot[i]
+        bb_width_prev = self._bb_top[i - 5] - self._bb_bot[i - 5] if len(self) > 5 else 0
         bb_opening = bb_width_now > bb_width_prev * 1.15
 
         # 2. ATR 波动率上升
-        atr_rising = self.atr[0] > self.atr[-3] * 1.10 if len(self) > 3 else False
+        atr_rising = self._atr[i] > self._atr[i - 3] * 1.10 if len(self) > 3 else False
 
         # 3. ADX 趋势力量上升
-        adx_rising = self.adx[0] > self.adx[-3] + 2 if len(self) > 3 else False
+        adx_rising = self._adx[i] > self._adx[i - 3] + 2 if len(self) > 3 else False
 
         # 4. 价格突破短均线并形成多空序列
-        ma5 = self.ma_short[0]
-        ma10 = self.ma_mid[0]
+        ma5 = self._ma5[i]
+        ma10 = self._ma10[i]
         price_break_ma = (
-                (self.data.close[0] > ma5 > ma10) or
-                (self.data.close[0] < ma5 < ma10)
+                (self._close[i] > ma5 > ma10) or
+                (self._close[i] < ma5 < ma10)
         )
 
         # 5. 放量 (趋势启动常伴随)
-        vol_rising = self.data.volume[0] > self.vol_sma[0] * 1.3
+        vol_rising = self._volume[i] > self._vol_sma[i] * 1.3
 
         # 满足以上五个信号中的两个 → 趋势可能要来了
         signals = [bb_opening, atr_rising, adx_rising, price_break_ma, vol_rising]
@@ -2060,80 +2490,20 @@ class NewTrendTaStrategy(bt.Strategy):
         # SD = Strong Down（强下降）
         # ==========================
 
-        # 如果今天趋势无变化（常态保持）
-        if prev_trend == curr_trend:
-            if curr_trend == "WU":
-                return 0.5, "趋势保持弱升，小加仓"  # 弱升维持 → 小加仓
-            elif curr_trend == "WD":
-                return -1, "趋势保持弱跌，小减仓"  # 弱跌维持 → 小减仓
-            elif curr_trend == "SU":
-                return 0.5, "趋势保持强升，轻加仓"  # 强升维持 → 轻加仓
-            elif curr_trend == "SD":
-                return -2, "趋势保持强跌，大幅减仓"  # 强跌维持 → 大幅减仓
-
-        # ======================================================
-        # 以下为趋势发生变化的情况
-        # ======================================================
-
-        # ===== 上升方向 =====
-        if prev_trend == "CO" and curr_trend == "WU":
-            return 1, "震荡→弱升，试探性建仓"
-
-        if prev_trend == "WU" and curr_trend == "SU":
-            return 2, "弱升→强升，加速加仓"
-
-        if prev_trend == "CO" and curr_trend == "SU":
-            return 3, "震荡→强升，强力建仓（有效突破）"
-
-        if prev_trend == "SU" and curr_trend == "WU":
-            return -1, "弱升→震荡，减仓"
-
-        if prev_trend == "WU" and curr_trend == "CO":
-            return -1, "弱升→震荡，减仓"
-
-        # SU → CO：强升结束（可能见顶）
-        if prev_trend == "SU" and curr_trend == "CO":
-            return -1, "强升结束（可能见顶），减仓"
-
-        # ===== 下降方向 =====
-
-        if prev_trend == "CO" and curr_trend == "WD":
-            return -2, "震荡转弱跌，减仓"
-
-        if prev_trend == "WD" and curr_trend == "SD":
-            return -2, "弱跌转强跌，减仓"
-
-        if prev_trend == "CO" and curr_trend == "SD":
-            return -3, "震荡转强跌，减仓"
-
-        if prev_trend == "SD" and curr_trend == "WD":
-            return 0, "强跌转弱跌，不加仓（避免抄底）"
-
-        if prev_trend == "WD" and curr_trend == "CO":
-            return 0, "弱跌企稳，不加仓（横盘可能继续跌）"
-
-        if prev_trend == "SD" and curr_trend == "CO":
-            return 0, "强跌企稳，不加仓（等待趋势反转确认）"
-
-        # ===== 特殊：上下反复的震荡系反转 =====
-        if (prev_trend == "WU" and curr_trend == "WD") or \
-                (prev_trend == "WD" and curr_trend == "WU"):
-            return 0, "上下反复，继续观望"
-
-        # 默认无操作
-        return 0, f"{prev_trend}→{curr_trend}，无操作"
+        return _TREND_TRANSITIONS[prev_trend * len(TREND_LABELS) + curr_trend]
 
     def _consolidation_trade(self, trend):
         """震荡高抛低吸逻辑（整合 Hurst）"""
+        i = self._i
 
-        if trend != 'CO':
+        if trend != TREND_CO:
             return 0, "无操作"
 
         # 避免重复交易
         if self.last_action != 0:
             return 0, "昨日已操作，今日观望"
 
-        hurst = self.hurst[0]
+        hurst = self._hurst[i]
 
         # Hurst 调节灵敏度
         if hurst < 0.35:
@@ -2149,18 +2519,18 @@ class NewTrendTaStrategy(bt.Strategy):
             top_factor = 1.05
             bot_factor = 1.05
 
-        price = self.close[0]
-        upper = self.bb_top[0]
-        lower = self.bb_bot[0]
+        price = self._close[i]
+        upper = self._bb_top[i]
+        lower = self._bb_bot[i]
 
         break_out_coming = self._breakout_coming()
         if not break_out_coming:
             oversold = self._is_oversold()
             overbought = self._is_overbought()
-            bb_slope = self.bb_top[0] - self.bb_top[-3] if len(self) > 3 else 0
-            flat_band = abs(bb_slope) < 0.2 * self.atr[0]
-            not_volume_dump = self.data.volume[0] <= self.vol_sma[0] * 1.2
-            not_volume_breakout = self.data.volume[0] <= self.vol_sma[0] * 1.3
+            bb_slope = self._bb_top[i] - self._bb_top[i - 3] if len(self) > 3 else 0
+            flat_band = abs(bb_slope) < 0.2 * self._atr[i]
+            not_volume_dump = self._volume[i] <= self._vol_sma[i] * 1.2
+            not_volume_breakout = self._volume[i] <= self._vol_sma[i] * 1.3
             low_buy = (price <= lower * bot_factor or oversold) and flat_band and not_volume_dump
             high_sell = (price >= upper * top_factor or overbought) and flat_band and not_volume_breakout
             if low_buy:
@@ -2187,25 +2557,26 @@ class NewTrendTaStrategy(bt.Strategy):
         ca, ca_signal = self._consolidation_trade(curr)
 
         self.trend_prev = curr
+        change = f"{TREND_LABELS[prev]} → {TREND_LABELS[curr]}"
 
         # 如果长期下跌信号存在，优先执行更保守的操作
         if dc_signal is not None:
             if tc < dc:
                 self.last_action = tc
-                return tc, f"{prev} → {curr}，{tc_signal}"
+                return tc, f"{change}，{tc_signal}"
             self.last_action = dc
-            return dc, f"{prev} → {curr}，{dc_signal}"
+            return dc, f"{change}，{dc_signal}"
 
         else:
             if tc != 0:
                 self.last_action = tc
-                return tc, f"{prev} → {curr}，{tc_signal}"
+                return tc, f"{change}，{tc_signal}"
             if ca != 0:
                 self.last_action = ca
-                return ca, f"{prev} → {curr}，{ca_signal}"
+                return ca, f"{change}，{ca_signal}"
 
         self.last_action = 0
-        return 0, f"{prev} → {curr}，无操作"
+        return 0, f"{change}，无操作"
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -2216,61 +2587,61 @@ class NewTrendTaStrategy(bt.Strategy):
             ex_size = order.executed.size
             ex_price = order.executed.price
 
-            avg_cost = (self.hold_cost / self.hold_shares) if self.hold_shares > 0 else 0.0
-
-            self.hold_shares += ex_size
-            self.hold_cost += ex_size * ex_price
-
-            realized = 0.0
-            if ex_size < 0:
-                realized = -ex_size * (ex_price - avg_cost)
-                self.realized_pnl += realized
-
-            if self.hold_shares < 1e-12:
-                self.hold_shares = 0.0
-                self.hold_cost = 0.0
-
-            # 更新历史最高持仓
-            if self.hold_shares > self.max_hold_shares:
-                self.max_hold_shares = self.hold_shares
-
-            self.log(f"{dt} {'BUY' if ex_size > 0 else 'SELL'} 成交: qty={ex_size:.4f} @ {ex_price:.4f} "
-                     f"| realized={realized:.2f}, hold_shares={self.hold_shares:.4f}, hold_cost={self.hold_cost:.2f}")
+            # 只记录成交，持仓与盈亏在 stop() 中一次性回放；日志中的持仓汇总届时补全
+            logged = len(self.log_lines)
+            self.log("{} {} 成交: qty={:.4f} @ {:.4f} ", dt, 'BUY' if ex_size > 0 else 'SELL', ex_size, ex_price)
+            self.fills.append((ex_size, ex_price, logged if len(self.log_lines) > logged else -1))
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log(f"Order {order.Status[order.status]}")
+            self.log("Order {}", order.Status[order.status])
 
         self.order = None
 
     def next(self):
-        nav = float(self.close[0])
+        # 与原 EMA120 指标的最小周期一致，第 120 根 bar 起才开始操作
+        if len(self) < 120:
+            return
+
+        self._i = i = len(self) - 1
+
+        # 建议模式只输出最后一根 bar 的信号且不下单，之前的 bar 只需推进趋势状态（上期趋势、上次操作）
+        if self._suggest_mode and len(self) < self.data.buflen():
+            if self.trend_prev != TREND_NONE:
+                self.trend_old = self.trend_prev
+            self.get_action()
+            return
+
+        nav = float(self._close[i])
         date = self.datas[0].datetime.date(0)
+        # 订单在下一根 bar 才成交，本 bar 内可用现金不变，只查询一次
+        cash_avail = self._cash_available()
         self.signal = '无'
         entry_score = self._is_good_entry_point()
-        pos = self.getposition()
-        cash_avail = self._cash_available()
+        # 订单在下一根 bar 才成交，本 bar 内持仓不变，只查询一次
+        pos_size = self.getposition().size
 
         # 初始建仓
-        entry_amt = self.p.initial_amount * entry_score
-        if self.start_nav is None and self.p.function == 'trend':
+        entry_amt = self._initial_amount * entry_score
+        if self.start_nav is None and self._trend_mode:
             # 如果满足建仓条件或者策略运行了一段时间仍未能建仓
             if entry_score > 0 or len(self) > 5:
-                amt = max(min(entry_amt, cash_avail), self.p.initial_amount)
+                amt = cash_avail if cash_avail < entry_amt else entry_amt
+                amt = self._initial_amount if self._initial_amount > amt else amt
                 if amt > 0:
                     size = amt / nav
                     self.order = self.buy(size=size)
                 self.start_nav = nav
                 self.start_value = self.broker.getvalue()
-                self.log(f"{date} 开始建仓：NAV={nav:.4f}, 金额 {entry_amt:.2f} 现金 {cash_avail:.2f} 投资 {amt:.2f}")
+                self.log("{} 开始建仓：NAV={:.4f}, 金额 {:.2f} 现金 {:.2f} 投资 {:.2f}", date, nav, entry_amt, cash_avail, amt)
                 return
             else:
-                self.log(f"{date} 等待合适建仓时机：NAV={nav:.4f}")
+                self.log("{} 等待合适建仓时机：NAV={:.4f}", date, nav)
                 return
-        elif self.p.function == 'suggestion' and entry_score > 0:
-            self.signal = f'建议建仓：{entry_amt:.2f}'
+        elif self._suggest_mode and entry_score > 0:
+            self.signal = ('建议建仓：{:.2f}', entry_amt)
 
         # 判断趋势变化
-        if self.trend_prev:
+        if self.trend_prev != TREND_NONE:
             self.trend_old = self.trend_prev
         trend_ratio, signal = self.get_action()
 
@@ -2278,49 +2649,69 @@ class NewTrendTaStrategy(bt.Strategy):
 
         # 1. 趋势变化加仓
         if trend_ratio > 0:
-            add_amt = self.p.daily_amount * trend_ratio
-            amt = min(add_amt, cash_avail)
-            if amt > 0 and self.p.function == 'trend':
+            add_amt = self._daily_amount * trend_ratio
+            amt = cash_avail if cash_avail < add_amt else add_amt
+            if amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
-                self.log(f"{date} {signal} {amt:.2f} -> {size:.4f}份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"{signal} {add_amt:.2f}"
+                self.log("{} {} {:.2f} -> {:.4f}份 @ {:.4f}", date, signal, amt, size, nav)
+            elif self._suggest_mode:
+                self.signal = ("{} {:.2f}", signal, add_amt)
 
         elif trend_ratio < 0:
-            min_allowed = (self.max_cash * self.p.bottom_ratio) / nav
-            can_reduce = max(0.0, pos.size - min_allowed)
-            reduce_step = self.p.reduce_step * abs(trend_ratio)
-            size_to_sell = min(pos.size * reduce_step, can_reduce)
-            if pos.size > 0 and self.p.function == 'trend' and can_reduce > 0:
-                if size_to_sell > 0:
-                    self.sell(size=size_to_sell)
-                    self.log(
-                        f"{date} {signal} {reduce_step:.2%} 仓位，即{size_to_sell:.4f}份 @ {nav:.4f} (保留底仓 {min_allowed:.4f})")
-            elif self.p.function == 'suggestion':
-                self.signal = f"{signal} {reduce_step:.2%} 仓位"
+            reduce_step = self._reduce_step * abs(trend_ratio)
+            # 空仓时没有可减的份额，跳过底仓与减仓数量的计算
+            if pos_size > 0 and self._trend_mode:
+                min_allowed = (self.max_cash * self._bottom_ratio) / nav
+                reducible = pos_size - min_allowed
+                if reducible > 0.0:
+                    want_sell = pos_size * reduce_step
+                    size_to_sell = reducible if reducible < want_sell else want_sell
+                    if size_to_sell > 0:
+                        self.sell(size=size_to_sell)
+                        self.log(
+                            "{} {} {:.2%} 仓位，即{:.4f}份 @ {:.4f} (保留底仓 {:.4f})",
+                            date, signal, reduce_step, size_to_sell, nav, min_allowed)
+            elif self._suggest_mode:
+                self.signal = ("{} {:.2%} 仓位", signal, reduce_step)
 
         # 5. 震荡市 - 建仓机会
-        elif self.trend_now == 'CO' and entry_score > 0:
+        elif self.trend_now == TREND_CO and entry_score > 0:
             # 建仓条件：在震荡市中出现好的买入点
-            amt = min(entry_amt, self._cash_available())
-            if self.start_nav is None and amt > 0 and self.p.function == 'trend':
+            amt = cash_avail if cash_avail < entry_amt else entry_amt
+            if self.start_nav is None and amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
                 self.start_nav = nav
                 self.start_value = self.broker.getvalue()
-                self.log(f"{date} 震荡市中发现建仓机会，投资 {amt:.2f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"震荡市，发现建仓机会，建议投资 {entry_amt:.2f}"
+                self.log("{} 震荡市中发现建仓机会，投资 {:.2f}", date, amt)
+            elif self._suggest_mode:
+                self.signal = ("震荡市，发现建仓机会，建议投资 {:.2f}", entry_amt)
 
         else:
-            if self.p.function == 'trend' and len(signal) > 12:
-                self.log(f"{date} {signal}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"{signal}"
+            if self._trend_mode and len(signal) > 12:
+                self.log("{} {}", date, signal)
+            elif self._suggest_mode:
+                self.signal = signal
+
+    def _settle_fills(self):
+        """
+        回放全部成交，得到持仓份额、成本与已实现盈亏，并补全成交日志
+        """
+        fills = np.array(self.fills, dtype=np.float64).reshape(-1, 3)
+        (self.hold_shares, self.hold_cost, self.realized_pnl, self.max_hold_shares,
+         realized, shares, costs) = _replay_fills(fills[:, 0], fills[:, 1])
+
+        for line, fill_realized, fill_shares, fill_cost in zip(fills[:, 2].astype(int), realized, shares, costs):
+            if line >= 0:
+                self.log_lines[line] += (f"| realized={fill_realized:.2f}, hold_shares={fill_shares:.4f}, "
+                                         f"hold_cost={fill_cost:.2f}")
 
     def stop(self):
-        nav = float(self.close[0])
+        self._settle_fills()
+
+        self._i = i = len(self) - 1
+        nav = float(self._close[i])
         hold_value = self.hold_shares * nav
         unrealized = hold_value - self.hold_cost
         total_realized = self.realized_pnl
@@ -2332,67 +2723,72 @@ class NewTrendTaStrategy(bt.Strategy):
 
         if self.p.function != 'suggestion':
             self.log("\n=== 回测结果 ===")
-            self.log(f"最终日期: {self.datas[0].datetime.date(0)}")
-            self.log(f"持仓份额: {self.hold_shares:.4f}")
-            self.log(f"持仓成本(total): {self.hold_cost:.2f}")
-            self.log(f"持仓市值: {hold_value:.2f}")
-            self.log(f"未实现 PnL: {unrealized:.2f}")
-            self.log(f"已实现 PnL: {total_realized:.2f}")
+            self.log("最终日期: {}", self.datas[0].datetime.date(0))
+            self.log("持仓份额: {:.4f}", self.hold_shares)
+            self.log("持仓成本(total): {:.2f}", self.hold_cost)
+            self.log("持仓市值: {:.2f}", hold_value)
+            self.log("未实现 PnL: {:.2f}", unrealized)
+            self.log("已实现 PnL: {:.2f}", total_realized)
             if hold_roi is not None:
-                self.log(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
+                self.log("仅仓位收益率 (hold ROI): {:.2%}", hold_roi)
             else:
                 self.log("仅仓位收益率 (hold ROI): N/A (无持仓成本)")
-            self.log(f"总资金 (broker): {self.broker.getvalue():.2f}")
+            self.log("总资金 (broker): {:.2f}", self.broker.getvalue())
             self.log("================\n")
 
+        _flush_log(self.log_lines)
+
         if not self.p.full_log and 'trend' in self.p.function:
             print(f"持仓市值: {hold_value:.2f}")
             if hold_roi is not None:
                 print(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
             print(f"总资金 (broker): {self.broker.getvalue():.2f}")
 
-        vol = self.data.volume[0]
-        sma = self.vol_sma[0]
-        self.vol_ratio = vol / sma if sma > 0 else 0.0
-        ma = f'MA5={self.ma_short[0]:.4f}, MA10={self.ma_mid[0]:.4f}, MA20={self.ma_long[0]:.4f}'
-        price = f'CLOSE={self.close[0]:.4f}'
-        adx = f'ADX={self.adx[0]:.4f}'
-        momentum = f'MOM={self.momentum[0]:.4f}'
-        rsi = f'RSI={self.rsi[0]:.4f}'
-        kdj = f'KDJ={self.kdj_j[0]:.4f}'
-        bb = f'BOLL: {self.bbands.lines.mid[0]:.4f}/{self.bbands.lines.top[0]:.4f}/{self.bbands.lines.bot[0]:.4f}'
-        hurst = f'HURST={self.hurst[0]:.4f}'
-        trend_indicators = f'{ma}，{price}，{adx}，{momentum}，{hurst}\n趋势：'
-        trend = self.trend_old + ' -> ' + self.trend_now
-
-        trend = f'{trend_indicators}无' if trend == '' else f'{trend_indicators} {trend}'
-
-        if self._is_oversold():
-            over = f'{rsi}，{kdj}，{bb}，状态: 超卖'
-        elif self._is_overbought():
-            over = f'{rsi}，{kdj}，{bb}，状态: 超买'
-        else:
-            over = f'{rsi}，{kdj}，{bb}，状态: 正常'
-
-
-        vol = f'VOL={self.data.volume[0]}，VMA={self.vol_sma[0]}'
-        if self._is_volume_breakout():
-            volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 放量'
-        elif self._is_volume_shrink():
-            volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 缩量'
-        elif self._is_bullish_volume_divergence():
-            volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 看涨量价背离'
-        elif self._is_bearish_volume_divergence():
-            volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 看跌量价背离'
-        else:
-            volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 正常'
-
-        self.indicators = f'{trend}\n{over}\n{volume}'
+        self.vol_ratio = self._vol_ratio[i]
 
     def get_signal(self):
-        return self.signal
+        return _format_signal(self.signal)
 
     def get_indicators(self):
+        """
+        当前指标汇总；只在调用时才格式化（首次调用后缓存），stop() 中不再拼接字符串
+        """
+        if self.indicators is None:
+            i = self._i
+            ma = f'MA5={self._ma5[i]:.4f}, MA10={self._ma10[i]:.4f}, MA20={self._ma20[i]:.4f}'
+            price = f'CLOSE={self._close[i]:.4f}'
+            adx = f'ADX={self._adx[i]:.4f}'
+            momentum = f'MOM={self._momentum[i]:.4f}'
+            rsi = f'RSI={self._rsi[i]:.4f}'
+            kdj = f'KDJ={self._kdj_j[i]:.4f}'
+            bb = f'BOLL: {self._bb_mid[i]:.4f}/{self._bb_top[i]:.4f}/{self._bb_bot[i]:.4f}'
+            hurst = f'HURST={self._hurst[i]:.4f}'
+            trend_indicators = f'{ma}，{price}，{adx}，{momentum}，{hurst}\n趋势：'
+            trend = TREND_LABELS[self.trend_old] + ' -> ' + TREND_LABELS[self.trend_now]
+
+            trend = f'{trend_indicators}无' if trend == '' else f'{trend_indicators} {trend}'
+
+            if self._is_oversold():
+                over = f'{rsi}，{kdj}，{bb}，状态: 超卖'
+            elif self._is_overbought():
+                over = f'{rsi}，{kdj}，{bb}，状态: 超买'
+            else:
+                over = f'{rsi}，{kdj}，{bb}，状态: 正常'
+
+
+            vol = f'VOL={self._volume[i]}，VMA={self._vol_sma[i]}'
+            if self._is_volume_breakout():
+                volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 放量'
+            elif self._is_volume_shrink():
+                volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 缩量'
+            elif self._is_bullish_volume_divergence():
+                volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 看涨量价背离'
+            elif self._is_bearish_volume_divergence():
+                volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 看跌量价背离'
+            else:
+                volume = f'{vol} 成交量比例：{self.vol_ratio:.2%}，状态: 正常'
+
+            self.indicators = f'{trend}\n{over}\n{volume}'
         return self.indicators
 
 class MA20Strategy(bt.Strategy):
@@ -2406,19 +2802,39 @@ class MA20Strategy(bt.Strategy):
         full_log=False,
     )
 
+    # 预计算的指标不会出现在图中，绘图时由 ceboro_trend 添加对应的 bt 指标用于展示
+    plot_indicators = (
+        (bt.ind.SMA, dict(period=5)),
+        (bt.ind.SMA, dict(period=20)),
+        (bt.ind.SMA, dict(period=60)),
+        (bt.ind.BollingerBands, dict(period=20)),
+    )
+
     def __init__(self):
-        # 指标
+        # 日志先缓存在内存中，stop() 时一次性输出
+        self.log_lines = []
+        # 运行模式在整个回测中不变，预先判断一次，逐 bar 逻辑中直接使用布尔值
+        self._trend_mode = self.p.function == 'trend'
+        self._suggest_mode = self.p.function == 'suggestion'
+        self._log_enabled = self._trend_mode and self.p.full_log
+
+        # 指标只依赖预加载的收盘价，在此一次性向量化计算（与对应 bt 指标口径一致），next() 中按 bar 下标取值
         self.close = self.datas[0].close
-        self.ma_short = bt.ind.SMA(self.datas[0], period=self.p.ma_short)
-        self.ma_mid = bt.ind.SMA(self.datas[0], period=self.p.ma_mid)
-        self.ma_long = bt.ind.SMA(self.datas[0], period=self.p.ma_long)
-        self.bbands = bt.ind.BollingerBands(self.datas[0], period=self.p.boll_period)
+        close = np.asarray(self.close.array, dtype=np.float64)
+        self.closes = close.tolist()
+        self.ma_short = _rolling_mean(close, self.p.ma_short).tolist()
+        self.ma_mid = _rolling_mean(close, self.p.ma_mid).tolist()
+        self.ma_long = _rolling_mean(close, self.p.ma_long).tolist()
+        self.bb_mid, self.bb_top, self.bb_bot = (band.tolist() for band in _bollinger(close, self.p.boll_period))
+        # 与原 bt 指标中最长周期一致的预热长度
+        self.warmup = max(self.p.ma_short, self.p.ma_mid, self.p.ma_long, self.p.boll_period)
         self.signal = None
 
         # 持仓成本与份额（用 notify_order 更新）
         self.hold_shares = 0.0
         self.hold_cost = 0.0     # 当前持仓对应的总成本（只包含尚未卖出的那部分）
         self.realized_pnl = 0.0
+        self.fills = []  # 成交记录 (份额, 价格, 成交日志行号)
 
         # 记录历史最大持仓，用于 bottom_ratio 计算
         self.max_hold_shares = 0.0
@@ -2430,9 +2846,12 @@ class MA20Strategy(bt.Strategy):
         self.start_nav = None
         self.start_value = None
 
-    def log(self, txt):
-        if self.p.function == 'trend' and self.p.full_log and len(self) > 100:
-            print(txt)
+    def log(self, txt, *args):
+        """
+        记录一行日志；txt 带参数时为 str.format 模板，只有需要输出时才格式化
+        """
+        if self._log_enabled and len(self) > 100:
+            self.log_lines.append(txt.format(*args) if args else txt)
 
     def _cash_available(self):
         return self.broker.getcash()
@@ -2447,47 +2866,35 @@ class MA20Strategy(bt.Strategy):
             ex_size = order.executed.size
             ex_price = order.executed.price
 
-            avg_cost = (self.hold_cost / self.hold_shares) if self.hold_shares > 0 else 0.0
-
-            self.hold_shares += ex_size
-            self.hold_cost += ex_size * ex_price
-
-            realized = 0.0
-            if ex_size < 0:
-                realized = -ex_size * (ex_price - avg_cost)
-                self.realized_pnl += realized
-
-            if self.hold_shares < 1e-12:
-                self.hold_shares = 0.0
-                self.hold_cost = 0.0
-
-            # 更新历史最高持仓
-            if self.hold_shares > self.max_hold_shares:
-                self.max_hold_shares = self.hold_shares
-
-            self.log(f"{dt} {'BUY' if ex_size > 0 else 'SELL'} 成交: qty={ex_size:.4f} @ {ex_price:.4f} "
-                     f"| realized={realized:.2f}, hold_shares={self.hold_shares:.4f}, hold_cost={self.hold_cost:.2f}")
+            # 只记录成交，持仓与盈亏在 stop() 中一次性回放；日志中的持仓汇总届时补全
+            logged = len(self.log_lines)
+            self.log("{} {} 成交: qty={:.4f} @ {:.4f} ", dt, 'BUY' if ex_size > 0 else 'SELL', ex_size, ex_price)
+            self.fills.append((ex_size, ex_price, logged if len(self.log_lines) > logged else -1))
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log(f"Order {order.Status[order.status]}")
+            self.log("Order {}", order.Status[order.status])
 
         self.order = None
 
     # --------- 策略主逻辑 ----------
     def next(self):
-        nav = float(self.close[0])
+        if len(self) < self.warmup:
+            return
+
+        i = len(self) - 1
+        nav = self.closes[i]
         date = self.datas[0].datetime.date(0)
 
         # 指标值
-        ma5 = float(self.ma_short[0])
-        ma20 = float(self.ma_mid[0])
-        ma60 = float(self.ma_long[0])
-        bb_mid = float(self.bbands.lines.mid[0])
-        bb_top = float(self.bbands.lines.top[0])
-        bb_bot = float(self.bbands.lines.bot[0])
+        ma5 = self.ma_short[i]
+        ma20 = self.ma_mid[i]
+        ma60 = self.ma_long[i]
+        bb_mid = self.bb_mid[i]
+        bb_top = self.bb_top[i]
+        bb_bot = self.bb_bot[i]
 
         # 计算日内涨幅参考（相对于前一日 close）
-        prev_close = float(self.close[-1]) if len(self.data) > 1 else nav
+        prev_close = self.closes[i - 1] if i > 0 else nav
         day_pct = (nav / prev_close - 1.0) if prev_close != 0 else 0.0
 
         pos = self.getposition()
@@ -2497,23 +2904,38 @@ class MA20Strategy(bt.Strategy):
         if nav > ma20:
             # 每日定投基准
             amt = cash_avail
-            if amt > 0 and self.p.function == 'trend':
+            if amt > 0 and self._trend_mode:
                 size = amt / nav
                 self.buy(size=size)
-                self.log(f"{date} 全仓买入 {amt:.2f} -> {size:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"全仓买入"
+                self.log("{} 全仓买入 {:.2f} -> {:.4f} 份 @ {:.4f}", date, amt, size, nav)
+            elif self._suggest_mode:
+                self.signal = "全仓买入"
 
         # 额外低吸：当回踩 MA20 (或回到布林中轨附近) 且有现金
         if nav < ma20:
             size_to_sell = pos.size
-            if size_to_sell > 0 and self.p.function == 'trend':
+            if size_to_sell > 0 and self._trend_mode:
                 self.sell(size=size_to_sell)
-                self.log(f"{date} 全仓卖出 {size_to_sell:.4f} 份 @ {nav:.4f}")
-            elif self.p.function == 'suggestion':
-                self.signal = f"全仓卖出"
+                self.log("{} 全仓卖出 {:.4f} 份 @ {:.4f}", date, size_to_sell, nav)
+            elif self._suggest_mode:
+                self.signal = "全仓卖出"
+
+    def _settle_fills(self):
+        """
+        回放全部成交，得到持仓份额、成本与已实现盈亏，并补全成交日志
+        """
+        fills = np.array(self.fills, dtype=np.float64).reshape(-1, 3)
+        (self.hold_shares, self.hold_cost, self.realized_pnl, self.max_hold_shares,
+         realized, shares, costs) = _replay_fills(fills[:, 0], fills[:, 1])
+
+        for line, fill_realized, fill_shares, fill_cost in zip(fills[:, 2].astype(int), realized, shares, costs):
+            if line >= 0:
+                self.log_lines[line] += (f"| realized={fill_realized:.2f}, hold_shares={fill_shares:.4f}, "
+                                         f"hold_cost={fill_cost:.2f}")
 
     def stop(self):
+        self._settle_fills()
+
         # 计算 final metrics
         nav = float(self.close[0])
         hold_value = self.hold_shares * nav
@@ -2526,35 +2948,76 @@ class MA20Strategy(bt.Strategy):
 
         if self.p.function != 'suggestion':
             self.log("\n=== 回测结果 ===")
-            self.log(f"最终日期: {self.datas[0].datetime.date(0)}")
-            self.log(f"持仓份额: {self.hold_shares:.4f}")
-            self.log(f"持仓成本(total): {self.hold_cost:.2f}")
-            self.log(f"持仓市值: {hold_value:.2f}")
-            self.log(f"未实现 PnL: {unrealized:.2f}")
-            self.log(f"已实现 PnL: {total_realized:.2f}")
+            self.log("最终日期: {}", self.datas[0].datetime.date(0))
+            self.log("持仓份额: {:.4f}", self.hold_shares)
+            self.log("持仓成本(total): {:.2f}", self.hold_cost)
+            self.log("持仓市值: {:.2f}", hold_value)
+            self.log("未实现 PnL: {:.2f}", unrealized)
+            self.log("已实现 PnL: {:.2f}", total_realized)
             if hold_roi is not None:
-                self.log(f"仅仓位收益率 (hold ROI): {hold_roi:.2%}")
+                self.log("仅仓位收益率 (hold ROI): {:.2%}", hold_roi)
             else:
                 self.log("仅仓位收益率 (hold ROI): N/A (无持仓成本)")
-            self.log(f"总资金 (broker): {self.broker.getvalue():.2f}")
+            self.log("总资金 (broker): {:.2f}", self.broker.getvalue())
             self.log("================\n")
 
+        _flush_log(self.log_lines)
+
     def get_signal(self):
-        return self.signal
+        return _format_signal(self.signal)
+
+class ArrayPandasData(bt.feeds.PandasData):
+    """
+    与 bt.feeds.PandasData 列映射和取值一致的数据源
+    start() 时把各列一次性转成 Python 列表、日期转成 bt 的日期数值，_load() 逐 bar 按下标取值，
+    省去 PandasData 每个字段一次 DataFrame.iloc 标量访问
+    """
+
+    def start(self):
+        super().start()
+
+        df = self.p.dataname
+        self._columns = [
+            (getattr(self.lines, field), df.iloc[:, self._colmapping[field]].tolist())
+            for field in self.getlinealiases()
+            if field != 'datetime' and self._colmapping[field] is not None
+        ]
+
+        coldtime = self._colmapping['datetime']
+        tstamps = df.index if coldtime is None else df.iloc[:, coldtime]
+        self._dtnums = [bt.date2num(tstamp.to_pydatetime()) for tstamp in tstamps]
+
+    def _load(self):
+        self._idx += 1
+        idx = self._idx
+
+        if idx >= len(self._dtnums):
+            return False
+
+        for line, values in self._columns:
+            line[0] = values[idx]
+        self.lines.datetime[0] = self._dtnums[idx]
+        return True
+
+# 操作建议关键字 -> 表情，按字典顺序优先匹配
+_SIGNAL_EMOJIS = {'加仓': '📈', '买入': '🛒', '低吸': '🤿', '减仓': '📉', '卖出': '🏷️', '无': '😐'}
+# 每个关键字一个前瞻分支，从开头按字典顺序尝试，一次 match 即得到优先级最高的命中关键字
+_SIGNAL_EMOJI_RE = re.compile('|'.join(f'(?=.*?({re.escape(key)}))' for key in _SIGNAL_EMOJIS), re.S)
 
 def ceboro_suggestion(df, strategy, forecast_nav, forecast_change, indicators=False):
     # 构建 backtrader 数据源
-    data = bt.feeds.PandasData(dataname=df)
+    data = ArrayPandasData(dataname=df)
 
-    cerebro = bt.Cerebro()
+    # 建议模式不下单也不绘图，关闭默认的 Broker/BuySell/Trades 观察器
+    cerebro = bt.Cerebro(stdstats=False)
     cerebro.adddata(data)
     strat = cerebro.addstrategy(strategy, function='suggestion', full_log=False)
     try:
         result = cerebro.run()
         signal = result[0].get_signal()
 
-        emojis = {'加仓': '📈', '买入': '🛒', '低吸': '🤿', '减仓': '📉', '卖出': '🏷️', '无': '😐'}
-        emoji = next((e for s, e in emojis.items() if s in signal), '😐')
+        match = _SIGNAL_EMOJI_RE.match(signal)
+        emoji = _SIGNAL_EMOJIS[match.group(match.lastindex)] if match else '😐'
 
         print(f"📊 预测净值: {forecast_nav:.4f} ({forecast_change:+.2%})")
         print(f"{emoji} 今日操作建议: {signal or '无'}")
@@ -2569,12 +3032,16 @@ def ceboro_suggestion(df, strategy, forecast_nav, forecast_change, indicators=Fa
         return '错误'
 
 def ceboro_trend(df, strategy, use_plot, cash, full_log= False):
-    data = bt.feeds.PandasData(dataname=df)
+    data = ArrayPandasData(dataname=df)
 
     try:
-        cerebro = bt.Cerebro()
+        # 默认观察器（资金、成交、买卖点）只用于绘图，不绘图时不加载，省去逐 bar 的记录
+        cerebro = bt.Cerebro(stdstats=use_plot)
         cerebro.adddata(data)
         cerebro.addstrategy(strategy, function="trend", full_log=full_log)
+        if use_plot:
+            for indicator, kwargs in getattr(strategy, 'plot_indicators', ()):
+                cerebro.addindicator(indicator, **kwargs)
         cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe', timeframe=bt.TimeFrame.Days,
                             annualize=True,
                             riskfreerate=0.02)
@@ -2604,23 +3071,73 @@ def ceboro_trend(df, strategy, use_plot, cash, full_log= False):
         traceback.print_exc()
 
 
+_sweep_frames = {}
+
+def _init_sweep_worker(frames):
+    """
+    参数扫描子进程初始化：每个进程只接收一次全部历史数据，之后的任务按名称取用
+    """
+    global _sweep_frames
+    _sweep_frames = frames
+
+def _run_one(strategy, params, name, cash):
+    """
+    在子进程中用一组参数回测一份数据，返回 (数据名称, 参数, 最终资金, 收益率)
+    """
+    # 扫描只需要最终资金，不加载默认观察器
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(ArrayPandasData(dataname=_sweep_frames[name]))
+    cerebro.addstrategy(strategy, function="trend", **params)
+    cerebro.broker.setcash(cash)
+    # 策略 stop() 中的打印在扫描时没有意义，丢弃
+    with redirect_stdout(io.StringIO()):
+        cerebro.run()
+
+    final_value = cerebro.broker.getvalue()
+    return name, params, final_value, final_value / cash - 1
+
+def run_sweep(strategy, param_grid, frames, cash):
+    """
+    多进程参数网格扫描
+    strategy: 策略类
+    param_grid: {参数名: [候选值, ...]}，取笛卡尔积
+    frames: {数据名称: 历史数据 df}
+    返回按收益率降序排列的 DataFrame（数据名称、各参数、最终资金、收益率）
+    """
+    names = list(param_grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+    tasks = [(strategy, params, name, cash) for params in combos for name in frames]
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_sweep_worker,
+                             initargs=(frames,)) as executor:
+        results = list(executor.map(_run_one, *zip(*tasks)))
+
+    rows = [{'data': name, **params, 'final_value': final_value, 'roi': roi}
+            for name, params, final_value, roi in results]
+    return pd.DataFrame(rows).sort_values('roi', ascending=False, ignore_index=True)
+
+
 # === 判断当天操作的函数 ===
 def combine_today_info(df, forecast_change):
-    """输入df和预估涨跌幅（如0.005代表+0.5%），返回今日操作建议"""
-    df_bt = df
-    volume = 0
-    if df["volume"].isnull().all():
-        df_bt["volume"] = 0
-    else:
-        volume = df["volume"].iloc[-1]
-    df_bt["openinterest"] = 0
+    """
+    输入df和预估涨跌幅（如0.005代表+0.5%），在末尾追加一行今日预估数据，返回 (df_today, 预估净值)
+    只保留回测需要的 OHLCV 列，按列数组直接拼出新表，不再构造单行 DataFrame 后 concat 整张历史表
+    """
+    volumes = df["volume"].to_numpy()
+    if pd.isna(volumes).all():
+        # 无成交量数据时全部按 0 处理
+        volumes = np.zeros(len(volumes), dtype=np.int64)
+    volume = volumes[-1]
 
     last_nav = df['close'].iloc[-1]
     forecast_nav = last_nav * (1 + forecast_change)
-    forecast_date = df_bt.index[-1] + pd.Timedelta(days=1)
+    forecast_date = df.index[-1] + pd.Timedelta(days=1)
 
-    new_row = pd.DataFrame({'close': [forecast_nav], 'open': [forecast_nav], 'high': [forecast_nav], 'low': [forecast_nav], "volume": [volume]}, index=[forecast_date])
-    df_today = pd.concat([df, new_row])
+    df_today = pd.DataFrame({
+        column: np.append(df[column].to_numpy(), forecast_nav) for column in ('close', 'open', 'high', 'low')
+    }, index=df.index.append(pd.DatetimeIndex([forecast_date])))
+    df_today['volume'] = np.append(volumes, volume)
+    df_today['openinterest'] = 0
 
     return df_today, forecast_nav
 
@@ -2628,7 +3145,7 @@ def start_trading(code, strategy, cash):
     from utils_efinance import get_fund_history_ef
     df = get_fund_history_ef(code, 1000)
 
-    data = bt.feeds.PandasData(dataname=df)
+    data = ArrayPandasData(dataname=df)
 
     cerebro = bt.Cerebro()
     cerebro.adddata(data)
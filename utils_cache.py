@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import hashlib
+import functools
+from datetime import date
+from io import StringIO
+import pandas as pd
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'ef')
+
+def _dump(value):
+    """将返回值转换为可写入 JSON 的结构"""
+    if isinstance(value, pd.Series):
+        return {'type': 'series', 'data': value.to_json(orient='split', force_ascii=False, double_precision=15)}
+    if isinstance(value, pd.DataFrame):
+        return {'type': 'frame', 'data': value.to_json(orient='split', force_ascii=False, double_precision=15)}
+    return {'type': 'json', 'data': value}
+
+def _load(payload):
+    """从 JSON 结构还原返回值（不做类型推断，保留代码前导 0）"""
+    kind, data = payload['type'], payload['data']
+    if kind == 'series':
+        return pd.read_json(StringIO(data), orient='split', typ='series', dtype=False, convert_dates=False)
+    if kind == 'frame':
+        return pd.read_json(StringIO(data), orient='split', dtype=False, convert_dates=False)
+    return data
+
+def _today():
+    """当天日期，作为按日缓存的键"""
+    return date.today().isoformat()
+
+def file_cache(ttl_days=90, namespace='default', daily=False):
+    """
+    将函数结果缓存到磁盘（.cache/ef/<namespace>/<key>.json），跨运行复用
+    ttl_days: 缓存有效天数，过期后重新请求
+    namespace: 缓存子目录，区分不同接口
+    daily: 为 True 时缓存键包含当天日期，换日后必定重新请求（不复用前一天取到的行情/净值）
+    空结果与异常不缓存
+    """
+    ttl_seconds = ttl_days * 24 * 3600
+    cache_dir = os.path.join(CACHE_DIR, namespace)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key_args = [args, kwargs, _today()] if daily else [args, kwargs]
+            key = hashlib.md5(json.dumps(key_args, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+            path = os.path.join(cache_dir, f'{key}.json')
+
+            try:
+                if time.time() - os.path.getmtime(path) < ttl_seconds:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        return _load(json.load(f))
+            except (OSError, ValueError, KeyError):
+                pass
+
+            value = func(*args, **kwargs)
+            if value is None or (isinstance(value, (pd.Series, pd.DataFrame)) and value.empty):
+                return value
+
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(_dump(value), f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"⚠️ 写入缓存失败: {e}")
+
+            return value
+
+        return wrapper
+
+    return decorator
@@ -1,75 +1,101 @@
+import re
+import math
+import functools
 import requests
 import pandas as pd
 from time import sleep
-from bs4 import BeautifulSoup
 from tqdm import tqdm
 import efinance as ef
+from utils_cache import file_cache
+
+# 历史净值接口返回的 HTML 表格结构固定，用正则直接取出各行单元格，无需构建完整的 DOM 树
+_ROW_PATTERN = re.compile(r'<tr[^>]*>(.*?)</tr>', re.S)
+_CELL_PATTERN = re.compile(r'<td[^>]*>(.*?)</td>', re.S)
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+def _parse_history_page(text):
+    """
+    解析历史净值接口的一页响应，返回 [[日期, 单位净值, 累计净值, 日增长率], ...]
+    """
+    html = text.split('content:"')[1].split('",records')[0]
+    html = html.replace("\\", "")
+
+    rows = []
+    for row in _ROW_PATTERN.findall(html):
+        tds = [_TAG_PATTERN.sub('', td).strip() for td in _CELL_PATTERN.findall(row)]
+        if len(tds) < 4:
+            continue
+        date, unit, acc, rate = tds[0], tds[1], tds[2], tds[3].replace("%", "")
+        rows.append([date, float(unit), float(acc), float(rate) if rate else None])
+    return rows
 
 def get_fund_history(fund_code: str, pages=0):
     """
     从天天基金网抓取指定基金的历史净值数据
     fund_code: 基金代码，如 '005918'
-    sleep_sec: 每页请求间隔（防止反爬）
+    pages: 最多抓取的页数，0 表示全部
+    各页复用同一连接，每次请求之间间隔 0.1 秒（防止反爬）
     """
     all_data = []
-    page = 1
     base_url = "https://fund.eastmoney.com/f10/F10DataApi.aspx"
 
     print(f"开始抓取基金 {fund_code} 历史净值...")
 
-    # 第一次请求以获得总页数
     params = {
         "type": "lsjz",
         "code": fund_code,
-        "page": page,
+        "page": 1,
         "per": 40
     }
-    headers = {
-        "User-Agent": "Mozilla/5.0"
-    }
 
-    r = requests.get(base_url, params=params, headers=headers)
-    r.encoding = "utf-8"
+    with requests.Session() as session:
+        session.headers.update({"User-Agent": "Mozilla/5.0"})
 
-    # 提取页数
-    try:
-        total_pages = int(r.text.split("pages:")[1].split(",")[0])
-    except:
-        total_pages = 1
+        # 第一页同时用于获得总页数
+        r = session.get(base_url, params=params)
+        r.encoding = "utf-8"
 
-    if pages > 0:
-        total_pages = min(total_pages, pages)
+        # 提取页数
+        try:
+            total_pages = int(r.text.split("pages:")[1].split(",")[0])
+        except:
+            total_pages = 1
 
-    print(f"基金 {fund_code} 共 {total_pages} 页历史数据")
+        if pages > 0:
+            total_pages = min(total_pages, pages)
 
-    # 循环抓取
-    for page in tqdm(range(1, total_pages + 1)):
-        params["page"] = page
-        r = requests.get(base_url, params=params, headers=headers)
-        r.encoding = "utf-8"
+        print(f"基金 {fund_code} 共 {total_pages} 页历史数据")
 
-        # 提取 HTML 表格
-        html = r.text.split('content:"')[1].split('",records')[0]
-        html = html.replace("\\", "")
-        soup = BeautifulSoup(html, "html.parser")
+        # 循环抓取
+        for page in tqdm(range(1, total_pages + 1)):
+            if page > 1:
+                sleep(0.1)  # 防止请求过快
+                params["page"] = page
+                r = session.get(base_url, params=params)
+                r.encoding = "utf-8"
 
-        # 解析每一行
-        for tr in soup.find_all("tr")[1:]:
-            tds = tr.find_all("td")
-            if len(tds) < 4:
-                continue
-            date = tds[0].text.strip()
-            unit = tds[1].text.strip()
-            acc = tds[2].text.strip()
-            rate = tds[3].text.strip().replace("%", "")
-            all_data.append([date, float(unit), float(acc), float(rate) if rate else None])
-            sleep(0.1)  # 防止请求过快
+            all_data.extend(_parse_history_page(r.text))
 
     df = pd.DataFrame(all_data, columns=["date", "unit_net", "acc_net", "daily_change"])
     df["date"] = pd.to_datetime(df["date"])
     df = df.sort_values("date").reset_index(drop=True)
     return df
 
+@file_cache(ttl_days=0.25, namespace='ef_fund_history', daily=True)
+def _get_fund_quote_history(fund_code, items):
+    """
+    基金历史净值原始数据，缓存到磁盘 6 小时且只在当天有效：同一天内重复回测 / 获取建议时不再重复请求，
+    换日后重新请求，不会用前一天发布前的净值给出建议
+    """
+    return ef.fund.get_quote_history(fund_code, items)
+
+@file_cache(ttl_days=0.25, namespace='ef_stock_history', daily=True)
+def _get_stock_quote_history(stock_code, beg):
+    """
+    股票/ETF历史行情原始数据，缓存到磁盘 6 小时且只在当天有效（多只基金追踪同一 ETF 时共用）
+    """
+    return ef.stock.get_quote_history(stock_code, beg=beg)
+
 def get_fund_history_ef(fund_code: str, items=1000, etf_code=''):
     """
     从 efinance 抓取指定基金的历史净值数据，
@@ -90,7 +116,7 @@ def get_fund_history_ef(fund_code: str, items=1000, etf_code=''):
         含日期索引的基金数据，附加成交量列
     """
     # ===== 1️⃣ 获取基金净值 =====
-    fund_df = ef.fund.get_quote_history(fund_code, items)
+    fund_df = _get_fund_quote_history(fund_code, items)
     fund_df = fund_df.sort_values('日期').reset_index(drop=True)
     fund_df.rename(
         columns={'日期': 'date', '单位净值': 'close'},
@@ -99,14 +125,14 @@ def get_fund_history_ef(fund_code: str, items=1000, etf_code=''):
     fund_df['high'] = fund_df['close']
     fund_df['low'] = fund_df['close']
     fund_df['volume'] = 0
-    fund_df['date'] = pd.to_datetime(fund_df['date'])
-    fund_df.set_index("date", inplace=True)
+    # 指定日期格式走快速解析，直接作为索引，省去 set_index 的复制
+    fund_df.index = pd.to_datetime(fund_df.pop('date'), format='%Y-%m-%d')
 
     # ===== 2️⃣ 若提供ETF代码，则合并成交量 =====
     if etf_code:
-        etf_df = ef.stock.get_quote_history(etf_code, beg="20200101")
+        etf_df = _get_stock_quote_history(etf_code, "20200101")
         etf_df.rename(columns={'日期': 'date', '成交量': 'volume'}, inplace=True)
-        etf_df['date'] = pd.to_datetime(etf_df['date'])
+        etf_df['date'] = pd.to_datetime(etf_df['date'], format='%Y-%m-%d')
         etf_df = etf_df[['date', 'volume']].set_index('date')
         etf_df['volume'] = etf_df['volume'].fillna(0)
 
@@ -122,59 +148,110 @@ def get_stock_history_ef(stock_code: str, beg):
     从 efinance 抓取指定股票的历史行情数据
     stock_code: 股票代码，如 '000001'
     """
-    stock_df = ef.stock.get_quote_history(stock_code, beg=beg)
+    stock_df = _get_stock_quote_history(stock_code, beg)
     stock_df = stock_df.sort_values('日期').reset_index(drop=True)
     stock_df.rename(columns={'日期':'date', '收盘': 'close', '开盘': 'open', '最高': 'high', '最低': 'low', '成交量': 'volume'}, inplace=True)
-    stock_df['date'] = pd.to_datetime(stock_df['date'])
-    stock_df.set_index("date", inplace=True)
+    stock_df.index = pd.to_datetime(stock_df.pop('date'), format='%Y-%m-%d')
 
     return stock_df
 
+@functools.lru_cache(maxsize=1024)
+@file_cache(ttl_days=90, namespace='ef_fund_base')
+def get_fund_base_info(fund_code):
+    """
+    获取基金基本信息（基金简称等），结果缓存到磁盘，进程内再做一层内存缓存
+    fund_code: 基金代码，如 '005918'
+    """
+    return ef.fund.get_base_info(fund_code)
+
+@functools.lru_cache(maxsize=1024)
+@file_cache(ttl_days=30, namespace='ef_fund_position')
+def get_fund_invest_position(fund_code):
+    """
+    获取基金持仓信息，结果缓存到磁盘（持仓按季度披露，缓存时间较短），进程内再做一层内存缓存
+    fund_code: 基金代码，如 '005918'
+    """
+    return ef.fund.get_invest_position(fund_code)
+
+@functools.lru_cache(maxsize=1024)
+@file_cache(ttl_days=90, namespace='ef_stock_base')
+def get_stock_base_info(stock_code):
+    """
+    获取股票/ETF基本信息（股票名称等），结果缓存到磁盘，进程内再做一层内存缓存
+    多只基金追踪同一 ETF 时，同一进程内只请求/读取一次
+    stock_code: 股票/ETF代码，如 '159915'
+    """
+    return ef.stock.get_base_info(stock_code)
+
+def _fund_realtime_rate(fund_code):
+    """基金实时估算涨跌幅，返回 (涨跌幅, 基金名称)"""
+    fund_info = ef.fund.get_realtime_increase_rate(fund_code).iloc[-1]
+    return fund_info.get("估算涨跌幅", None), fund_info.get("基金名称", None)
+
+def _etf_snapshot_rate(etf_code):
+    """ETF 实时行情快照涨跌幅，返回 (涨跌幅, 名称)"""
+    etf_info = ef.stock.get_quote_snapshot(etf_code)
+    return etf_info.get("涨跌幅", None), etf_info.get("名称", None)
+
+def _etf_history_rate(etf_code):
+    """ETF 最近一个交易日的涨跌幅，返回 (涨跌幅, 股票名称)"""
+    etf_history = ef.stock.get_quote_history(etf_code, beg='20250101').iloc[-1]
+    return etf_history.get("涨跌幅", None), etf_history.get("股票名称", None)
+
 def get_realtime_rate(fund_code, etf_code):
     """
     获取基金实时涨跌幅
     fund_code: 基金代码，如 '005918'
     etf_code: 追踪的 ETF/指数代码，如 '159513'
+    依次尝试 基金实时估值 -> ETF 实时快照 -> ETF 最近交易日，取第一个有效（非空、非 NaN、非 0）的涨跌幅；
+    前一个来源有效时不再请求后面的来源
     """
-    import math
-    e1, e2, e3 = False, False, False
-    try:
-        fund_info = ef.fund.get_realtime_increase_rate(fund_code)
-        fund_rate = fund_info.iloc[-1].get("估算涨跌幅", None)
-        name = fund_info.iloc[-1].get("基金名称", None)
-        if math.isnan(fund_rate):
-            fund_rate = None
-        if fund_rate:
-            return fund_rate, name
-    except Exception as e:
-        e1 = True
+    sources = ((_fund_realtime_rate, fund_code), (_etf_snapshot_rate, etf_code), (_etf_history_rate, etf_code))
 
-    try:
-        etf_info = ef.stock.get_quote_snapshot(etf_code)
-        etf_rate = etf_info.get("涨跌幅", None)
-        name = etf_info.get("名称", None)
-        if math.isnan(etf_rate):
-            etf_rate = None
-        if etf_rate:
-            return etf_rate, name
-    except Exception as e:
-        e2 = True
+    errors = []
+    for source, code in sources:
+        try:
+            rate, name = source(code)
+        except Exception as e:
+            errors.append(e)
+            continue
+        if rate is None or (isinstance(rate, float) and math.isnan(rate)):
+            continue
+        if rate:
+            return rate, name
+
+    if len(errors) == len(sources):
+        print(f"⚠️ 获取 {fund_code} 基金涨跌幅失败: {errors[-1]}")
+
+    return None, None
+
+def get_realtime_rates(fund_codes):
+    """
+    批量获取多只基金实时估算涨跌幅（一次请求）
+    fund_codes: 基金代码列表，如 ['005918', '017437']
+    返回 {基金代码: (估算涨跌幅, 基金名称)}，仅包含有效估值的基金；
+    未包含的基金仍按 get_realtime_rate 逐只回退到 ETF 行情
+    """
+    rates = {}
+    if not fund_codes:
+        return rates
 
     try:
-        etf_history = ef.stock.get_quote_history(etf_code, beg='20250101')
-        etf_last_rate = etf_history.iloc[-1].get("涨跌幅", None)
-        name = etf_history.iloc[-1].get("股票名称", None)
-        if math.isnan(etf_last_rate):
-            etf_last_rate = None
-        if etf_last_rate:
-            return etf_last_rate, name
+        fund_info = ef.fund.get_realtime_increase_rate(list(fund_codes))
     except Exception as e:
-        e3 = True
+        print(f"⚠️ 批量获取基金涨跌幅失败: {e}")
+        return rates
 
-    if e1 and e2 and e3:
-        print(f"⚠️ 获取 {fund_code} 基金涨跌幅失败: {e}")
+    for code, name, fund_rate in zip(fund_info["基金代码"], fund_info["基金名称"], fund_info["估算涨跌幅"]):
+        try:
+            if math.isnan(fund_rate):
+                continue
+        except TypeError:
+            continue
+        if fund_rate:
+            rates[code] = (fund_rate, name)
 
-    return None, None
+    return rates
 
 
 if __name__ == "__main__":
@@ -0,0 +1,18 @@
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        numba 未安装时的替代装饰器，直接返回原函数（按纯 Python 执行）
+        兼容 @njit 与 @njit(cache=True, ...) 两种写法
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+
+        return decorator
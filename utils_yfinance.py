@@ -2,26 +2,57 @@ import yfinance as yf
 import pandas as pd
 from datetime import datetime
 
+def _normalize_history(stock_df):
+    """
+    统一 yfinance 日线数据的列名，并去掉索引时区
+    """
+    stock_df = stock_df.rename(columns={'Close': 'close', 'Open': 'open', 'High': 'high', 'Low': 'low',
+                                        'Volume': 'volume'})
+
+    # 返回的已是 DatetimeIndex（可能带时区），直接去掉时区即可，不必再经 pd.to_datetime 转换
+    index = stock_df.index
+    stock_df.index = index.tz_convert(None) if index.tz is not None else index
+    return stock_df
+
+def get_usa_stocks_yf(stock_codes, period='1y'):
+    """
+    一次请求批量抓取多只美股的日线历史数据（yfinance 内部线程池并发下载）
+    stock_codes: 美股代码列表，如 ['AAPL', '^IXIC']
+    返回 {代码: DataFrame}，未取到数据的代码不在结果中
+    """
+    data = yf.download(list(stock_codes), period=period, group_by='ticker', auto_adjust=True,
+                       threads=True, progress=False)
+
+    stock_dfs = {}
+    if data is None or data.empty:
+        return stock_dfs
+
+    for stock_code in stock_codes:
+        if stock_code not in data.columns.get_level_values(0):
+            continue
+        stock_df = data[stock_code].dropna(how='all')
+        if not stock_df.empty:
+            stock_dfs[stock_code] = _normalize_history(stock_df)
+    return stock_dfs
+
 def get_usa_stock_yf(stock_code: str, info_type='history'):
     """
     从 yfinance 抓取指定美股的行情数据
     stock_code: 美股代码，如 'AAPL'
     info_type: 'history' | 'current' 获取历史/实时数据
     """
-    stock = yf.Ticker(stock_code)
-
     # 日线历史数据
-    stock_df = stock.history(period="1y")
-    stock_df.rename(columns={'Close': 'close', 'Open': 'open', 'High': 'high', 'Low': 'low',
-                             'Volume': 'volume'}, inplace=True)
-
-    stock_df.index = pd.to_datetime(stock_df.index).tz_convert(None)
+    stock_df = get_usa_stocks_yf([stock_code]).get(stock_code)
+    if stock_df is None:
+        # 与 _normalize_history 的结果结构一致：空的 DatetimeIndex（yfinance 索引名为 Date）
+        stock_df = pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'],
+                                index=pd.DatetimeIndex([], name='Date'))
 
     if info_type == 'history':
         return stock_df
 
     if info_type == 'current':
-        stock_dict = stock.get_info()
+        stock_dict = yf.Ticker(stock_code).get_info()
 
         price = stock_dict.get('currentPrice', None)
         price = stock_dict.get('regularMarketPrice', 0) if price is None else price